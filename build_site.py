@@ -6,13 +6,13 @@ from core.j2 import Jnj2, toTag, dom_simplify
 from datetime import datetime, timedelta, date
 from core.log import config_log
 from core.img import MyImage
-from core.util import dict_add, get_domain, to_datetime, uniq
+from core.imgpipeline import ImgPipeline, ImgJob, WIDTH
+from core.imgstore import ImgStore, ImgEntry, to_hash, get_origin, get_placeholders, PLACEHOLDER_ORIGINS
+from core.util import dict_add, get_domain, uniq
 import logging
 from os import environ
-from os.path import isfile
-from typing import Tuple, Dict, Set
+from typing import Dict, Set
 from core.filemanager import FM
-import math
 import bs4
 import re
 import pytz
@@ -20,9 +20,7 @@ from core.rss import EventosRss
 from collections import defaultdict
 from portal.event_collector import EventCollector
 from core.publish import PublishDB
-from core.web import WEB
 from typing import NamedTuple
-from core.dwn import DWN
 
 
 config_log("log/build_site.log")
@@ -32,10 +30,14 @@ if environ.get("PAGE_OUT") is None:
 
 PAGE_URL = environ['PAGE_URL']
 OUT = environ["PAGE_OUT"]
-WHITE = (255, 255, 255)
 STR_TODAY = date.today().strftime("%Y-%m-%d")
 
 
+IMG_STORE = ImgStore(
+    root=OUT+"img/",
+    manifest=OUT+"img-manifest.json"
+)
+
 PUBLISHDB = PublishDB(
     name="publish.txt",
     local=OUT,
@@ -65,7 +67,8 @@ EC = EventCollector(
         Category.WORKSHOP,
         Category.PARTY,
         Category.READING_CLUB,
-    )
+    ),
+    fuzzy_dry_run=environ.get("FUZZY_DRY_RUN") is not None
 )
 
 
@@ -74,99 +77,147 @@ class FakeImg(NamedTuple):
     background: tuple[int, int, int]
     orientation: str
     source: str
+    srcset: str = ""
+    sizes: str = ""
+
+
+def get_srcset(i: ImgEntry):
+    if not i.variants or not i.size:
+        return {}
+    # el cartel se muestra a su tamaño salvo en pantallas más
+    # estrechas que la página, donde escala con el ancho de la pantalla
+    width = i.size[0]
+    return dict(
+        srcset=", ".join(f"{PAGE_URL}/img/{f} {w}w" for f, w in i.variants),
+        sizes=f"(max-width: {WIDTH}px) {width*100/WIDTH:.2f}vw, {width}px"
+    )
 
 
-def get_current_img(*urls: str):
-    url_img: dict[str, FakeImg] = {}
-    soup = WEB.safe_get_cached_soup(PAGE_URL+"/")
-    if soup is None:
-        return url_img
-    for i in soup.select("div.img"):
-        background = tuple(map(
-            int,
-            re.findall(r"\d+", i.attrs.get("style", ""))
+def get_stored_placeholders(*eventos: Event):
+    # solo cuentan como el mismo cartel las urls que comparten fichero,
+    # que es cuando son idénticas o la huella lo ha confirmado
+    def _iter_pairs():
+        for e in eventos:
+            i = IMG_STORE.get(e.img) if e.img else None
+            if i is not None:
+                yield i.hash, get_origin(e)
+    placeholders = get_placeholders(_iter_pairs())
+    for h, n in sorted(placeholders.items()):
+        logger.info(f"Imagen genérica {h} en {n} ciclos o lugares")
+    return set(placeholders)
+
+
+def add_images(*eventos: Event):
+    sources = set(e.img for e in eventos if e.img)
+    # el manifiesto de la web ya publicada (./wget.sh img-manifest.json)
+    # dice qué carteles se pueden reutilizar tal cual
+    IMG_STORE.revalidate(*sources)
+    IMG_STORE.fetch(PAGE_URL+"/img/", *sources)
+    origins: dict[str, set[str]] = defaultdict(set)
+    for e in eventos:
+        if e.img:
+            origins[e.img].add(get_origin(e))
+    hashes: dict[str, str] = {}
+    etags: dict[str, str | None] = {}
+    jobs: set[str] = set()
+    # ciclos o lugares distintos de cada cartel descargado
+    hash_origins: dict[str, set[str]] = defaultdict(set)
+    # carteles que son el mismo que otro que ya tenemos
+    similar: dict[str, ImgEntry] = {}
+    # imágenes genéricas, que ni se procesan ni se guardan
+    generic: set[str] = set()
+    # (hash, dHash, huella) de lo procesado en esta ejecución
+    known: list[tuple[str, str, str]] = []
+
+    def _iter_jobs():
+        # cada cartel pasa al pool en cuanto se descarga, y solo
+        # se guardan su hash y su etag; primero las urls que ya
+        # por sí solas salen en muchos ciclos o lugares
+        todo = sorted((s for s in sources if IMG_STORE.get(s) is None), key=lambda s: (-len(origins[s]), s))
+        for src, d in MyImage.iter_download(*todo):
+            if d is None:
+                continue
+            h = hashes[src] = to_hash(d.body)
+            etags[src] = d.etag
+            hash_origins[h].update(origins[src])
+            if IMG_STORE.get_by_hash(h) is not None or h in jobs:
+                continue
+            jobs.add(h)
+            if len(hash_origins[h]) >= PLACEHOLDER_ORIGINS:
+                generic.add(h)
+            yield ImgJob(
+                source=src,
+                file=IMG_STORE.to_path(IMG_STORE.to_file(h)),
+                data=d.body,
+                known=tuple(known),
+                placeholder=h in generic
+            )
+
+    for r in ImgPipeline(known=IMG_STORE.fingerprints).run(_iter_jobs()):
+        h = hashes[r.source]
+        if r.duplicate:
+            if r.duplicate in generic:
+                generic.add(h)
+                continue
+            e = IMG_STORE.get_by_hash(r.duplicate)
+            if e is not None:
+                similar[h] = e
+            continue
+        if not (r.placeholder or r.isOK):
+            continue
+        if r.dhash and r.fingerprint:
+            known.append((h, r.dhash, r.fingerprint))
+        if r.placeholder:
+            continue
+        IMG_STORE.add(ImgEntry(
+            source=r.source,
+            hash=h,
+            file=IMG_STORE.to_file(h),
+            background=r.background,
+            orientation=r.orientation,
+            etag=etags[r.source],
+            size=r.size,
+            variants=r.variants,
+            dhash=r.dhash,
+            fingerprint=r.fingerprint
         ))
-        if len(background) != 3:
+    # otras urls con el mismo cartel apuntan al mismo fichero
+    for src, h in hashes.items():
+        if h in generic:
+            continue
+        e = IMG_STORE.get_by_hash(h) or similar.get(h)
+        if e is not None and e.source != src:
+            IMG_STORE.add(e._replace(source=src, etag=etags[src]))
+    IMG_STORE.dump(*sources)
+    for h in sorted(generic):
+        logger.info(f"Imagen genérica {h} en {len(hash_origins[h])} ciclos o lugares")
+    placeholders = get_stored_placeholders(*eventos)
+
+    img_eventos: list[tuple[FakeImg | None, Event]] = []
+    for e in eventos:
+        if e.img is None or hashes.get(e.img) in generic:
+            img_eventos.append((None, e))
             continue
-        zoom = i.select_one("a.zoom")
-        img = i.select_one("img.cartel")
-        if None in (zoom, img):
+        i = IMG_STORE.get(e.img)
+        if i is not None and i.hash in placeholders:
+            img_eventos.append((None, e))
             continue
-        cls = set(img.attrs["class"]).intersection({
-            "portrait", "landscape"
-        })
-        if len(cls) != 1:
+        if i is None:
+            img_eventos.append((FakeImg(
+                url=e.img,
+                background=None,
+                orientation="",
+                source=e.img
+            ), e))
             continue
-        i = FakeImg(
-            orientation=cls.pop(),
-            background=background,
-            url=img.attrs["src"],
-            source=zoom.attrs["href"],
-        )
-        if i.source in urls:
-            url_img[i.source] = i
-    ok = DWN.dwn(OUT+"img/", *(i.url for i in url_img.values()))
-    for k, i in list(url_img.items()):
-        if i.url not in ok:
-            del url_img[k]
-    return url_img
-
-
-def distance_to_white(*color) -> Tuple[int]:
-    arr = []
-    for c in color:
-        d = math.sqrt(sum([(c1 - c2) ** 2 for c1, c2 in zip(c, WHITE)]))
-        arr.append(d)
-    return tuple(arr)
-
-
-def get_trim_image(im: MyImage):
-    tr = im.trim()
-    if tr is None or tr.isKO:
-        return None
-    if (im.isLandscape and tr.isPortrait):
-        return tr
-    if len(set(im.im.size).intersection(tr.im.size)) == 1:
-        return tr
-    diff_height = abs(im.im.height-tr.im.height)
-    diff_width = abs(im.im.width-tr.im.width)
-    if diff_height < (im.im.height*0.10) and diff_width > (im.im.width*0.20):
-        return tr
-    if diff_width < (im.im.width*0.10) and diff_height > (im.im.height*0.20):
-        return tr
-    dist = distance_to_white(im.get_corner_colors().get_most_common())
-    if max(dist) < 260:
-        return tr
-    return None
-
-
-def add_image(e: Event):
-    if e.img is None:
-        return (None, e)
-    local = f"img/{e.id}.jpg"
-    file = OUT+local
-    im = URL_IMG.get(e.img)
-    if isinstance(im, FakeImg):
-        logger.debug(f"Se reutiliza la imagen {im.url}")
-        return (im, e)
-    if im is None:
-        im = MyImage.get(e.img)
-    if isfile(file):
-        lc = MyImage(file, parent=im, background=im.background)
-    else:
-        if im.isKO:
-            return (im, e)
-        width = 500
-        height = [im.im.height, 300, width*(9/16)]
-        im = get_trim_image(im) or im
-        tb = im.thumbnail(width=width, height=min(height))
-        if tb is None or tb.isKO:
-            return (im, e)
-        lc = tb.save(file, quality=80)
-        if lc is None or lc.isKO:
-            return (im, e)
-    lc.url = PAGE_URL+'/'+local
-    return (lc, e)
+        img_eventos.append((FakeImg(
+            url=PAGE_URL+'/img/'+i.file,
+            background=i.background,
+            orientation=i.orientation,
+            source=e.img,
+            **get_srcset(i)
+        ), e))
+    return tuple(img_eventos)
 
 
 eventos = EC.get_events()
@@ -196,7 +247,7 @@ for e in eventos:
         sin_sesiones.add(e.id)
         continue
     for f in e.sessions:
-        f, h = f.date.split()
+        f, h = f.day.isoformat(), (f.hour or f.date.split()[-1])
         dict_add(sesiones, f, e.id)
         ch = 'h'+h.replace(":", "")
         if ch not in CLSS[e.id]:
@@ -298,9 +349,9 @@ def event_to_ics_description(e: Event, s: Session):
     return "\n\n".join(lines)
 
 
-def event_to_ics(now: datetime, e: Event | Cinema, s: Session, img: MyImage):
+def event_to_ics(now: datetime, e: Event | Cinema, s: Session, img: FakeImg):
     description = event_to_ics_description(e, s)
-    dtstart = to_datetime(s.date)
+    dtstart = s.get_tzdate()
     dtend = dtstart + timedelta(minutes=(s.duration or e.duration or 120))
     #url_img = img.url if img else e.img
     sumary = s.title or e.name
@@ -323,11 +374,7 @@ def event_to_ics(now: datetime, e: Event | Cinema, s: Session, img: MyImage):
 
 
 logger.info("Añadiendo imágenes")
-URL_IMG: dict[str, FakeImg|MyImage] = {}
-imgs = set(e.img for e in eventos if e.img)
-URL_IMG.update(get_current_img(*imgs))
-URL_IMG.update(MyImage.get_all(*(e.img for e in eventos if e.img and e.img not in URL_IMG)))
-img_eventos = tuple(map(add_image, eventos))
+img_eventos = add_images(*eventos)
 
 NOW = datetime.now(tz=pytz.timezone('Europe/Madrid'))
 STR_TODAY = NOW.strftime("%Y-%m-%d")
@@ -339,8 +386,8 @@ for img, e in img_eventos:
         ics = event_to_ics(NOW, e, s, img)
         uid = ics.uid.lower()
         session_ics[e.id+s.id] = uid
-        ics.dumpme(f"out/cal/{uid}.ics")
         icsevents.append(ics)
+SimpleIcsEvent.dump_all("out/cal/", *icsevents)
 SimpleIcsEvent.dump("out/eventos.ics", *icsevents)
 
 
@@ -1,15 +1,43 @@
 from core.goodreads import GR
 from core.util import trim
+from core.cache import DictCache
+from typing import Optional
 import re
 import logging
 
 
 logger = logging.getLogger(__name__)
 
-
-def _match_title_author(text: str, *rgx: str):
-    for r in rgx:
-        x = re.search(r, text)
+RE_TITLE_AUTHOR = tuple(map(re.compile, (
+    r"^'?(?P<title>[^']+)'?\.? [pP]resentaci[oó]n y conversaci[oó]n con (?P<author>[A-Z][^']+)$",
+    r"^(?P<author>[A-Z].+) presenta: '?(?P<title>[^']+)'?$",
+    r"^'?(?P<title>[^']+)'?\s*,?\s*(?:escrito por|de) (?P<author>[A-Z][^']+)$",
+    r".*[pP]resentaci[oó]n del libro '?(?P<title>[^']+)'?.*",
+)))
+RE_EDITORIAL = re.compile(r'\beditorial\b', flags=re.I)
+KNOWN_BOOKS = tuple((k, re.compile(r, flags=re.I)) for k, r in {
+    "https://docta.ucm.es/entities/publication/7f46dedb-946d-4cee-8bb9-56fe80177a0a": r"\bMujeres [Mm]ayores\b",
+    "https://espepons.com/maybe-never-again-2025/#esp": r"\bMaybe never again\b",
+    "https://archive.org/details/por-que-he-robado": r"\bPor qu[ée] he robado\b",
+    "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=1843349": r"\bHomenaje a Cataluña\b",
+    "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=1747352": r"\bRealismo capitalista\b",
+    "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=1517923": r"\bUn verano kurdo\b",
+    "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=2254206": r"\bCuando el mundo duerme\b",
+    "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=2205945": r"\bMuerte accidental de un anarquista\b",
+    "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=2087546": r"\bLa mala costumbre\b",
+    "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=267016": r"\bEl anti-?Edipo\b",
+    "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=1912979": r"\bTesto yonqui\b",
+    "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=1608475": r"\bLa [eÉ]tica animal,? ¿?una cuesti[oó]n feminista\?",
+    "https://madrid.ebiblio.es/resources/699f20282753bd15e883053d": r"\b(Redes vacías|Tecnología catastrófica y fin de la democracia)\b",
+    "https://www.sigloxxieditores.com/libro/el-capital-obra-completa_17971/": r"\bEl Capital\b",
+    "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=1926434": r"\bEl pueblo gitano contra el sistema mundo\b",
+    "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=2007820": r"\bYo soy el monstruo que os habla\b",
+}.items())
+
+
+def _match_title_author(text: str):
+    for r in RE_TITLE_AUTHOR:
+        x = r.search(text)
         if x is None:
             continue
         m = x.groupdict()
@@ -24,74 +52,86 @@ def _match_title_author(text: str, *rgx: str):
             'Vizcaya',
         ):
             continue
-        if re.search(
-            (at or ''),
-            r'\beditorial\b',
-            flags=re.I
-        ):
-            at=None
+        if at is not None and RE_EDITORIAL.search(at):
+            at = None
         return {
             'title': tt,
             'author': at
         }
 
 
-def _is(s: str, rg: str):
-    if s is None:
-        return False
-    m = re.search(rg, s, flags=re.I)
-    return m is not None
+def _to_key(title: str, author: Optional[str]):
+    return f"{title} | {author or ''}"
 
 
 class BookFinder:
-  
+    def __init__(self, file: str = "rec/books.json"):
+        self.__cache = DictCache(file, ttl=60, ttl_none=7)
+        self.__found: dict[str, Optional[str]] = {}
+
     def find(self, title_author: str):
         if title_author is None:
             return None
+        return self.find_all(title_author).get(title_author)
 
-        m = _match_title_author(
-            title_author,
-            r"^'?(?P<title>[^']+)'?\.? [pP]resentaci[oó]n y conversaci[oó]n con (?P<author>[A-Z][^']+)$",
-            r"^(?P<author>[A-Z].+) presenta: '?(?P<title>[^']+)'?$",
-            r"^'?(?P<title>[^']+)'?\s*,?\s*(?:escrito por|de) (?P<author>[A-Z][^']+)$",
-            r".*[pP]resentaci[oó]n del libro '?(?P<title>[^']+)'?.*",
-        )
+    def get(self, title_author: str) -> Optional[str]:
+        """
+        Como find pero sin ir a GoodReads: solo lo ya resuelto por
+        find_all, los libros conocidos y la caché
+        """
+        if title_author is None:
+            return None
+        if title_author in self.__found:
+            return self.__found[title_author]
+        m = _match_title_author(title_author)
         if m is None:
             return self.__find(title_author)
-
         tt = m['title']
         at = m.get('author')
-
-        logger.debug(f"title={tt} author={at} <-- {title_author}")
-
-        url = self.__find(tt, at)
-        if url is not None:
-            return url
-
-        books = GR.search(tt, at)
-        if books:
-            return books[0].url
+        return self.__find(tt, at) or self.__cache.get(_to_key(tt, at))
+
+    def find_all(self, *title_authors: str) -> dict[str, Optional[str]]:
+        r: dict[str, Optional[str]] = {}
+        todo: dict[str, tuple[str, Optional[str]]] = {}
+        failed: set[str] = set()
+        for ta in title_authors:
+            if ta is None:
+                continue
+            if ta in self.__found:
+                r[ta] = self.__found[ta]
+                continue
+            m = _match_title_author(ta)
+            if m is None:
+                r[ta] = self.__find(ta)
+                continue
+            tt = m['title']
+            at = m.get('author')
+            logger.debug(f"title={tt} author={at} <-- {ta}")
+            url = self.__find(tt, at)
+            if url is None and _to_key(tt, at) not in self.__cache:
+                todo[ta] = (tt, at)
+                continue
+            r[ta] = url or self.__cache.get(_to_key(tt, at))
+        if todo:
+            books = GR.search_all(*set(todo.values()))
+            for ta, (tt, at) in todo.items():
+                bks = books.get((tt, at))
+                url = bks[0].url if bks else None
+                if bks is None:
+                    # GoodReads ha fallado, no se guarda como no encontrado
+                    failed.add(ta)
+                else:
+                    self.__cache.set(_to_key(tt, at), url)
+                r[ta] = url
+            self.__cache.dump()
+        self.__found.update({k: v for k, v in r.items() if k not in failed})
+        return r
 
     def __find(self, title: str, autor: str | None = None):
-        for k, r in {
-            "https://docta.ucm.es/entities/publication/7f46dedb-946d-4cee-8bb9-56fe80177a0a": r"\bMujeres [Mm]ayores\b",
-            "https://espepons.com/maybe-never-again-2025/#esp": r"\bMaybe never again\b",
-            "https://archive.org/details/por-que-he-robado": r"\bPor qu[ée] he robado\b",
-            "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=1843349": r"\bHomenaje a Cataluña\b",
-            "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=1747352": r"\bRealismo capitalista\b",
-            "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=1517923": r"\bUn verano kurdo\b",
-            "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=2254206": r"\bCuando el mundo duerme\b",
-            "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=2205945": r"\bMuerte accidental de un anarquista\b",
-            "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=2087546": r"\bLa mala costumbre\b",
-            "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=267016": r"\bEl anti-?Edipo\b",
-            "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=1912979": r"\bTesto yonqui\b",
-            "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=1608475": r"\bLa [eÉ]tica animal,? ¿?una cuesti[oó]n feminista\?",
-            "https://madrid.ebiblio.es/resources/699f20282753bd15e883053d": r"\b(Redes vacías|Tecnología catastrófica y fin de la democracia)\b",
-            "https://www.sigloxxieditores.com/libro/el-capital-obra-completa_17971/": r"\bEl Capital\b",
-            "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=1926434": r"\bEl pueblo gitano contra el sistema mundo\b",
-            "http://gestiona.comunidad.madrid/biblio_publicas/cgi-bin/abnetopac?TITN=2007820": r"\bYo soy el monstruo que os habla\b",
-        }.items():
-            if _is(title, r):
+        if title is None:
+            return None
+        for k, r in KNOWN_BOOKS:
+            if r.search(title):
                 return k
 
 
@@ -3,6 +3,8 @@ import os
 import time
 import logging
 import hashlib
+from threading import Lock
+from typing import Optional, Any
 
 from core.filemanager import FM
 
@@ -151,3 +153,69 @@ class HashTupleCache(TupleCache):
         if args or kwargs:
             return self.file.format(*args, **kwargs)
         return self.file
+
+
+class DictCache:
+    """
+    Diccionario guardado en un único fichero en el que cada entrada caduca
+    por separado, las vacías (None, [], ...) antes que el resto para volver
+    a preguntarlas en pocos días. Las entradas que no tienen la forma
+    {"value": ..., "time": ...} (ficheros de versiones anteriores) se ignoran
+    """
+
+    def __init__(self, file: str, ttl: int, ttl_none: int):
+        self.__file = file
+        self.__ttl = ttl * 86400
+        self.__ttl_none = ttl_none * 86400
+        self.__data: Optional[dict[str, dict]] = None
+        self.__dirty = False
+        self.__lock = Lock()
+
+    @property
+    def data(self):
+        with self.__lock:
+            if self.__data is None:
+                self.__data = {}
+                if os.path.isfile(FM.resolve_path(self.__file)):
+                    now = time.time()
+                    obj = FM.load(self.__file)
+                    for k, v in (obj.items() if isinstance(obj, dict) else ()):
+                        if not DictCache.__is_entry(v):
+                            continue
+                        ttl = self.__ttl if v["value"] else self.__ttl_none
+                        if v["time"] + ttl > now:
+                            self.__data[k] = v
+            return self.__data
+
+    @staticmethod
+    def __is_entry(v: Any):
+        return isinstance(v, dict) and "value" in v and isinstance(v.get("time"), (int, float))
+
+    def __contains__(self, k: str):
+        return k in self.data
+
+    def get(self, k: str, default: Any = None):
+        v = self.data.get(k)
+        if v is None:
+            return default
+        return v["value"]
+
+    def set(self, k: str, value: Any):
+        self.update({k: value})
+
+    def update(self, k_v: dict[str, Any]):
+        data = self.data
+        now = int(time.time())
+        with self.__lock:
+            for k, v in k_v.items():
+                data[k] = {"value": v, "time": now}
+            self.__dirty = True
+
+    def dump(self):
+        # solo se reescribe el fichero si ha cambiado algo
+        data = self.data
+        with self.__lock:
+            if not self.__dirty:
+                return
+            FM.dump(self.__file, dict(sorted(data.items())))
+            self.__dirty = False
@@ -1,8 +1,11 @@
-from sqlite3 import OperationalError, ProgrammingError, connect, Cursor
+from sqlite3 import OperationalError, ProgrammingError, connect, Cursor, Connection
 from atexit import register
+from threading import local, Lock
 import logging
 from functools import cache
 from collections import defaultdict
+from typing import NamedTuple, Optional, Iterable
+from core.imdbindex import ImdbIndex
 
 logger = logging.getLogger(__name__)
 
@@ -28,10 +31,70 @@ def escape_fts5(text: str) -> str:
     return f'"{text}"'
 
 
+class Movie(NamedTuple):
+    id: str
+    year: Optional[int] = None
+    duration: Optional[int] = None
+    filmaffinity: Optional[int] = None
+    titles: tuple[str, ...] = tuple()
+    directors: tuple[str, ...] = tuple()
+
+
+class ImdbQuery(NamedTuple):
+    titles: tuple[str, ...]
+    year: Optional[int] = None
+    director: tuple[str, ...] = tuple()
+    duration: Optional[int] = None
+
+
+def _strip_uniq(arr: Iterable[str]):
+    done: list[str] = []
+    for t in map(str.strip, arr):
+        if t and t not in done:
+            done.append(t)
+    return done
+
+
+def _mk_where(min_year=None, max_year=None, duration: int = None):
+    return (
+        int(bool(duration or min_year or max_year)),
+        (duration - 15) if duration else None,
+        (duration + 15) if duration else None,
+        min_year or None,
+        max_year or None,
+    )
+
+
+SQL_WHERE_MOVIE = """
+    w.has_where = 0 or exists (
+        select 1 from MOVIE m where m.id = {movie}
+        and (w.dmin is null or m.duration is null or (m.duration < w.dmax and m.duration > w.dmin))
+        and (w.min_year is null or m.year >= w.min_year)
+        and (w.max_year is null or m.year <= w.max_year)
+    )
+"""
+
+
 class DBlite:
-    def __init__(self, file: str):
+    """
+    Acceso de solo lectura a una base de datos sqlite inmutable, con una
+    conexión por hilo (cada una con su caché de sentencias preparadas y
+    las páginas mapeadas en memoria) para poder consultar en paralelo
+    """
+    MMAP_SIZE = 1 << 30
+    CACHED_STATEMENTS = 256
+
+    def __init__(self, file: str, index: Optional[str] = None):
         self.__file = file
-        self.__con = None
+        self.__index_file = index
+        self.__index: Optional[ImdbIndex] = None
+        self.__local = local()
+        self.__cons: list[Connection] = []
+        self.__lock = Lock()
+        self.__movie: dict[str, Movie] = {}
+        self.__fa_imdb: dict[int, Optional[str]] = {}
+        self.__by_title: dict[tuple, tuple[str, ...]] = {}
+        self.__by_director: dict[tuple, tuple[str, ...]] = {}
         register(self.close)
 
     @property
@@ -39,19 +102,36 @@ class DBlite:
         return self.__file
 
     @property
-    def con(self):
-        if self.__con is None:
+    def index(self) -> Optional[ImdbIndex]:
+        if self.__index is None and self.__index_file is not None:
+            self.__index = ImdbIndex.load(self.__index_file)
+            if self.__index is None:
+                self.__index_file = None
+            else:
+                logger.info(f"Using {self.__index_file}")
+        return self.__index
+
+    @property
+    def con(self) -> Connection:
+        con = getattr(self.__local, "con", None)
+        if con is None:
             logger.info(f"Connecting to {self.__file}")
-            self.__con = connect(
+            # check_same_thread=False solo para poder cerrarla en close()
+            con = connect(
                 f"file:{self.__file}?mode=ro&immutable=1",
                 uri=True,
-                check_same_thread=False
+                check_same_thread=False,
+                cached_statements=self.CACHED_STATEMENTS
             )
-        return self.__con
+            con.execute(f"PRAGMA mmap_size = {self.MMAP_SIZE}")
+            self.__local.con = con
+            with self.__lock:
+                self.__cons.append(con)
+        return con
 
     def select(self, sql: str, *args, row_factory=None, **kwargs):
-        self.con.row_factory = row_factory
         cursor = self.con.cursor()
+        cursor.row_factory = row_factory
         try:
             if len(args):
                 cursor.execute(sql, args)
@@ -60,10 +140,11 @@ class DBlite:
         except (OperationalError, ProgrammingError):
             logger.critical(f"len(args)=={len(args)} sql={sql}")
             raise
-        for r in cursor:
-            yield r
-        cursor.close()
-        self.con.row_factory = None
+        try:
+            for r in cursor:
+                yield r
+        finally:
+            cursor.close()
 
     def one(self, sql: str, *args, **kwargs):
         for r in self.select(sql, *args, **kwargs):
@@ -89,12 +170,167 @@ class DBlite:
             obj[k].add(v)
         return dict(obj)
 
+    def __fill_temp(self, name: str, cols: tuple[str, ...], rows: Iterable[tuple]):
+        con = self.con
+        con.execute(f"create temp table if not exists {name} ({', '.join(cols)})")
+        con.execute(f"delete from temp.{name}")
+        con.executemany(f"insert into temp.{name} values ({', '.join('?'*len(cols))})", rows)
+        con.commit()
+
+    def get_movie(self, imdb: str) -> Optional[Movie]:
+        if not imdb:
+            return None
+        if imdb not in self.__movie:
+            self.get_movies(imdb)
+        return self.__movie.get(imdb)
+
+    def get_movies(self, *ids: str) -> dict[str, Movie]:
+        todo = sorted(set(i for i in ids if i and i not in self.__movie))
+        if todo:
+            self.__load_movies(todo)
+        return {i: self.__movie[i] for i in ids if i in self.__movie}
+
+    def __load_movies(self, ids: list[str]):
+        self.__fill_temp("q_movie", ("id", ), ((i, ) for i in ids))
+        info: dict[str, tuple] = {}
+        for i, year, duration, fa in self.select("""
+            select q.id, m.year, m.duration, e.filmaffinity
+            from temp.q_movie q
+            left join MOVIE m on m.id = q.id
+            left join EXTRA e on e.movie = q.id
+        """):
+            info.setdefault(i, (year, duration, fa))
+        titles: dict[str, list[str]] = defaultdict(list)
+        for i, t in self.select("select t.movie, t.title from temp.q_movie q join TITLE t on t.movie = q.id"):
+            titles[i].append(t)
+        directors: dict[str, list[str]] = defaultdict(list)
+        for i, n in self.select("""
+            select distinct d.movie, p.name
+            from temp.q_movie q
+            join DIRECTOR d on d.movie = q.id
+            join PERSON p on p.id = d.person
+        """):
+            directors[i].append(n)
+        for i in ids:
+            year, duration, fa = info.get(i, (None, None, None))
+            self.__movie[i] = Movie(
+                id=i,
+                year=year,
+                duration=duration,
+                filmaffinity=fa,
+                titles=tuple(titles[i]),
+                directors=tuple(directors[i])
+            )
+
+    def get_imdb_by_filmaffinity(self, *ids: int) -> dict[int, str]:
+        todo = sorted(set(i for i in ids if i and i not in self.__fa_imdb))
+        if todo:
+            self.__fill_temp("q_filmaffinity", ("id", ), ((i, ) for i in todo))
+            for fa, i in self.select("select q.id, e.movie from temp.q_filmaffinity q join EXTRA e on e.filmaffinity = q.id"):
+                self.__fa_imdb.setdefault(fa, i)
+            for fa in todo:
+                self.__fa_imdb.setdefault(fa, None)
+        return {i: self.__fa_imdb[i] for i in ids if self.__fa_imdb.get(i)}
+
+    def search_imdb_ids(self, *queries: ImdbQuery) -> dict[ImdbQuery, str | None]:
+        """
+        Resuelve muchas búsquedas de search_imdb_id con unas pocas
+        consultas contra tablas temporales, dejando los resultados
+        intermedios en las cachés que usa search_imdb_id
+        """
+        t_keys: dict[tuple, int] = {}
+        d_keys: dict[tuple, int] = {}
+        for q in queries:
+            min_year = q.year-1 if q.year else None
+            max_year = q.year+1 if q.year else None
+            tk = (tuple(q.titles), min_year, max_year, q.duration)
+            dk = (tuple(q.director or tuple()), min_year, max_year, q.duration)
+            if tk not in self.__by_title and not self.__index_hit(self.__by_title, tk, "search_title"):
+                t_keys.setdefault(tk, len(t_keys))
+            if dk not in self.__by_director and not self.__index_hit(self.__by_director, dk, "search_director"):
+                d_keys.setdefault(dk, len(d_keys))
+        if t_keys or d_keys:
+            try:
+                self.__prefetch_search(t_keys, d_keys)
+            except (OperationalError, ProgrammingError) as e:
+                logger.warning(f"search_imdb_ids: {e}")
+        return {
+            q: self.search_imdb_id(
+                *q.titles,
+                year=q.year,
+                director=q.director,
+                duration=q.duration
+            ) for q in queries
+        }
+
+    def __index_hit(self, cache: dict[tuple, tuple[str, ...]], key: tuple, search: str):
+        # una coincidencia exacta en el índice se da por buena sin sumarle lo
+        # que encontraría FTS, así que puede dar menos candidatos que SQL
+        if self.index is None:
+            return False
+        names, min_year, max_year, duration = key
+        ids = getattr(self.index, search)(*names, min_year=min_year, max_year=max_year, duration=duration)
+        if ids:
+            cache[key] = ids
+            return True
+        return False
+
+    def __prefetch_search(self, t_keys: dict[tuple, int], d_keys: dict[tuple, int]):
+        # los qid de directores van a continuación de los de títulos
+        d_keys = {k: qid + len(t_keys) for k, qid in d_keys.items()}
+        self.__fill_temp(
+            "q_where",
+            ("qid", "has_where", "dmin", "dmax", "min_year", "max_year"),
+            ((qid, ) + _mk_where(*k[1:]) for k, qid in (t_keys | d_keys).items())
+        )
+        self.__fill_temp(
+            "q_title",
+            ("qid", "title", "fts"),
+            ((qid, t, escape_fts5(t)) for k, qid in t_keys.items() for t in _strip_uniq(k[0]))
+        )
+        self.__fill_temp(
+            "q_person",
+            ("qid", "name", "fts"),
+            ((qid, d, escape_fts5(d)) for k, qid in d_keys.items() for d in _strip_uniq(k[0]))
+        )
+        found: dict[int, list[str]] = defaultdict(list)
+        for qid, movie in self.select("""
+            select distinct h.qid, h.movie from (
+                select q.qid, t.movie from temp.q_title q join TITLE t on t.title = q.title COLLATE NOCASE
+                union
+                select q.qid, f.movie from temp.q_title q join TITLE_FTS f on f.title MATCH q.fts
+            ) h
+            join temp.q_where w on w.qid = h.qid
+            where """ + SQL_WHERE_MOVIE.format(movie="h.movie")):
+            found[qid].append(movie)
+        for qid, movie in self.select("""
+            select distinct h.qid, d.movie from (
+                select q.qid, p.id person from temp.q_person q join PERSON p on lower(p.name) = q.name COLLATE NOCASE
+                union
+                select q.qid, f.id from temp.q_person q join PERSON_FTS f on f.name MATCH q.fts
+            ) h
+            join DIRECTOR d on d.person = h.person
+            join temp.q_where w on w.qid = h.qid
+            where """ + SQL_WHERE_MOVIE.format(movie="d.movie")):
+            found[qid].append(movie)
+        for k, qid in t_keys.items():
+            self.__by_title[k] = tuple(found[qid])
+        for k, qid in d_keys.items():
+            self.__by_director[k] = tuple(found[qid])
+
     def close(self):
-        if self.__con is None:
+        with self.__lock:
+            cons = self.__cons
+            self.__cons = []
+        self.__local = local()
+        if len(cons) == 0:
             return
         logger.info(f"Closing {self.__file}")
-        self.__con.close()
-        self.__con = None
+        for con in cons:
+            con.close()
+        if self.__index is not None:
+            self.__index.close()
+            self.__index = None
 
     @cache
     def __search_person(self, name: str) -> tuple[str, ...]:
@@ -153,8 +389,18 @@ class DBlite:
             return ok.pop()
         return None
 
-    @cache
-    def __search_movie_by_title(self, *titles: str, min_year=None, max_year=None, duration: int = None) -> tuple[tuple[str, ...], ...]:
+    def __search_movie_by_title(self, *titles: str, min_year=None, max_year=None, duration: int = None) -> tuple[str, ...]:
+        key = (titles, min_year, max_year, duration)
+        if key not in self.__by_title:
+            self.__by_title[key] = self.__find_movie_by_title(*titles, min_year=min_year, max_year=max_year, duration=duration)
+        return self.__by_title[key]
+
+    def __find_movie_by_title(self, *titles: str, min_year=None, max_year=None, duration: int = None) -> tuple[str, ...]:
+        if self.index is not None:
+            # exacto y sin la unión con FTS, ver __index_hit
+            ids = self.index.search_title(*titles, min_year=min_year, max_year=max_year, duration=duration)
+            if ids:
+                return ids
         arr_titles = []
         for t in map(str.strip, titles):
             if t and t not in arr_titles:
@@ -175,11 +421,14 @@ class DBlite:
         main_sql = "select distinct movie from (" + (" union ".join(sql)) + ")"
         where = []
         if duration:
-            where.append(f"(duration is null or (duration < {duration+15} and duration > {duration-15}))")
+            where.append("(duration is null or (duration < ? and duration > ?))")
+            arg.extend((duration+15, duration-15))
         if min_year:
-            where.append(f"year >= {min_year}")
+            where.append("year >= ?")
+            arg.append(min_year)
         if max_year:
-            where.append(f"year <= {max_year}")
+            where.append("year <= ?")
+            arg.append(max_year)
         if where:
             main_sql = main_sql+" where movie in (select id from movie where " 
             main_sql = main_sql+(" and ".join(where)) + ")"
@@ -189,8 +438,18 @@ class DBlite:
         )
         return ids
 
-    @cache
-    def __search_movie_by_director(self, *directors: str, min_year=None, max_year=None, duration: int = None) -> tuple[tuple[str, ...], ...]:
+    def __search_movie_by_director(self, *directors: str, min_year=None, max_year=None, duration: int = None) -> tuple[str, ...]:
+        key = (directors, min_year, max_year, duration)
+        if key not in self.__by_director:
+            self.__by_director[key] = self.__find_movie_by_director(*directors, min_year=min_year, max_year=max_year, duration=duration)
+        return self.__by_director[key]
+
+    def __find_movie_by_director(self, *directors: str, min_year=None, max_year=None, duration: int = None) -> tuple[str, ...]:
+        if self.index is not None:
+            # exacto y sin la unión con FTS, ver __index_hit
+            ids = self.index.search_director(*directors, min_year=min_year, max_year=max_year, duration=duration)
+            if ids:
+                return ids
         arr_directors = []
         for d in directors:
             d = d.strip()
@@ -212,11 +471,14 @@ class DBlite:
         main_sql = "select distinct movie from director where person in (" + (" union ".join(sql)) + ")"
         where = []
         if duration:
-            where.append(f"(duration is null or (duration < {duration+15} and duration > {duration-15}))")
+            where.append("(duration is null or (duration < ? and duration > ?))")
+            arg.extend((duration+15, duration-15))
         if min_year:
-            where.append(f"year >= {min_year}")
+            where.append("year >= ?")
+            arg.append(min_year)
         if max_year:
-            where.append(f"year <= {max_year}")
+            where.append("year <= ?")
+            arg.append(max_year)
         if where:
             main_sql = main_sql+" and movie in (select id from movie where "
             main_sql = main_sql+(" and ".join(where)) + ")"
@@ -227,7 +489,7 @@ class DBlite:
         return ids
 
 
-DB = DBlite("imdb.sqlite")
+DB = DBlite("imdb.sqlite", index="imdb.idx")
 
 
 if __name__ == "__main__":
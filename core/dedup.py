@@ -0,0 +1,193 @@
+from typing import NamedTuple, Callable, Optional, Hashable, Iterable, TypeVar, Generic
+from collections import defaultdict
+from random import Random
+from zlib import crc32
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class DedupRule(NamedTuple):
+    name: str
+    mk_keys: Callable[[T], Iterable[Hashable]]
+    fusion: Optional[Callable[[tuple[T, ...]], T]] = None
+    is_match: Optional[Callable[[T, T], bool]] = None
+
+
+class DedupMerge(NamedTuple):
+    rules: tuple[str, ...]
+    items: tuple
+
+
+class UnionFind:
+    def __init__(self, size: int):
+        self.__parent = list(range(size))
+
+    def find(self, i: int):
+        root = i
+        while self.__parent[root] != root:
+            root = self.__parent[root]
+        while self.__parent[i] != root:
+            self.__parent[i], i = root, self.__parent[i]
+        return root
+
+    def union(self, a: int, b: int):
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return False
+        if rb < ra:
+            ra, rb = rb, ra
+        self.__parent[rb] = ra
+        return True
+
+
+class Dedup(Generic[T]):
+    def __init__(self, *rules: DedupRule, fusion: Callable[..., T]):
+        self.__rules = rules
+        self.__fusion = fusion
+        self.__report: list[DedupMerge] = []
+
+    @property
+    def report(self):
+        return tuple(self.__report)
+
+    def __iter_keys(self, rule: DedupRule, item: T):
+        keys = rule.mk_keys(item)
+        if keys is None:
+            return
+        for k in keys:
+            if k is not None:
+                yield k
+
+    def run(self, items: Iterable[T]) -> tuple[T, ...]:
+        """
+        Las reglas con fusión propia (ciclos, Piano City...) van cada una
+        en su propia pasada, en orden, y solo fusionan lo que ellas mismas
+        han unido; el resto de reglas van juntas en una última pasada
+        sobre lo ya fusionado, que así ve también las claves nuevas
+        """
+        items = tuple(items)
+        self.__report = []
+        for rule in self.__rules:
+            if rule.fusion is not None:
+                items = self.__run_pass((rule, ), items, rule.fusion)
+        rules = tuple(r for r in self.__rules if r.fusion is None)
+        if rules:
+            items = self.__run_pass(rules, items, lambda group: self.__fusion(*group))
+        return items
+
+    def __run_pass(self, rules: tuple[DedupRule, ...], items: tuple[T, ...], fusion: Callable[[tuple[T, ...]], T]):
+        uf = UnionFind(len(items))
+        first: dict[tuple[str, Hashable], int] = {}
+        bucket: dict[tuple[str, Hashable], list[int]] = defaultdict(list)
+        rules_by_item: dict[int, set[str]] = defaultdict(set)
+
+        def _union(rule: DedupRule, i: int, j: int):
+            rules_by_item[i].add(rule.name)
+            rules_by_item[j].add(rule.name)
+            uf.union(i, j)
+
+        for i, item in enumerate(items):
+            for rule in rules:
+                for k in self.__iter_keys(rule, item):
+                    if rule.is_match is None:
+                        j = first.setdefault((rule.name, k), i)
+                        if j != i:
+                            _union(rule, i, j)
+                        continue
+                    candidates = bucket[(rule.name, k)]
+                    for j in candidates:
+                        if uf.find(i) != uf.find(j) and rule.is_match(items[j], item):
+                            _union(rule, i, j)
+                    candidates.append(i)
+
+        components: dict[int, list[int]] = defaultdict(list)
+        for i in range(len(items)):
+            components[uf.find(i)].append(i)
+
+        result: list[T] = []
+        for ids in components.values():
+            group = tuple(items[i] for i in ids)
+            if len(group) == 1:
+                result.append(group[0])
+                continue
+            names: set[str] = set()
+            for i in ids:
+                names.update(rules_by_item[i])
+            self.__report.append(DedupMerge(
+                rules=tuple(r.name for r in rules if r.name in names),
+                items=group
+            ))
+            result.append(fusion(group))
+        return tuple(result)
+
+    def log_report(self, to_str: Callable[[T], str] = str):
+        count: dict[str, int] = defaultdict(int)
+        for m in self.__report:
+            for r in m.rules:
+                count[r] += 1
+            logger.debug(f"Dedup[{', '.join(m.rules)}]: " + " + ".join(map(to_str, m.items)))
+        for r, c in count.items():
+            logger.info(f"Dedup[{r}]: {c} fusiones")
+
+
+def shingles(s: str, size: int = 3) -> frozenset[str]:
+    if not s:
+        return frozenset()
+    s = f" {s} "
+    if len(s) <= size:
+        return frozenset((s, ))
+    return frozenset(s[i:i+size] for i in range(len(s)-size+1))
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0
+    return len(a.intersection(b)) / len(a.union(b))
+
+
+class MinHashLSH:
+    PRIME = (1 << 61) - 1
+
+    def __init__(self, threshold: float, num_perm: int = 32, seed: int = 1):
+        rnd = Random(seed)
+        self.__threshold = threshold
+        self.__hashes = tuple(
+            (rnd.randrange(1, self.PRIME), rnd.randrange(0, self.PRIME))
+            for _ in range(num_perm)
+        )
+        self.__bands, self.__rows = self.__get_bands(num_perm, threshold)
+
+    @property
+    def threshold(self):
+        return self.__threshold
+
+    @staticmethod
+    def __get_bands(num_perm: int, threshold: float):
+        # la probabilidad de ser candidato es 1-(1-s^r)^b, con umbral
+        # aproximado (1/b)^(1/r), que se deja por debajo del pedido
+        # para que los candidatos se verifiquen después con jaccard
+        best = (num_perm, 1)
+        for r in range(1, num_perm+1):
+            if num_perm % r != 0:
+                continue
+            b = num_perm // r
+            if (1/b) ** (1/r) <= threshold:
+                best = (b, r)
+        return best
+
+    def signature(self, sh: frozenset[str]) -> tuple[int, ...]:
+        values = tuple(crc32(x.encode("utf-8")) for x in sh)
+        return tuple(
+            min((a*v + b) % self.PRIME for v in values)
+            for a, b in self.__hashes
+        )
+
+    def iter_bands(self, sh: frozenset[str]):
+        if not sh:
+            return
+        sig = self.signature(sh)
+        for i in range(self.__bands):
+            yield (i, sig[i*self.__rows:(i+1)*self.__rows])
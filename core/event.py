@@ -1,23 +1,23 @@
-from dataclasses import dataclass, asdict, fields, replace, is_dataclass
+from dataclasses import dataclass, asdict, fields, replace, is_dataclass, field
 from typing import NamedTuple, Tuple, Dict, List, Union, Any, Optional, Set, Callable
 from core.util import get_obj, plain_text, get_domain, get_img_src, re_or, re_and, get_main_value
 from enum import IntEnum
-from functools import cached_property
 import re
 from datetime import date, datetime
 from core.web import WEB
+from core.expandurl import EXPANDER
 from core.filemanager import FM
 import logging
 from functools import cache
-from core.util import to_uuid, isWorkingHours
-from core.dblite import DB
+from core.util import to_uuid, isWorkingHours, to_datetime
+from core.dblite import DB, ImdbQuery
 from typing import TypeVar, Type
 from core.book import BF
-from core.util import my_filter
 from core.util.strng import clean_name, find_director
 from collections import defaultdict
 from core.place import Place
 from core.filmaffinity import FilmAffinityApi
+from sys import intern
 import pytz
 
 T = TypeVar("T")
@@ -51,30 +51,14 @@ MONTHS = ("ene", "feb", "mar", "abr", "may", "jun", "jul", "ago", "sep", "oct",
 re_filmaffinity = re.compile(r"https://www.filmaffinity.com/es/film\d+.html")
 
 
-@cache
 def safe_expand_url(url: str):
-    if not isinstance(url, str):
-        return url
-    if re_or(
-        url,
-        r"^https?://\S+/node/\d+$",
-        r"^https?://21distritos\.es/.*\bp=\d+.*$",
-        r"^https://forms.gle/\w+$",
-    ):
-        dom = get_domain(url)
-        new_dom = {
-            "forms.gle": "docs.google.com",
-        }.get(dom, dom)
-        WEB.get(url)
-        if isinstance(WEB.url, str) and get_domain(WEB.url) == new_dom:
-            return WEB.url
-    return url
+    return EXPANDER.get(url)
 
 
 def new_dataclass(cls: Type[T], obj: dict) -> T:
     if not is_dataclass(cls):
         raise TypeError(f"{cls} no es un dataclass")
-    ks = tuple(f.name for f in fields(cls))
+    ks = tuple(f.name for f in fields(cls) if f.init)
     obj = {k: v for k, v in obj.items() if k in ks}
     return cls(**obj)
 
@@ -218,6 +202,16 @@ class Category(IntEnum):
         return str(self).__lt__(str(other))
 
 
+@cache
+def _parse_session_date(dt: str):
+    return datetime(*map(int, re.split(r"\D+", dt)))
+
+
+@cache
+def _get_session_id(dt: str, url: Optional[str]):
+    return to_uuid(re.sub(r"\D+", "", dt) + (url or ""))
+
+
 class Session(NamedTuple):
     date: str
     url: Optional[str] = None
@@ -234,7 +228,14 @@ class Session(NamedTuple):
         if obj is None:
             return None
         obj['url'] = safe_expand_url(obj.get('url'))
-        return Session(**obj)
+        return Session(**obj).intern()
+
+    def intern(self):
+        if isinstance(self.date, str):
+            dt = intern(self.date)
+            if dt is not self.date:
+                return self._replace(date=dt)
+        return self
 
     @staticmethod
     def parse_list(obj) -> Optional[Tuple['Session', ...]]:
@@ -245,7 +246,7 @@ class Session(NamedTuple):
         if len(obj) == 0:
             return tuple()
         if isinstance(obj[0], Session):
-            return tuple(obj)
+            return tuple(s.intern() for s in obj)
         if isinstance(obj[0], dict):
             return tuple(map(Session.build, obj))
         raise ValueError(obj)
@@ -260,7 +261,11 @@ class Session(NamedTuple):
 
     @property
     def id(self):
-        return to_uuid(re.sub(r"\D+", "", self.date) + (self.url or ""))
+        return _get_session_id(self.date, self.url)
+
+    @property
+    def day(self):
+        return self.get_date().date()
 
     def isWorkingHours(self):
         if self.date is None:
@@ -269,8 +274,10 @@ class Session(NamedTuple):
         return isWorkingHours(dt)
 
     def get_date(self):
-        dt_int = tuple(map(int, re.split(r"\D+", self.date)))
-        return datetime(*dt_int)
+        return _parse_session_date(self.date)
+
+    def get_tzdate(self):
+        return to_datetime(self.date)
 
 
 KO_IMG = (
@@ -312,7 +319,7 @@ KO_IMG = (
 )
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Event:
     id: str
     url: str
@@ -327,19 +334,15 @@ class Event:
     sessions: Tuple[Session, ...] = tuple()
     cycle: Optional[str] = None
     more: Optional[str] = None
+    # (urls de las que salen, sites), se recalcula si cambia alguna
+    _sites: Optional[Tuple[Tuple, Tuple[str, ...]]] = field(default=None, init=False, repr=False, compare=False)
 
     def __lt__(self, other):
         if not isinstance(other, Event):
             return NotImplemented
-        flds = fields(Event)
-        a = asdict(self)
-        a['place'] = self.place
-        a['sessions'] = self.sessions
-        b = asdict(other)
-        b['place'] = other.place
-        b['sessions'] = other.sessions
-        tp_a = tuple(a[f.name] for f in flds)
-        tp_b = tuple(b[f.name] for f in flds)
+        flds = tuple(f for f in fields(Event) if f.compare)
+        tp_a = tuple(getattr(self, f.name) for f in flds)
+        tp_b = tuple(getattr(other, f.name) for f in flds)
         return tp_a < tp_b
 
     def fix_type(self):
@@ -380,10 +383,13 @@ class Event:
                 v = Category[v]
             if f.name == "price" and isinstance(v, float) and int(v) == v:
                 v = int(v)
+            if f.name == "publish" and isinstance(v, str):
+                v = intern(v)
             if v != old_val or (type(v) is not type(old_val)):
                 if v != old_val:
                     logger.debug(f"[{self.id}].__post_init__ {f.name}={v} <- {old_val}")
                 object.__setattr__(self, f.name, v)
+        object.__setattr__(self, '_sites', self.__find_sites())
 
     def fix(self, **kwargs):
         for k, v in kwargs.items():
@@ -491,13 +497,20 @@ class Event:
         if self.more and self.more not in urls:
             yield self.more
 
-    @cached_property
-    def sites(self):
+    def __find_sites(self):
         dom: list[str] = [None]
         for d in map(get_domain, self.iter_urls()):
             if d not in dom:
                 dom.append(d)
-        return tuple(dom[1:])
+        return (self.url, self.more, self.also_in, self.sessions), tuple(dom[1:])
+
+    @property
+    def sites(self):
+        key, sites = self._sites
+        if any(a is not b for a, b in zip(key, (self.url, self.more, self.also_in, self.sessions))):
+            key, sites = self.__find_sites()
+            object.__setattr__(self, '_sites', (key, sites))
+        return sites
 
     def _fix_img(self):
         ko = (None, '') + KO_IMG
@@ -522,6 +535,24 @@ class Event:
     def merge(self, **kwargs):
         return replace(self, **kwargs)
 
+    def expand_urls(self):
+        """
+        Aplica las urls ya resueltas por EXPANDER.expand a url, more y las
+        sesiones, que al crear el evento se quedan tal cual si aún no se
+        habían expandido
+        """
+        changes = {}
+        for k in ("url", "more"):
+            v = getattr(self, k)
+            if safe_expand_url(v) != v:
+                changes[k] = safe_expand_url(v)
+        sessions = tuple(s.merge(url=safe_expand_url(s.url)) for s in self.sessions)
+        if sessions != self.sessions:
+            changes["sessions"] = sessions
+        if len(changes) == 0:
+            return self
+        return self.merge(**changes).fix()
+
     @staticmethod
     def build(*args, **kwargs):
         obj = get_obj(*args, **kwargs)
@@ -544,16 +575,27 @@ class Event:
         if self.more:
             return self.more
         if self.category in (Category.LITERATURE, Category.READING_CLUB):
-            url = BF.find(self.name)
+            # sin peticiones: los libros los busca de golpe prefetch_books
+            url = BF.get(self.name)
             if url:
                 return url
 
+    @staticmethod
+    def prefetch_books(*events: "Event"):
+        """
+        Busca de golpe los libros que los Event.fix de events van a pedir,
+        para que cada uno solo consulte la caché
+        """
+        BF.find_all(*(
+            e.name for e in events
+            if not e.more and e.category in (Category.LITERATURE, Category.READING_CLUB)
+        ))
+
     @property
     def dates(self):
         days: Dict[str, List[Session]] = {}
         for e in self.sessions:
-            dh = e.date.split(" ")
-            dt = date(*map(int, dh[0].split("-")))
+            dt = e.day
             day = "LMXJVSD"[dt.weekday()] + \
                 f' {dt.day:>2}-'+MONTHS[dt.month-1]
             if day not in days:
@@ -565,9 +607,7 @@ class Event:
     def days(self):
         days: Set[date] = set()
         for e in self.sessions:
-            dh = e.date.split(" ")
-            dt = date(*map(int, dh[0].split("-")))
-            days.add(dt)
+            days.add(e.day)
         return tuple(sorted(days))
 
     @property
@@ -614,12 +654,14 @@ class Event:
         object.__setattr__(self, 'sessions', tuple(sessions))
 
     def isSimilar(self, e: "Event"):
-        ob1 = asdict(e)
-        ob2 = asdict(self)
-        for k, v1 in ob1.items():
+        for f in fields(e):
+            if not f.compare:
+                continue
+            k = f.name
+            v1 = getattr(e, k)
             if v1 is None:
                 continue
-            v2 = ob2[k]
+            v2 = getattr(self, k)
             if k == "name":
                 if plain_text(v1) != plain_text(v2):
                     return False
@@ -629,7 +671,9 @@ class Event:
         return True
 
     def _asdict(self):
-        return asdict(self)
+        obj = asdict(self)
+        obj.pop('_sites', None)
+        return obj
 
     @staticmethod
     def fusionIfSimilar(
@@ -639,25 +683,46 @@ class Event:
         if len(all_events) == 0:
             return tuple()
 
-        empty = {k: None for k in list(all_events)[0]._asdict().keys()}
+        def _mk_key(e: Event):
+            # (False, None) hace de comodín, igual que un None en isSimilar
+            k = []
+            for f in keys:
+                v = getattr(e, f, None)
+                if v is None:
+                    k.append((False, None))
+                elif f == "name":
+                    k.append((True, plain_text(v)))
+                else:
+                    k.append((True, v))
+            return tuple(k)
+
+        def _is_match(k1: tuple, k2: tuple):
+            for a, b in zip(k1, k2):
+                if a[0] and a != b:
+                    return False
+            return True
 
-        mrg_events: set[Event] = set()
         ko_events: list[Event] = sorted(all_events)
+        ev_keys = tuple(map(_mk_key, ko_events))
+        groups: dict[tuple, list[int]] = defaultdict(list)
+        for i, k in enumerate(ev_keys):
+            groups[k].append(i)
 
-        while ko_events:
-            e = ko_events[0]
-            obj = {k: v for k, v in e._asdict().items() if k in keys}
-            k: Event = Event.build({
-                **empty,
-                **obj
-            })
-            ok, ko_events = my_filter(ko_events, lambda x: x.isSimilar(k))
-            if len(ok):
-                mrg_events.add(Event.fusion(*ok))
+        mrg_events: set[Event] = set()
+        done: set[int] = set()
+        for i, k in enumerate(ev_keys):
+            if i in done:
+                continue
+            if all(x[0] for x in k):
+                ks = (k, )
             else:
-                logger.warning(f"fusionIfSimilar: resutado inesperado {e} ~ {k}")
-                ko_events = [x for x in ko_events if x != e]
-                mrg_events.add(e)
+                ks = tuple(g for g in groups if _is_match(k, g))
+            ok: list[int] = []
+            for g in ks:
+                ok.extend(j for j in groups.pop(g) if j not in done)
+            ok = sorted(ok)
+            done.update(ok)
+            mrg_events.add(Event.fusion(*(ko_events[j] for j in ok)))
         return tuple(sorted(mrg_events))
 
     @staticmethod
@@ -833,7 +898,7 @@ class Event:
         return None
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Cinema(Event):
     year: int = None
     director: tuple[str, ...] = tuple()
@@ -849,7 +914,7 @@ class Cinema(Event):
         self._fix_field('imdb', self.__find_imdb)
         if self.imdb is not None and self.filmaffinity is None:
             self._fix_field('imdb', self.__find_imdb)
-        super().fix(**kwargs)
+        super(Cinema, self).fix(**kwargs)
         return self
 
     def _fix_name_director(self):
@@ -895,12 +960,12 @@ class Cinema(Event):
     def _fix_director(self):
         if self.director or not self.imdb:
             return self.director
-        return DB.to_tuple("select distinct p.name from PERSON p join DIRECTOR d on d.person = p.id where d.movie = ?", self.imdb)
+        return DB.get_movie(self.imdb).directors
 
     def _fix_year(self):
         if self.year or not self.imdb:
             return self.year
-        return DB.one("select year from MOVIE where id = ?", self.imdb)
+        return DB.get_movie(self.imdb).year
 
     def iter_year_title(self):
         y_t: dict[int | None, list[str]] = {}
@@ -910,9 +975,9 @@ class Cinema(Event):
                 arr.append(t)
                 y_t[y] = arr
         if self.imdb:
-            db_year = DB.one("select year from MOVIE where id = ?", self.imdb) or self.year
-            db_title = DB.to_tuple("select title from TITLE where movie = ?", self.imdb)
-            for t in db_title:
+            movie = DB.get_movie(self.imdb)
+            db_year = movie.year or self.year
+            for t in movie.titles:
                 _add(db_year, t)
         else:
             aka = self.aka if self.aka else [self.name]
@@ -935,7 +1000,7 @@ class Cinema(Event):
         if self.imdb:
             return self.imdb
         if self.filmaffinity:
-            _id_ = DB.one("select movie from EXTRA where filmaffinity = ?", self.filmaffinity)
+            _id_ = DB.get_imdb_by_filmaffinity(self.filmaffinity).get(self.filmaffinity)
             if _id_:
                 return _id_
         ids: set[str] = set()
@@ -976,7 +1041,7 @@ class Cinema(Event):
             if _id_:
                 return _id_
         if self.imdb is not None:
-            _id_ = DB.one("select filmaffinity from EXTRA where movie = ?", self.imdb)
+            _id_ = DB.get_movie(self.imdb).filmaffinity
             if _id_:
                 return _id_
 
@@ -992,7 +1057,7 @@ class Cinema(Event):
         if re.search(r"Futuros raros.*Sesión \d+", self.name, flags=re.I):
             return "Futuros raros"
 
-        return super()._fix_cycle()
+        return super(Cinema, self)._fix_cycle()
 
     def _fix_more(self):
         fix_more = FIX_EVENT.get(self.id, {}).get("more")
@@ -1004,18 +1069,18 @@ class Cinema(Event):
             return f"https://www.imdb.com/es-es/title/{self.imdb}"
         if self.more:
             return self.more
-        return super()._fix_more()
+        return super(Cinema, self)._fix_more()
 
     def _fix_duration(self):
         imdb_duration = None
         if self.imdb:
-            imdb_duration = DB.one("select duration from MOVIE where id = ?", self.imdb)
+            imdb_duration = DB.get_movie(self.imdb).duration
         if imdb_duration is not None and (self.duration or 0) < imdb_duration:
             return imdb_duration
         return self.duration
 
     def _get_img_from_url(self, url: str):
-        img = super()._get_img_from_url(url)
+        img = super(Cinema, self)._get_img_from_url(url)
         if img is not None:
             return img
         if self.filmaffinity is not None:
@@ -1031,6 +1096,37 @@ class Cinema(Event):
             if img:
                 return img
 
+    @staticmethod
+    def prefetch_imdb(*events: Event):
+        """
+        Carga de golpe lo que los Cinema.fix de events van a pedir a la
+        base de datos de IMDb, para que cada uno solo consulte cachés
+        """
+        cines: list[Cinema] = []
+        for e in events:
+            if isinstance(e, Cinema):
+                # sobre una copia, fix corregirá el original
+                c = replace(e)
+                c._fix_name_director()
+                c._fix_name_year()
+                cines.append(c)
+        todo = [c for c in cines if not isinstance(c.cycle, str) and "imdb" not in FIX_EVENT.get(c.id, {})]
+        DB.get_movies(*(c.imdb for c in cines))
+        fa_imdb = DB.get_imdb_by_filmaffinity(*(c.filmaffinity for c in todo if not c.imdb))
+        queries: list[ImdbQuery] = []
+        for c in todo:
+            if c.imdb or c.filmaffinity in fa_imdb:
+                continue
+            for y, tt in c.iter_year_title():
+                queries.append(ImdbQuery(
+                    titles=tt,
+                    year=y,
+                    director=c.director,
+                    duration=c.duration
+                ))
+        found = DB.search_imdb_ids(*queries)
+        DB.get_movies(*fa_imdb.values(), *found.values())
+
 
 class FusionSession(NamedTuple):
     url_event: tuple[str]
@@ -1287,3 +1383,24 @@ def find_book_category(name: str, description: str, default: Category):
         ):
             return Category.HISTORY
     return default
+
+
+if __name__ == "__main__":
+    import sys
+    import tracemalloc
+    from resource import getrusage, RUSAGE_SELF
+    file = sys.argv[1] if len(sys.argv) > 1 else "rec/events.json"
+    data = FM.load(file)
+    rss_ini = getrusage(RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    evs = tuple(map(Event.build, data))
+    for e in evs:
+        e.sites
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_end = getrusage(RUSAGE_SELF).ru_maxrss
+    plcs = set(id(e.place) for e in evs)
+    print(f"{len(evs)} eventos de {file}")
+    print(f"memoria: {size/1024:.0f} KiB ({size/max(1, len(evs)):.0f} B/evento), pico {peak/1024:.0f} KiB")
+    print(f"RSS: +{rss_end-rss_ini} KiB (max {rss_end} KiB)")
+    print(f"{len(plcs)} instancias de Place")
@@ -0,0 +1,108 @@
+from threading import Lock
+from os.path import isfile
+from typing import Optional
+import logging
+
+from aiohttp import ClientResponse
+
+from core.fetcher import AsyncFetcher, URLRequest
+from core.filemanager import FM
+from core.util import re_or, get_domain
+from core.web import Web
+
+logger = logging.getLogger(__name__)
+
+
+async def rq_to_url(r: ClientResponse):
+    if r.status >= 400:
+        return None
+    return str(r.url)
+
+
+def get_final_url(url: str):
+    # hay servidores que no responden a HEAD
+    w = Web()
+    try:
+        w.get(url)
+    except Exception as e:
+        logger.warning(f"No se pudo expandir {url}: {e}")
+        return None
+    if w.response is None or w.response.status_code >= 400:
+        return None
+    return w.response.url
+
+
+def is_expandable(url: str):
+    if not isinstance(url, str):
+        return False
+    return re_or(
+        url,
+        r"^https?://\S+/node/\d+$",
+        r"^https?://21distritos\.es/.*\bp=\d+.*$",
+        r"^https://forms.gle/\w+$",
+    ) is not None
+
+
+def _to_expanded(url: str, final: Optional[str]):
+    dom = get_domain(url)
+    new_dom = {
+        "forms.gle": "docs.google.com",
+    }.get(dom, dom)
+    if isinstance(final, str) and get_domain(final) == new_dom:
+        return final
+    return url
+
+
+class UrlExpander:
+    """
+    Resuelve a dónde redirigen las urls cortas (node/N, 21distritos?p=N,
+    forms.gle) con peticiones HEAD concurrentes, y guarda el resultado
+    en disco para que las siguientes ejecuciones solo tengan que mirarlo.
+    Solo expand hace peticiones; get se limita a consultar lo ya resuelto
+    """
+
+    def __init__(self, file: str = "rec/expandurl.json"):
+        self.__file = file
+        self.__data: Optional[dict[str, str]] = None
+        self.__lock = Lock()
+        self.__fetcher = AsyncFetcher(
+            onread=rq_to_url,
+            raise_for_status=False,
+            max_concurrency=10,
+            timeout=15
+        )
+
+    @property
+    def data(self):
+        with self.__lock:
+            if self.__data is None:
+                self.__data = {}
+                if isfile(FM.resolve_path(self.__file)):
+                    self.__data.update(FM.load(self.__file))
+            return self.__data
+
+    def expand(self, *urls: str):
+        todo = sorted(set(u for u in urls if is_expandable(u) and u not in self.data))
+        if len(todo) == 0:
+            return
+        logger.info(f"Expandiendo {len(todo)} urls")
+        finals = self.__fetcher.run(*(URLRequest(url=u, method="HEAD") for u in todo))
+        done: dict[str, str] = {}
+        for url, final in zip(todo, finals):
+            if final is None:
+                final = get_final_url(url)
+            if final is None:
+                # no se guarda, se volverá a intentar en la siguiente ejecución
+                continue
+            done[url] = _to_expanded(url, final)
+        with self.__lock:
+            self.__data.update(done)
+            FM.dump(self.__file, dict(sorted(self.__data.items())))
+
+    def get(self, url: str):
+        if not is_expandable(url):
+            return url
+        return self.data.get(url, url)
+
+
+EXPANDER = UrlExpander()
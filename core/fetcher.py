@@ -1,7 +1,7 @@
-from asyncio import Semaphore, Lock, sleep, gather, get_event_loop, run
+from asyncio import Semaphore, Lock, Queue, sleep, gather, get_event_loop, run, create_task
 from aiohttp import ClientSession, BasicAuth, ClientTimeout, FormData, CookieJar
 
-from typing import Dict, Optional, NamedTuple, Callable, Awaitable, TypeVar, Generic
+from typing import Dict, Optional, NamedTuple, Callable, Awaitable, TypeVar, Generic, AsyncIterator
 import logging
 import enum
 from yarl import URL
@@ -158,26 +158,33 @@ class AsyncFetcher(Generic[ProcessedResponse]):
 
         return None
 
-    async def fetch(
-        self,
-        *rqs: URLRequest | str
-    ) -> list[ProcessedResponse]:
-        if len(rqs) == 0:
-            return []
-
-        semaphore = Semaphore(self.__max_concurrency)
+    def __to_requests(self, rqs: tuple[URLRequest | str, ...]):
         rqs = list(rqs)
         for i, rq in enumerate(rqs):
             if isinstance(rq, str):
                 rqs[i] = URLRequest(url=rq)
             elif not isinstance(rq, URLRequest):
                 raise ValueError("rqs must be URLRequest or str")
-        async with ClientSession(
+        return rqs
+
+    def __session(self):
+        return ClientSession(
             timeout=self.__timeout,
             headers=self.__headers,
             raise_for_status=self.__raise_for_status,
             cookie_jar=self.__build_cookie_jar(),
-        ) as session:
+        )
+
+    async def fetch(
+        self,
+        *rqs: URLRequest | str
+    ) -> list[ProcessedResponse]:
+        if len(rqs) == 0:
+            return []
+
+        semaphore = Semaphore(self.__max_concurrency)
+        rqs = self.__to_requests(rqs)
+        async with self.__session() as session:
             tasks = [
                 self.__fetch_with_retries(
                     semaphore,
@@ -191,6 +198,58 @@ class AsyncFetcher(Generic[ProcessedResponse]):
 
         return results
 
+    async def fetch_iter(
+        self,
+        *rqs: URLRequest | str,
+        max_pending: Optional[int] = None
+    ) -> AsyncIterator[tuple[URLRequest, ProcessedResponse]]:
+        """
+        Como fetch pero entregando cada respuesta en cuanto llega. Con
+        max_pending nunca hay más de esas respuestas descargándose o
+        esperando a que se consuman: el resto de peticiones no empiezan
+        hasta que quien consume pide la siguiente
+        """
+        if len(rqs) == 0:
+            return
+
+        semaphore = Semaphore(self.__max_concurrency)
+        rqs = self.__to_requests(rqs)
+        max_pending = max(1, max_pending or len(rqs))
+        slots = Semaphore(max_pending)
+        todo: Queue[URLRequest] = Queue()
+        for rq in rqs:
+            todo.put_nowait(rq)
+        done: Queue[tuple[URLRequest, Optional[ProcessedResponse], Optional[Exception]]] = Queue()
+
+        async with self.__session() as session:
+            async def _worker():
+                while True:
+                    await slots.acquire()
+                    if todo.empty():
+                        slots.release()
+                        return
+                    rq = todo.get_nowait()
+                    try:
+                        done.put_nowait((rq, await self.__fetch_with_retries(semaphore, session, rq), None))
+                    except Exception as e:
+                        done.put_nowait((rq, None, e))
+
+            workers = [
+                create_task(_worker())
+                for _ in range(min(len(rqs), self.__max_concurrency, max_pending))
+            ]
+            try:
+                for _ in range(len(rqs)):
+                    rq, r, e = await done.get()
+                    if e is not None:
+                        raise e
+                    yield rq, r
+                    slots.release()
+            finally:
+                for w in workers:
+                    w.cancel()
+                await gather(*workers, return_exceptions=True)
+
     def run(
         self,
         *rqs: URLRequest | str
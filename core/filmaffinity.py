@@ -1,25 +1,51 @@
-from core.web import buildSoup
+from core.web import buildSoup, RateLimit
+from core.cache import DictCache
 from bs4 import Tag
 import re
 import cloudscraper
 import logging
 from urllib.parse import quote
-from functools import cache
+from concurrent.futures import ThreadPoolExecutor
+from threading import local
+from atexit import register
 
 
 logger = logging.getLogger(__name__)
 
 re_sp = re.compile(r"\s+")
 
-FM_SCRAPER = cloudscraper.create_scraper()
+# las sesiones de cloudscraper/requests no son seguras entre hilos,
+# así que cada hilo de search_all tiene la suya
+_LOCAL = local()
 
 
 class FilmAffinityError(ValueError):
     pass
 
 
+# como mucho 10 minutos de fallos seguidos, que el paso de CI
+# tiene un límite de 50
+RATE_LIMIT = RateLimit(interval=1, backoff=30, max_backoff=300, max_fails=6, budget=600)
+SEARCH_CACHE = DictCache("rec/filmaffinity.json", ttl=30, ttl_none=3)
+# las búsquedas sueltas de search no reescriben el fichero cada vez
+register(SEARCH_CACHE.dump)
+
+
+def _to_key(query: tuple[int, tuple[str, ...]]):
+    year, titles = query
+    return " | ".join((str(year), ) + tuple(titles))
+
+
+def _get_scraper():
+    scraper = getattr(_LOCAL, "scraper", None)
+    if scraper is None:
+        scraper = cloudscraper.create_scraper()
+        _LOCAL.scraper = scraper
+    return scraper
+
+
 def _get_soup(url: str):
-    soup = buildSoup(url, FM_SCRAPER.get(url).text)
+    soup = buildSoup(url, _get_scraper().get(url).text)
     title_none = "not title found"
     txt = get_text(soup.select_one("title")) or title_none
     if txt.lower() in (title_none, "too many request", ):
@@ -56,7 +82,8 @@ def _is_match(literals: tuple[str, ...], *args):
 
 
 class FilmAffinityApi:
-    ACTIVE = True
+    MAX_WORKERS = 4
+    RETRIES = 3
 
     @staticmethod
     def fast_search(year: int, *titles: str):
@@ -175,44 +202,93 @@ class FilmAffinityApi:
                 return k
 
     @staticmethod
-    @cache
     def search(year: int, *titles: str):
-        k = FilmAffinityApi.fast_search(year, *titles)
-        if k is not None:
-            return k
-        if not FilmAffinityApi.ACTIVE:
-            return None
-        if len(titles) > 1 and year is None:
-            return None
+        q = (year, titles)
+        result, todo = FilmAffinityApi.__from_cache(q)
+        if todo:
+            result[q] = FilmAffinityApi.__search_with_backoff(q)
+        return result.get(q)
+
+    @staticmethod
+    def search_all(*queries: tuple[int, tuple[str, ...]]) -> dict[tuple[int, tuple[str, ...]], int]:
+        result, todo = FilmAffinityApi.__from_cache(*queries)
+        if len(todo) == 0:
+            return result
+        logger.info(f"FilmAffinityApi.search_all: {len(todo)} búsquedas")
         try:
-            ids: set[int] = set()
-            for title in titles:
-                url = "https://www.filmaffinity.com/es/search.php?stype=title&em=1&stext="+quote(title)
-                soup = _get_soup(url)
-                link = soup.select_one('link[rel="alternate"][hreflang="es"][href]')
+            if len(todo) == 1:
+                result[todo[0]] = FilmAffinityApi.__search_with_backoff(todo[0])
+            else:
+                with ThreadPoolExecutor(max_workers=FilmAffinityApi.MAX_WORKERS) as executor:
+                    for q, _id_ in zip(todo, executor.map(FilmAffinityApi.__search_with_backoff, todo)):
+                        result[q] = _id_
+        finally:
+            # lo ya buscado se guarda aunque falle el resto
+            SEARCH_CACHE.dump()
+        return result
+
+    @staticmethod
+    def __from_cache(*queries: tuple[int, tuple[str, ...]]):
+        result: dict[tuple[int, tuple[str, ...]], int] = {}
+        todo: list[tuple[int, tuple[str, ...]]] = []
+        for q in queries:
+            year, titles = q
+            k = FilmAffinityApi.fast_search(year, *titles)
+            if k is not None:
+                result[q] = k
+            elif len(titles) == 0 or (len(titles) > 1 and year is None):
+                continue
+            elif _to_key(q) in SEARCH_CACHE:
+                result[q] = SEARCH_CACHE.get(_to_key(q))
+            elif q not in todo:
+                todo.append(q)
+        return result, todo
+
+    @staticmethod
+    def __search_with_backoff(query: tuple[int, tuple[str, ...]]):
+        year, titles = query
+        for attempt in range(FilmAffinityApi.RETRIES + 1):
+            if RATE_LIMIT.exhausted:
+                return None
+            try:
+                _id_ = FilmAffinityApi.__search(year, *titles)
+                RATE_LIMIT.ok()
+                SEARCH_CACHE.set(_to_key(query), _id_)
+                return _id_
+            except FilmAffinityError as e:
+                delay = RATE_LIMIT.ko()
+                logger.warning(f"Error fetching film {year} {titles} ({attempt+1}): {e}, esperando {delay}s")
+        logger.critical(f"Error fetching film {year} {titles}: demasiados reintentos")
+        return None
+
+    @staticmethod
+    def __search(year: int, *titles: str):
+        ids: set[int] = set()
+        for title in titles:
+            url = "https://www.filmaffinity.com/es/search.php?stype=title&em=1&stext="+quote(title)
+            RATE_LIMIT.wait()
+            soup = _get_soup(url)
+            link = soup.select_one('link[rel="alternate"][hreflang="es"][href]')
+            _id_ = FilmAffinityApi.__extract_id_from_link(link)
+            if _id_:
+                if year is None and len(titles) == 1:
+                    logger.debug(f"FilmAffinityApi.search = {_id_} = {titles[0]}")
+                    return _id_
+                yr = FilmAffinityApi.__get_year(soup)
+                if yr == year:
+                    ids.add(_id_)
+            for div in soup.select("div.searchres div.card-body"):
+                span = get_text(div.select_one("span.mc-year"))
+                if span is None or int(span) != year:
+                    continue
+                link = div.select_one("a[href]")
                 _id_ = FilmAffinityApi.__extract_id_from_link(link)
                 if _id_:
-                    if year is None and len(titles) == 1:
-                        logger.debug(f"FilmAffinityApi.search = {_id_} = {titles[0]}")
-                        return _id_
-                    yr = FilmAffinityApi.__get_year(soup)
-                    if yr == year:
-                        ids.add(_id_)
-                for div in soup.select("div.searchres div.card-body"):
-                    span = get_text(div.select_one("span.mc-year"))
-                    if span is None or int(span) != year:
-                        continue
-                    link = div.select_one("a[href]")
-                    _id_ = FilmAffinityApi.__extract_id_from_link(link)
-                    if _id_:
-                        ids.add(_id_)
-            logger.debug(f"FilmAffinityApi.search = {tuple(sorted(ids))} = {year} + {titles}")
-            if len(ids) == 1:
-                return ids.pop()
-        except FilmAffinityError as e:
-            logger.critical(f"Error fetching film {year} {titles}: {e}")
-            FilmAffinityApi.ACTIVE = False
-            return None
+                    ids.add(_id_)
+        logger.debug(f"FilmAffinityApi.search = {tuple(sorted(ids))} = {year} + {titles}")
+        if len(ids) == 1:
+            return ids.pop()
+        return None
 
     @staticmethod
     def __get_year(soup: Tag) -> str:
@@ -1,10 +1,15 @@
-from core.web import Web, get_text
+from core.web import Web, get_text, RateLimit
 from urllib.parse import quote
-from typing import NamedTuple
+from typing import NamedTuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+from threading import local, Lock
 import re
-from functools import cache
+import logging
+
+logger = logging.getLogger(__name__)
 
 re_dot = re.compile(r"([:,…]|\.+) ")
+re_rating = re.compile(r"([\d\.]+) avg rating [—\-] ([\d,]+) ratings?")
 
 
 class Book(NamedTuple):
@@ -23,21 +28,54 @@ def _match(text: str, *rgx: str, flags: int = 0):
 
 
 class GoodReads:
+    MAX_WORKERS = 3
+
     def __init__(self):
-        self.__w = Web()
+        self.__local = local()
+        self.__rate = RateLimit(interval=1, backoff=10, max_backoff=120, max_fails=6)
+        self.__pages: dict[str, tuple[Book, ...]] = {}
+        self.__lock = Lock()
+
+    @property
+    def __w(self) -> Web:
+        # Web guarda estado (soup, refer...) así que cada hilo tiene el suyo
+        w = getattr(self.__local, "web", None)
+        if w is None:
+            w = Web()
+            self.__local.web = w
+        return w
 
-    @cache
     def __search(self, url: str):
+        with self.__lock:
+            if url in self.__pages:
+                return self.__pages[url]
+        books = self.__get_books(url)
+        if books is None:
+            return None
+        with self.__lock:
+            self.__pages[url] = books
+        return books
+
+    def __get_books(self, url: str) -> Optional[tuple[Book, ...]]:
+        if self.__rate.exhausted:
+            return None
+        self.__rate.wait()
+        try:
+            soup = self.__w.get(url)
+        except Exception as e:
+            delay = self.__rate.ko()
+            logger.warning(f"GoodReads {url}: {e}, esperando {delay}s")
+            return None
+        self.__rate.ok()
         books: set[Book] = set()
-        self.__w.get(url)
-        for link in self.__w.soup.select("table.tableList a.bookTitle[href]"):
+        for link in soup.select("table.tableList a.bookTitle[href]"):
             tt = get_text(link)
             authors: list[str] = []
             td = link.find_parent("td")
             for at in map(get_text, td.select("a.authorName")):
                 if at not in authors:
                     authors.append(at)
-            m = re.search(r"([\d\.]+) avg rating [—\-] ([\d,]+) ratings?", get_text(td))
+            m = re_rating.search(get_text(td))
             book = Book(
                 url=link.attrs['href'].split("-")[0],
                 title=tt,
@@ -55,11 +93,20 @@ class GoodReads:
         )))
         return rtn
 
+    @staticmethod
+    def __to_url(query: str):
+        return "https://www.goodreads.com/search?utf8=%E2%9C%93&query="+quote(query)
+
+    @staticmethod
+    def __queries(title: str, author: Optional[str]):
+        if author is None:
+            return (title, )
+        return (f"{title} {author}", title)
+
     def __search_query(self, query: str):
         done = set()
         books: list[Book] = []
-        url = "https://www.goodreads.com/search?utf8=%E2%9C%93&query="+quote(query)
-        for b in self.__search(url):
+        for b in (self.__search(GoodReads.__to_url(query)) or tuple()):
             if len(b.author) == 0:
                 continue
             k = (b.title, b.author)
@@ -69,17 +116,35 @@ class GoodReads:
             done.add(k)
         return tuple(books)
 
-    def search(self, title: str, author: str = None) -> tuple[Book, ...]:
-        if author is None:
-            return self.search_by_title(title)
-        for qr in (
-            f"{title} {author}",
-            title,
-        ):
-            books = self.__search_by_title_author(qr, title, author)
-            if books:
-                return books
-        return tuple()
+    def search(self, title: str, author: str = None) -> Optional[tuple[Book, ...]]:
+        return self.search_all((title, author))[(title, author)]
+
+    def search_all(self, *items: tuple[str, Optional[str]]) -> dict[tuple[str, Optional[str]], Optional[tuple[Book, ...]]]:
+        # misma secuencia de consultas que antes para cada libro, pero
+        # lanzando a la vez la siguiente consulta de todos los pendientes.
+        # Si una consulta falla el libro queda a None (no se sabe), que
+        # no es lo mismo que () (no está en GoodReads)
+        result: dict[tuple[str, Optional[str]], Optional[tuple[Book, ...]]] = {}
+        pending = {it: GoodReads.__queries(*it) for it in items}
+        while pending:
+            urls = sorted(set(GoodReads.__to_url(qs[0]) for qs in pending.values()))
+            with ThreadPoolExecutor(max_workers=GoodReads.MAX_WORKERS) as executor:
+                failed = set(u for u, b in zip(urls, executor.map(self.__search, urls)) if b is None)
+            nxt: dict[tuple[str, Optional[str]], tuple[str, ...]] = {}
+            for (title, author), qs in pending.items():
+                if GoodReads.__to_url(qs[0]) in failed:
+                    result[(title, author)] = None
+                    continue
+                if author is None:
+                    books = self.search_by_title(title)
+                else:
+                    books = self.__search_by_title_author(qs[0], title, author)
+                if books or len(qs) == 1:
+                    result[(title, author)] = books
+                else:
+                    nxt[(title, author)] = qs[1:]
+            pending = nxt
+        return result
 
     def __search_by_title_author(self, qr: str, title: str, author: str):
         books: list[Book] = []
@@ -3,9 +3,9 @@ from datetime import datetime, timedelta
 import pytz
 from dataclasses import dataclass, asdict
 import re
-from core.filemanager import FM
 from typing import Union, Callable, Optional
 from core.util import to_uuid, get_domain
+from core.filemanager import FM
 from icalendar import Calendar, vDDDTypes, Component, vText
 from icalendar.prop import vCategory
 from datetime import date
@@ -13,6 +13,10 @@ from zoneinfo import ZoneInfo
 import logging
 from core.my_session import buildSession
 from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha1
+from os import makedirs, listdir, remove
+from os.path import isfile, join
 
 logger = logging.getLogger(__name__)
 
@@ -33,6 +37,26 @@ ICS_BEGIN = dedent(
 ).strip()
 
 ICS_END = "END:VCALENDAR"
+# DTSTAMP cambia en cada ejecución, no cuenta para saber si un ics ha cambiado
+RE_DTSTAMP = re.compile(r"^DTSTAMP:.*$", flags=re.MULTILINE)
+
+
+def _to_crlf(s: str):
+    return re.sub(r"[\r\n]+", r"\r\n", s)
+
+
+def _content_hash(ics: str):
+    return sha1(RE_DTSTAMP.sub("", ics).encode("utf-8")).hexdigest()
+
+
+def _write_if_changed(path: str, ics: str):
+    if isfile(path):
+        with open(path, "r", newline="") as f:
+            if _content_hash(f.read()) == _content_hash(ics):
+                return False
+    with open(path, "w", newline="") as f:
+        f.write(ics)
+    return True
 
 
 def _fix_width(s: str, prefix: int):
@@ -129,14 +153,41 @@ class SimpleIcsEvent:
 
     @staticmethod
     def dump(path, *events: "SimpleIcsEvent"):
-        events = sorted(events)
-        ics = ICS_BEGIN+"\n"+("\n".join(map(str, events)))+"\n"+ICS_END
-        ics = re.sub(r"[\r\n]+", r"\r\n", ics)
-        FM.dump(path, ics)
+        # se escribe evento a evento en vez de montar todo el calendario
+        # en memoria
+        path = FM.resolve_path(path)
+        makedirs(path.parent, exist_ok=True)
+        with open(path, "w", newline="") as f:
+            f.write(_to_crlf(ICS_BEGIN+"\n"))
+            for e in sorted(events):
+                f.write(_to_crlf(str(e)+"\n"))
+            f.write(ICS_END)
 
     def dumpme(self, path):
         SimpleIcsEvent.dump(path, self)
 
+    def to_ics(self):
+        return _to_crlf(ICS_BEGIN+"\n"+str(self)+"\n"+ICS_END)
+
+    @staticmethod
+    def dump_all(folder: str, *events: "SimpleIcsEvent", max_workers: int = 8):
+        """
+        Guarda cada evento en folder/{uid}.ics reescribiendo solo los que
+        han cambiado (sin contar DTSTAMP) y borra los .ics que sobran
+        """
+        folder = FM.resolve_path(folder)
+        makedirs(folder, exist_ok=True)
+        files = {f"{e.uid.lower()}.ics": e for e in events}
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            changed = sum(executor.map(
+                lambda kv: _write_if_changed(join(folder, kv[0]), kv[1].to_ics()),
+                files.items()
+            ))
+        stale = [f for f in listdir(folder) if f.endswith(".ics") and f not in files]
+        for f in stale:
+            remove(join(folder, f))
+        logger.info(f"{folder}: {changed} ics reescritos, {len(files)-changed} sin cambios, {len(stale)} borrados")
+
 
 class IcsEventInvalid(ValueError):
     def __init__(self, msg: str):
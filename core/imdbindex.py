@@ -0,0 +1,197 @@
+from mmap import mmap, ACCESS_READ
+from os.path import isfile
+from os import replace
+from struct import Struct
+from bisect import bisect_left
+from sqlite3 import connect
+from collections import defaultdict
+from typing import Optional, Iterable
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"IMDBIDX1"
+U32 = Struct("<I")
+HEADER = Struct("<8sIII")
+# índice de la película en la tabla de ids, año (-1 si no está en
+# MOVIE, 0 si es null) y duración (0 si es null)
+POST = Struct("<Ihh")
+
+# COLLATE NOCASE y lower() de sqlite solo pliegan ASCII
+_ASCII_LOWER = str.maketrans("ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz")
+
+
+def to_key(s: str):
+    return s.strip().translate(_ASCII_LOWER).encode("utf-8")
+
+
+def _write_strings(out, arr: list[bytes]):
+    out.write(U32.pack(len(arr)))
+    off = 0
+    for s in arr:
+        out.write(U32.pack(off))
+        off = off + len(s)
+    out.write(U32.pack(off))
+    for s in arr:
+        out.write(s)
+
+
+def _write_table(out, table: dict[bytes, list[tuple[int, int, int]]]):
+    keys = sorted(table.keys())
+    _write_strings(out, keys)
+    off = 0
+    for k in keys:
+        out.write(U32.pack(off))
+        off = off + len(table[k])
+    out.write(U32.pack(off))
+    for k in keys:
+        for p in table[k]:
+            out.write(POST.pack(*p))
+
+
+class _Strings:
+    def __init__(self, buf: memoryview, pos: int):
+        self.__buf = buf
+        self.size = U32.unpack_from(buf, pos)[0]
+        self.__off = pos + U32.size
+        self.__data = self.__off + (self.size + 1) * U32.size
+        self.end = self.__data + U32.unpack_from(buf, self.__off + self.size * U32.size)[0]
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, i: int) -> bytes:
+        a, b = U32.unpack_from(self.__buf, self.__off + i * U32.size)[0], U32.unpack_from(self.__buf, self.__off + (i+1) * U32.size)[0]
+        return bytes(self.__buf[self.__data+a:self.__data+b])
+
+
+class _Table:
+    def __init__(self, buf: memoryview, pos: int):
+        self.__buf = buf
+        self.__keys = _Strings(buf, pos)
+        self.__off = self.__keys.end
+        self.__data = self.__off + (len(self.__keys) + 1) * U32.size
+        self.end = self.__data + U32.unpack_from(buf, self.__off + len(self.__keys) * U32.size)[0] * POST.size
+
+    def get(self, key: bytes):
+        i = bisect_left(self.__keys, key)
+        if i == len(self.__keys) or self.__keys[i] != key:
+            return
+        a, b = U32.unpack_from(self.__buf, self.__off + i * U32.size)[0], U32.unpack_from(self.__buf, self.__off + (i+1) * U32.size)[0]
+        for j in range(a, b):
+            yield POST.unpack_from(self.__buf, self.__data + j * POST.size)
+
+
+class ImdbIndex:
+    """
+    Índice compacto, de solo lectura y mapeado en memoria, con los títulos
+    (y nombres de directores) normalizados como en COLLATE NOCASE apuntando
+    a sus películas, para resolver búsquedas exactas sin ir a sqlite.
+    Se genera con `python -m core.imdbindex imdb.sqlite imdb.idx`
+    """
+
+    def __init__(self, file: str):
+        self.__file = file
+        with open(file, "rb") as f:
+            self.__mmap = mmap(f.fileno(), 0, access=ACCESS_READ)
+        self.__buf = buf = memoryview(self.__mmap)
+        magic, pos_movie, pos_title, pos_person = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{file} no es un índice de IMDb")
+        self.__movie = _Strings(buf, pos_movie)
+        self.__title = _Table(buf, pos_title)
+        self.__person = _Table(buf, pos_person)
+
+    @property
+    def file(self):
+        return self.__file
+
+    @staticmethod
+    def load(file: str) -> Optional["ImdbIndex"]:
+        if not isfile(file):
+            return None
+        try:
+            return ImdbIndex(file)
+        except (ValueError, OSError) as e:
+            logger.warning(f"ImdbIndex({file}): {e}")
+            return None
+
+    def __search(self, table: _Table, names: Iterable[str], min_year=None, max_year=None, duration: int = None):
+        ids: list[str] = []
+        for n in names:
+            for mv, year, dur in table.get(to_key(n)):
+                if (duration or min_year or max_year) and year < 0:
+                    continue
+                if duration and dur and not (duration-15 < dur < duration+15):
+                    continue
+                if min_year and not (year and year >= min_year):
+                    continue
+                if max_year and not (year and year <= max_year):
+                    continue
+                _id_ = self.__movie[mv].decode("utf-8")
+                if _id_ not in ids:
+                    ids.append(_id_)
+        return tuple(ids)
+
+    def search_title(self, *titles: str, min_year=None, max_year=None, duration: int = None) -> tuple[str, ...]:
+        return self.__search(self.__title, titles, min_year=min_year, max_year=max_year, duration=duration)
+
+    def search_director(self, *names: str, min_year=None, max_year=None, duration: int = None) -> tuple[str, ...]:
+        return self.__search(self.__person, names, min_year=min_year, max_year=max_year, duration=duration)
+
+    def close(self):
+        self.__buf.release()
+        self.__mmap.close()
+
+    @staticmethod
+    def build(db_file: str, out_file: str):
+        con = connect(f"file:{db_file}?mode=ro&immutable=1", uri=True)
+        movies: dict[str, int] = {}
+        titles: dict[bytes, list[tuple[int, int, int]]] = defaultdict(list)
+        persons: dict[bytes, list[tuple[int, int, int]]] = defaultdict(list)
+
+        def _post(movie: str, in_movie: int, year: int, duration: int):
+            return (
+                movies.setdefault(movie, len(movies)),
+                -1 if in_movie is None else (year or 0),
+                min(duration or 0, 0x7fff)
+            )
+
+        for title, movie, in_movie, year, duration in con.execute('''
+            select t.title, t.movie, m.id, m.year, m.duration
+            from TITLE t left join MOVIE m on m.id = t.movie
+        '''):
+            if title:
+                titles[to_key(title)].append(_post(movie, in_movie, year, duration))
+        for name, movie, in_movie, year, duration in con.execute('''
+            select distinct p.name, d.movie, m.id, m.year, m.duration
+            from PERSON p
+            join DIRECTOR d on d.person = p.id
+            left join MOVIE m on m.id = d.movie
+        '''):
+            if name:
+                persons[to_key(name)].append(_post(movie, in_movie, year, duration))
+        con.close()
+        # los ids se guardan en el orden en que se asignaron los índices
+        ids = [m.encode("utf-8") for m, _ in sorted(movies.items(), key=lambda x: x[1])]
+        tmp = out_file + ".tmp"
+        with open(tmp, "wb") as out:
+            out.write(HEADER.pack(MAGIC, 0, 0, 0))
+            pos_movie = out.tell()
+            _write_strings(out, ids)
+            pos_title = out.tell()
+            _write_table(out, titles)
+            pos_person = out.tell()
+            _write_table(out, persons)
+            out.seek(0)
+            out.write(HEADER.pack(MAGIC, pos_movie, pos_title, pos_person))
+        replace(tmp, out_file)
+        logger.info(f"{out_file}: {len(ids)} películas, {len(titles)} títulos, {len(persons)} personas")
+
+
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    db_file = sys.argv[1] if len(sys.argv) > 1 else "imdb.sqlite"
+    out_file = sys.argv[2] if len(sys.argv) > 2 else "imdb.idx"
+    ImdbIndex.build(db_file, out_file)
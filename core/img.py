@@ -1,12 +1,14 @@
-from PIL import Image, UnidentifiedImageError, ImageChops
+from PIL import Image, UnidentifiedImageError
+import numpy as np
 from PIL.Image import DecompressionBombError
 from requests import Session
 from requests.exceptions import SSLError, RequestException, ConnectTimeout
 from io import BytesIO
+from base64 import b64encode, b64decode
 import logging
 from os.path import dirname
 from os import makedirs
-from typing import List, Tuple, NamedTuple, Union, Dict
+from typing import List, Tuple, NamedTuple, Union, Dict, Optional, Iterator
 from functools import cached_property, cache
 from os.path import isfile
 from core.web import Driver
@@ -15,9 +17,11 @@ import warnings
 from core.util import get_domain
 from time import sleep
 from core.my_session import buildSession
-from core.fetcher import Getter
+from core.fetcher import AsyncFetcher
+from asyncio import run, to_thread
+from threading import Thread, Event
+from queue import Queue, Full
 from aiohttp import ClientResponse
-from types import MappingProxyType
 
 warnings.filterwarnings("ignore", module="PIL")
 
@@ -26,18 +30,188 @@ S = buildSession()
 ReqSession = Session()
 
 
-async def rq_to_img(r: ClientResponse):
+# ningún cartel razonable pesa más, y así no se descargan vídeos o
+# imágenes enormes solo para hacer una miniatura de 500px
+MAX_BYTES = 20 * 1024 * 1024
+# tamaño mínimo al que se decodifica, el doble de la miniatura
+DRAFT_SIZE = (1000, 1000)
+# por debajo de esta desviación (0-255) la imagen es prácticamente lisa
+FLAT_STD = 4
+
+
+class ImageTooBigError(ValueError):
+    pass
+
+
+class Download(NamedTuple):
+    body: bytes
+    etag: Optional[str] = None
+
+
+async def read_body(r: ClientResponse, max_bytes: int = MAX_BYTES):
+    length = r.content_length
+    if length is not None and length > max_bytes:
+        raise ImageTooBigError(f"{r.url} {length} bytes")
+    buf = bytearray()
+    async for chunk in r.content.iter_chunked(64 * 1024):
+        buf.extend(chunk)
+        if len(buf) > max_bytes:
+            raise ImageTooBigError(f"{r.url} > {max_bytes} bytes")
+    return bytes(buf)
+
+
+def open_image(fp, size: tuple[int, int] = DRAFT_SIZE):
+    """
+    Decodifica directamente a un tamaño cercano a size (draft en JPEG,
+    reduce en el resto) y solo después pasa a RGB, para no tener a la vez
+    dos copias de la imagen completa
+    """
+    im = Image.open(fp)
+    if im.format == "JPEG":
+        im.draft("RGB", size)
+    factor = min(im.width // size[0], im.height // size[1])
+    if factor > 1:
+        if im.mode in ("P", "1"):
+            # reduce no trabaja con paleta ni con 1 bit
+            im = im.convert("RGB" if im.mode == "P" else "L")
+        try:
+            im = im.reduce(factor)
+        except ValueError:
+            im = im.convert('RGB').reduce(factor)
+    return im.convert('RGB')
+
+
+async def rq_to_download(r: ClientResponse):
     try:
         r.raise_for_status()
-        body = await r.read()
-        fp = BytesIO(body)
-        im = Image.open(fp)
-        im = im.convert('RGB')
-        return im
+        return Download(
+            body=await read_body(r),
+            etag=r.headers.get("ETag")
+        )
     except Exception as e:
         return e
 
 
+def _get_request(url: str):
+    methods = (
+        S.get,
+        lambda x: ReqSession.get(x, verify=False)
+    )
+    for i, fnc in enumerate(methods, start=len(methods)+1):
+        try:
+            return fnc(url)
+        except Exception as e:
+            if i == 0:
+                logger.critical(f"{url} {e}")
+            pass
+
+
+def download(url: str):
+    dom = get_domain(url)
+    isSalaBerlanga = dom == "salaberlanga.com"
+    r = None
+    if not isSalaBerlanga:
+        r = _get_request(url)
+        if r is not None and r.status_code != 403 and r.content:
+            if len(r.content) > MAX_BYTES:
+                logger.critical(f"{url} {len(r.content)} bytes")
+                return None
+            return BytesIO(r.content)
+    with Driver(browser="firefox") as f:
+        f.get(url)
+        f.wait_ready()
+        if isSalaBerlanga:
+            sleep(6)
+        img = f.safe_wait("img", by=By.CSS_SELECTOR)
+        if img:
+            return BytesIO(img.screenshot_as_png)
+    logger.critical(f"status_code={getattr(r, 'status_code', None)} en {url}")
+
+
+def _first(arr: np.ndarray, lo: np.ndarray, hi: np.ndarray, axis: int, reverse: bool, step: int = 16):
+    # primera fila (axis=0) o columna (axis=1) con algún píxel fuera de
+    # [lo, hi], avanzando por bloques desde el borde para no recorrer
+    # toda la imagen
+    size = arr.shape[axis]
+    for i in range(0, size, step):
+        a, b = (size-i-step, size-i) if reverse else (i, i+step)
+        a = max(a, 0)
+        block = arr[a:b] if axis == 0 else arr[:, a:b]
+        out = (block < lo) | (block > hi)
+        if axis == 0:
+            hit = out.reshape(out.shape[0], -1).any(axis=1)
+        else:
+            hit = out.any(axis=0).any(axis=1)
+        hit = np.flatnonzero(hit)
+        if len(hit):
+            return a + int(hit[-1] if reverse else hit[0])
+    return None
+
+
+def get_bbox(arr: np.ndarray, color: Tuple[int, int, int], tolerance: int = 25):
+    """
+    Caja de los píxeles que se alejan de color más de tolerance en algún
+    canal; lo mismo que ImageChops.difference + add(diff, diff, 1, -50) +
+    getbbox pero mirando solo el marco, sin crear imágenes intermedias
+    """
+    c = np.array(color, dtype=np.int16)
+    lo = np.clip(c - tolerance, 0, 255).astype(np.uint8)
+    hi = np.clip(c + tolerance, 0, 255).astype(np.uint8)
+    top = _first(arr, lo, hi, 0, False)
+    if top is None:
+        return None
+    bottom = _first(arr, lo, hi, 0, True)
+    arr = arr[top:bottom+1]
+    left = _first(arr, lo, hi, 1, False)
+    right = _first(arr, lo, hi, 1, True)
+    return (left, top, right + 1, bottom + 1)
+
+
+def get_dhash(im: Image.Image, size: int = 8):
+    """
+    Hash perceptual (dHash) de 64 bits en hexadecimal: cada bit dice si
+    un píxel es más claro que su vecino de la derecha en una versión
+    de (size+1)x(size) en gris, así que sobrevive a cambios de tamaño y
+    de compresión
+    """
+    arr = np.asarray(im.convert("L").resize((size + 1, size), Image.Resampling.BILINEAR), dtype=np.int16)
+    bits = np.packbits(arr[:, 1:] > arr[:, :-1])
+    return bits.tobytes().hex()
+
+
+def dhash_distance(a: str, b: str):
+    return (int(a, 16) ^ int(b, 16)).bit_count()
+
+
+def get_fingerprint(im: Image.Image, size: int = 32):
+    """
+    Versión de sizexsize en gris (en base64) para confirmar píxel a píxel
+    que dos imágenes con el dHash parecido son de verdad la misma
+    """
+    arr = np.asarray(im.convert("L").resize((size, size), Image.Resampling.BILINEAR), dtype=np.uint8)
+    return b64encode(arr.tobytes()).decode()
+
+
+def _fingerprint_array(fingerprint: str):
+    return np.frombuffer(b64decode(fingerprint), dtype=np.uint8).astype(np.int16)
+
+
+def fingerprint_distance(a: str, b: str):
+    # diferencia media por píxel, de 0 a 255
+    x, y = _fingerprint_array(a), _fingerprint_array(b)
+    if x.shape != y.shape:
+        return 255.0
+    return float(np.abs(x - y).mean())
+
+
+def is_flat(dhash: str, fingerprint: str):
+    # una imagen casi lisa (negra, blanca...) tiene el dHash a ceros y
+    # se parece a cualquier otra imagen lisa, así que no vale para comparar
+    if int(dhash, 16) == 0:
+        return True
+    return float(_fingerprint_array(fingerprint).std()) < FLAT_STD
+
+
 class CornerColor(NamedTuple):
     top_left: Tuple[int, int, int]
     top_right: Tuple[int, int, int]
@@ -63,9 +237,11 @@ class MyImage:
         image: Union[str, Image.Image],
         parent: Image.Image = None,
         background: Tuple[int, int, int] = None,
-        im: Image = None
+        im: Image = None,
+        array: np.ndarray = None
     ):
         self.__path_or_image = image
+        self.__array = array
         self.__url = None
         self.__parent = parent
         self.__background = background
@@ -120,13 +296,11 @@ class MyImage:
             return self.__path_or_image
         path = str(self.path)
         if not isfile(path):
-            path = self.__get(self.path)
+            path = download(self.path)
             if path is None:
                 return None
         try:
-            im = Image.open(path)
-            im = im.convert('RGB')
-            return im
+            return open_image(path)
         except RequestException:
             logger.critical("No se pudo descargar la imagen "+str(self.path), exc_info=True)
         except UnidentifiedImageError:
@@ -135,36 +309,6 @@ class MyImage:
             logger.critical(f"{e} {self.path}")
         return None
 
-    def __get_request(self, url: str):
-        methods = (
-            S.get,
-            lambda x: ReqSession.get(x, verify=False)
-        )
-        for i, fnc in enumerate(methods, start=len(methods)+1):
-            try:
-                return fnc(url)
-            except Exception as e:
-                if i == 0:
-                    logger.critical(f"{url} {e}")
-                pass
-
-    def __get(self, url: str):
-        dom = get_domain(url)
-        isSalaBerlanga = dom == "salaberlanga.com"
-        if not isSalaBerlanga:
-            r = self.__get_request(url)
-            if r is not None and r.status_code != 403 and r.content:
-                return BytesIO(r.content)
-        with Driver(browser="firefox") as f:
-            f.get(url)
-            f.wait_ready()
-            if isSalaBerlanga:
-                sleep(6)
-            img = f.safe_wait("img", by=By.CSS_SELECTOR)
-            if img:
-                return BytesIO(img.screenshot_as_png)
-        logger.critical(f"status_code={r.status_code} en {self.path}")
-
     def trim(self):
         count = self.get_corner_colors().get_count()
         order: List[Tuple[Tuple[int, int, int], int]] = sorted(count.items(), key=lambda kv:(kv[1], kv[0]))
@@ -185,11 +329,17 @@ class MyImage:
             im2.__background = im.__background
         return im2
 
+    @cached_property
+    def array(self) -> np.ndarray:
+        if self.__array is not None:
+            return self.__array
+        im = self.im
+        if im.mode != "RGB":
+            im = im.convert("RGB")
+        return np.asarray(im)
+
     def __trim(self, color: Tuple[int, int, int]):
-        bg = Image.new(self.im.mode, self.im.size, color)
-        diff = ImageChops.difference(self.im, bg)
-        diff = ImageChops.add(diff, diff, 1, -50)
-        bbox = diff.getbbox(alpha_only=False)
+        bbox = get_bbox(self.array, color)
         if not bbox:
             logger.warning(f"trim: diff.getbbox() is None en {self.origin.name}")
             return None
@@ -198,21 +348,16 @@ class MyImage:
             # logger.debug(f"trim: no tiene marco {self.origin.name}")
             return None
         im = self.im.crop(bbox)
-        return MyImage(im, parent=self, background=color)
+        x0, y0, x1, y1 = bbox
+        return MyImage(im, parent=self, background=color, array=self.array[y0:y1, x0:x1])
 
     def get_corner_colors(self) -> CornerColor:
         if self.im is None:
             return None
-        top_left_color = self.im.getpixel((0, 0))
-        top_right_color = self.im.getpixel((self.im.width - 1, 0))
-        bottom_left_color = self.im.getpixel((0, self.im.height - 1))
-        bottom_right_color = self.im.getpixel((self.im.width - 1, self.im.height - 1))
-        return CornerColor(
-            top_left=top_left_color,
-            top_right=top_right_color,
-            bottom_left=bottom_left_color,
-            bottom_right=bottom_right_color
-        )
+        # del mismo array que usa get_bbox, así el color de fondo y el
+        # recorte hablan siempre de los mismos píxeles RGB
+        corners = self.array[(0, 0, -1, -1), (0, -1, 0, -1)].tolist()
+        return CornerColor(*map(tuple, corners))
 
     @property
     def isOK(self):
@@ -276,28 +421,130 @@ class MyImage:
         return self.origin.url
 
     @staticmethod
-    def get_all(*urls: str):
-        r: dict[str, MyImage] = {}
-        data = Getter(
-            raise_for_status=False,
-            onread=rq_to_img,
-            verify=False
-        ).get(*urls)
-        for k, v in list(data.items()):
-            if isinstance(v, Exception):
-                r[k] = MyImage(k)
-            elif isinstance(v, Image.Image):
-                r[k] = MyImage(k, im=v)
-        for url in urls:
-            if url not in r:
-                r[url] = MyImage(url)
-        return MappingProxyType(r)
+    def iter_download(*urls: str, max_pending: int = 16, fallback: bool = True) -> Iterator[tuple[str, Optional[Download]]]:
+        """
+        Descarga sin decodificar y entrega cada imagen en cuanto llega, sin
+        que haya más de max_pending descargándose o esperando a que se
+        consuman; si fallback las que fallen se reintentan con requests o
+        selenium. Se piden en el orden en que llegan las urls
+        """
+        urls = tuple(dict.fromkeys(u for u in urls if u))
+        if len(urls) == 0:
+            return
+        # una en la cola hacia este hilo y el resto en fetch_iter
+        q: Queue = Queue(maxsize=1)
+        stop = Event()
+        end = object()
+
+        def _put(item):
+            while not stop.is_set():
+                try:
+                    q.put(item, timeout=1)
+                    return
+                except Full:
+                    pass
+
+        async def _produce():
+            fetcher = AsyncFetcher(
+                onread=rq_to_download,
+                raise_for_status=False,
+                verify=False
+            )
+            async for rq, d in fetcher.fetch_iter(*urls, max_pending=max(1, max_pending - 1)):
+                await to_thread(_put, (rq.url, d))
+
+        def _run():
+            try:
+                run(_produce())
+            except Exception as e:
+                logger.critical(f"MyImage.iter_download: {e}")
+            finally:
+                _put(end)
+
+        th = Thread(target=_run, daemon=True)
+        th.start()
+        done: set[str] = set()
+        try:
+            while True:
+                item = q.get()
+                if item is end:
+                    break
+                url, d = item
+                done.add(url)
+                yield url, MyImage.__fallback(url, d, fallback)
+            for url in urls:
+                if url not in done:
+                    yield url, MyImage.__fallback(url, None, fallback)
+        finally:
+            stop.set()
+            th.join()
+
+    @staticmethod
+    def __fallback(url: str, d: Optional[Download], fallback: bool):
+        if isinstance(d, Download) and len(d.body) > 0:
+            return d
+        if not fallback:
+            return None
+        body = download(url)
+        if body is None:
+            return None
+        return Download(body=body.getvalue())
+
+    @staticmethod
+    def iter_all(*urls: str, max_pending: int = 16) -> Iterator[tuple[str, "MyImage"]]:
+        """
+        Entrega cada imagen decodificada en cuanto se descarga; solo está
+        decodificada la que tiene quien consume, el resto espera en bytes
+        """
+        for url, d in MyImage.iter_download(*urls, max_pending=max_pending, fallback=False):
+            im = None
+            if d is not None:
+                try:
+                    im = open_image(BytesIO(d.body))
+                except Exception as e:
+                    logger.critical(f"{e} {url}")
+            # sin imagen, MyImage la intentará conseguir por otras vías
+            yield url, MyImage(url, im=im)
 
 
 if __name__ == "__main__":
+    import sys
+    from os.path import isdir, join
+    from os import listdir
+    from time import perf_counter
+    from PIL import ImageChops
+
+    def _chops_bbox(im: Image.Image, color: Tuple[int, int, int]):
+        # implementación anterior, para comparar
+        bg = Image.new(im.mode, im.size, color)
+        diff = ImageChops.difference(im, bg)
+        diff = ImageChops.add(diff, diff, 1, -50)
+        return diff.getbbox(alpha_only=False)
+
+    if len(sys.argv) > 1 and isdir(sys.argv[1]):
+        # python -m core.img carpeta_con_carteles
+        files = sorted(join(sys.argv[1], f) for f in listdir(sys.argv[1]))
+        images = [open_image(f) for f in files]
+        bad = 0
+        t_chops = t_np = 0.0
+        for im in images:
+            for color in set(MyImage(im).get_corner_colors()):
+                t = perf_counter()
+                b1 = _chops_bbox(im, color)
+                t_chops += perf_counter() - t
+                t = perf_counter()
+                b2 = get_bbox(np.asarray(im), color)
+                t_np += perf_counter() - t
+                if b1 != b2:
+                    bad += 1
+        print(f"{len(images)} imágenes, {bad} diferencias")
+        print(f"ImageChops: {t_chops*1000:.0f} ms")
+        print(f"numpy:      {t_np*1000:.0f} ms (incluye np.asarray)")
+        sys.exit(0)
+
     from core.filemanager import FM
     imgs = set(e.get('img') for e in FM.load("out/eventos.json"))
     imgs.discard(None)
     imgs = sorted(imgs)
-    obj = MyImage.get_all(*imgs)
-    print(len(imgs), len(obj))
+    ok = sum(1 for _, im in MyImage.iter_all(*imgs) if im.im is not None)
+    print(len(imgs), ok)
@@ -0,0 +1,233 @@
+from concurrent.futures import ProcessPoolExecutor, Future, wait, FIRST_COMPLETED
+from multiprocessing import get_context
+from typing import NamedTuple, Optional, Iterable, Iterator
+from os.path import isfile, splitext, basename
+from os import cpu_count
+from io import BytesIO
+from time import perf_counter
+import logging
+import numpy as np
+
+from core.img import MyImage, open_image, get_dhash, dhash_distance, get_fingerprint, fingerprint_distance, is_flat
+
+logger = logging.getLogger(__name__)
+
+WHITE = (255, 255, 255)
+WIDTH = 500
+# variantes webp respecto al tamaño con el que se muestra el cartel
+SCALES = (0.5, 1, 2)
+# bits de diferencia entre dHash para dar dos carteles por el mismo
+DHASH_DISTANCE = 2
+# diferencia media por píxel de las huellas para confirmarlo
+FINGERPRINT_DISTANCE = 6
+
+# (hash, dHash, huella) de los carteles que ya había antes de arrancar el
+# pool, se pasan una vez a cada proceso en vez de en cada trabajo
+_KNOWN: tuple[tuple[str, str, str], ...] = ()
+
+
+def _set_known(known: tuple[tuple[str, str, str], ...]):
+    global _KNOWN
+    _KNOWN = known
+
+
+class ImgJob(NamedTuple):
+    source: str
+    file: str
+    data: Optional[bytes] = None
+    # (hash, dHash, huella) de carteles nuevos que no hace falta volver a procesar
+    known: tuple[tuple[str, str, str], ...] = ()
+    # imagen genérica: basta con su dHash y su huella
+    placeholder: bool = False
+
+
+class ImgResult(NamedTuple):
+    source: str
+    file: Optional[str]
+    size: Optional[tuple[int, int]]
+    orientation: str
+    background: Optional[tuple[int, int, int]]
+    # segundos en decodificar, recortar, reducir y guardar
+    timing: tuple[float, float, float, float]
+    error: Optional[str] = None
+    # (fichero, ancho) de las variantes webp
+    variants: tuple[tuple[str, int], ...] = ()
+    dhash: Optional[str] = None
+    fingerprint: Optional[str] = None
+    # hash del cartel conocido que es el mismo, si no se ha procesado por eso
+    duplicate: Optional[str] = None
+    placeholder: bool = False
+
+    @property
+    def isOK(self):
+        return self.error is None and self.file is not None
+
+
+def distance_to_white(*color) -> tuple[float, ...]:
+    arr = np.array(color, dtype=np.float64).reshape(-1, 3)
+    return tuple(np.linalg.norm(arr - WHITE, axis=1).tolist())
+
+
+def get_trim_image(im: MyImage):
+    tr = im.trim()
+    if tr is None or tr.isKO:
+        return None
+    if (im.isLandscape and tr.isPortrait):
+        return tr
+    if len(set(im.im.size).intersection(tr.im.size)) == 1:
+        return tr
+    diff_height = abs(im.im.height-tr.im.height)
+    diff_width = abs(im.im.width-tr.im.width)
+    if diff_height < (im.im.height*0.10) and diff_width > (im.im.width*0.20):
+        return tr
+    if diff_width < (im.im.width*0.10) and diff_height > (im.im.height*0.20):
+        return tr
+    dist = distance_to_white(im.get_corner_colors().get_most_common())
+    if max(dist) < 260:
+        return tr
+    return None
+
+
+def variant_file(file: str, scale: float):
+    return f"{splitext(file)[0]}-{round(scale*100)}.webp"
+
+
+def save_variants(im: MyImage, file: str, width: int, height: int):
+    variants: dict[int, str] = {}
+    for scale in SCALES:
+        path = variant_file(file, scale)
+        if isfile(path):
+            vr = MyImage(path)
+        else:
+            tb = im.thumbnail(width=width*scale, height=height*scale)
+            if tb is None or tb.isKO or tb.im.width in variants:
+                continue
+            vr = tb.save(path, quality=75)
+            if vr is None or vr.isKO:
+                continue
+        variants.setdefault(vr.im.width, basename(path))
+    return tuple((f, w) for w, f in sorted(variants.items()))
+
+
+def process_image(job: ImgJob) -> ImgResult:
+    """
+    Decodifica, recorta, reduce y guarda una imagen; se ejecuta en otro
+    proceso así que solo devuelve lo que la web necesita de ella.
+    Si es una imagen genérica o la misma que un cartel conocido se
+    queda en el dHash y la huella
+    """
+    timing = [0.0, 0.0, 0.0, 0.0]
+    dhash: Optional[str] = None
+    fingerprint: Optional[str] = None
+
+    def _result(file: Optional[str] = None, im: Optional[MyImage] = None, background=None, error: Optional[str] = None, variants=(), duplicate: Optional[str] = None):
+        return ImgResult(
+            source=job.source,
+            file=file,
+            size=im.im.size if im is not None and im.isOK else None,
+            orientation=im.orientation if im is not None else "",
+            background=background,
+            timing=tuple(timing),
+            error=error,
+            variants=variants,
+            dhash=dhash,
+            fingerprint=fingerprint,
+            duplicate=duplicate,
+            placeholder=job.placeholder
+        )
+
+    if not job.data:
+        return _result(error="sin datos")
+    t = perf_counter()
+    try:
+        im = MyImage(job.source, im=open_image(BytesIO(job.data), (WIDTH*2, WIDTH*2)))
+    except Exception as e:
+        return _result(error=str(e))
+    timing[0] = perf_counter() - t
+    if im.isKO:
+        return _result(error="imagen no válida")
+    dhash = get_dhash(im.im)
+    fingerprint = get_fingerprint(im.im)
+    timing[0] = perf_counter() - t
+    if job.placeholder:
+        return _result()
+    if not is_flat(dhash, fingerprint):
+        # el dHash solo da candidatos, la huella confirma que es el mismo
+        for k, dh, fp in (*_KNOWN, *job.known):
+            if dhash_distance(dhash, dh) <= DHASH_DISTANCE and fingerprint_distance(fingerprint, fp) <= FINGERPRINT_DISTANCE:
+                return _result(duplicate=k)
+    if isfile(job.file) and all(isfile(variant_file(job.file, s)) for s in SCALES):
+        lc = MyImage(job.file, parent=im, background=im.background)
+        variants = save_variants(lc, job.file, *lc.im.size)
+        return _result(job.file, lc, lc.background, variants=variants)
+    t = perf_counter()
+    height = [im.im.height, 300, WIDTH*(9/16)]
+    im = get_trim_image(im) or im
+    timing[1] = perf_counter() - t
+    t = perf_counter()
+    tb = im.thumbnail(width=WIDTH, height=min(height))
+    timing[2] = perf_counter() - t
+    if tb is None or tb.isKO:
+        return _result(im=im, background=im.background, error="thumbnail")
+    t = perf_counter()
+    lc = tb.save(job.file, quality=80)
+    if lc is None or lc.isKO:
+        timing[3] = perf_counter() - t
+        return _result(im=im, background=im.background, error="save")
+    # las variantes salen de la imagen recortada, no del jpg ya reducido,
+    # para que la 2x tenga detalle de verdad
+    variants = save_variants(im, job.file, *lc.im.size)
+    timing[3] = perf_counter() - t
+    return _result(job.file, lc, lc.background, variants=variants)
+
+
+class ImgPipeline:
+    """
+    Procesa las imágenes en un pool de procesos, con un máximo de trabajos
+    en vuelo para no acumular en memoria más imágenes de la cuenta
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_pending: Optional[int] = None, known: tuple[tuple[str, str, str], ...] = ()):
+        self.__max_workers = max_workers or cpu_count() or 1
+        self.__max_pending = max_pending or self.__max_workers * 2
+        self.__known = known
+
+    def run(self, jobs: Iterable[ImgJob]) -> Iterator[ImgResult]:
+        count = 0
+        total = [0.0, 0.0, 0.0, 0.0]
+
+        def _done(futures: Iterable[Future]):
+            nonlocal count
+            for f in futures:
+                r: ImgResult = f.result()
+                count = count + 1
+                for i, t in enumerate(r.timing):
+                    total[i] = total[i] + t
+                ms = "/".join(f"{t*1000:.0f}" for t in r.timing)
+                if r.error:
+                    logger.warning(f"ImgPipeline: {r.source} {r.error} [{ms} ms]")
+                elif r.duplicate:
+                    logger.debug(f"ImgPipeline: {r.source} ~ {r.duplicate} [{ms} ms]")
+                elif r.placeholder:
+                    logger.debug(f"ImgPipeline: {r.source} genérica [{ms} ms]")
+                else:
+                    logger.debug(f"ImgPipeline: {r.source} -> {r.file} [{ms} ms]")
+                yield r
+
+        # fork para no volver a ejecutar el script principal en cada hijo
+        with ProcessPoolExecutor(max_workers=self.__max_workers, mp_context=get_context("fork"), initializer=_set_known, initargs=(self.__known,)) as executor:
+            # con fork los procesos se crean en el primer submit, que se hace
+            # antes de consumir jobs (que puede arrancar hilos de descarga)
+            executor.submit(int).result()
+            pending: set[Future] = set()
+            for job in jobs:
+                pending.add(executor.submit(process_image, job))
+                if len(pending) >= self.__max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from _done(done)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from _done(done)
+        if count:
+            ms = "/".join(f"{t*1000:.0f}" for t in total)
+            logger.info(f"ImgPipeline: {count} imágenes, decodificar/recortar/reducir/guardar = {ms} ms")
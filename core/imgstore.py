@@ -0,0 +1,189 @@
+from typing import NamedTuple, Optional, Iterable, Hashable
+from collections import defaultdict
+from os.path import isfile
+from hashlib import sha1
+import logging
+
+from aiohttp import ClientResponse
+
+from core.fetcher import AsyncFetcher, URLRequest
+from core.filemanager import FM
+from core.dwn import DWN
+
+logger = logging.getLogger(__name__)
+
+# ciclos o lugares distintos con el mismo cartel para darlo por genérico
+PLACEHOLDER_ORIGINS = 3
+
+
+async def rq_to_etag(r: ClientResponse):
+    if r.status >= 400:
+        return None
+    return r.headers.get("ETag")
+
+
+def to_hash(data: bytes):
+    return sha1(data).hexdigest()
+
+
+def get_origin(e) -> str:
+    # los eventos de un mismo ciclo o de un mismo lugar comparten cartel
+    # con razón (el del festival, el de la temporada...), así que cuentan
+    # como un único origen
+    return e.cycle or e.place.name
+
+
+def get_placeholders(pairs: Iterable[tuple[Hashable, str]], min_origins: int = PLACEHOLDER_ORIGINS):
+    """
+    De los pares (imagen, origen) devuelve las imágenes que salen en al
+    menos min_origins orígenes distintos, con cuántos son: una imagen
+    genérica del sitio (como las de KO_IMG), no el cartel de nadie
+    """
+    origins: dict[Hashable, set[str]] = defaultdict(set)
+    for img, origin in pairs:
+        origins[img].add(origin)
+    return {img: len(o) for img, o in origins.items() if len(o) >= min_origins}
+
+
+class ImgEntry(NamedTuple):
+    source: str
+    hash: str
+    file: str
+    background: Optional[tuple[int, int, int]]
+    orientation: str
+    etag: Optional[str] = None
+    size: Optional[tuple[int, int]] = None
+    # (fichero, ancho) de las variantes webp
+    variants: tuple[tuple[str, int], ...] = ()
+    dhash: Optional[str] = None
+    # miniatura en gris para confirmar los parecidos por dHash
+    fingerprint: Optional[str] = None
+
+    @staticmethod
+    def build(obj: dict):
+        bg = obj.get("background")
+        size = obj.get("size")
+        return ImgEntry(
+            source=obj["source"],
+            hash=obj["hash"],
+            file=obj["file"],
+            background=tuple(bg) if bg else None,
+            orientation=obj.get("orientation") or "",
+            etag=obj.get("etag"),
+            size=tuple(size) if size else None,
+            variants=tuple((f, w) for f, w in (obj.get("variants") or [])),
+            dhash=obj.get("dhash"),
+            fingerprint=obj.get("fingerprint")
+        )
+
+
+class ImgStore:
+    """
+    Imágenes guardadas por el hash de la original, con un manifiesto que
+    dice de qué url sale cada una, para no volver a descargar ni procesar
+    un cartel que ya tenemos aunque lo usen varios eventos
+    """
+
+    def __init__(self, root: str, manifest: str):
+        self.__root = root.rstrip("/") + "/"
+        self.__manifest = manifest
+        self.__source: dict[str, ImgEntry] = {}
+        self.__hash: dict[str, ImgEntry] = {}
+        if isfile(manifest):
+            for obj in FM.load(manifest):
+                self.add(ImgEntry.build(obj))
+
+    @property
+    def root(self):
+        return self.__root
+
+    def to_file(self, hash: str):
+        return f"{hash}.jpg"
+
+    def to_path(self, file: str):
+        return self.__root + file
+
+    def __files(self, e: ImgEntry):
+        return (e.file, *(f for f, _ in e.variants))
+
+    def __exists(self, e: Optional[ImgEntry]):
+        if e is None:
+            return False
+        return all(isfile(self.to_path(f)) for f in self.__files(e))
+
+    def get(self, source: str) -> Optional[ImgEntry]:
+        e = self.__source.get(source)
+        if self.__exists(e):
+            return e
+        return None
+
+    def get_by_hash(self, hash: str) -> Optional[ImgEntry]:
+        e = self.__hash.get(hash)
+        if self.__exists(e):
+            return e
+        return None
+
+    @property
+    def fingerprints(self) -> tuple[tuple[str, str, str], ...]:
+        """
+        (hash, dHash, huella) de las entradas que se pueden reutilizar
+        """
+        return tuple(sorted(
+            (e.hash, e.dhash, e.fingerprint) for e in self.__hash.values()
+            if e.dhash and e.fingerprint and self.__exists(e)
+        ))
+
+    def add(self, e: ImgEntry):
+        self.__source[e.source] = e
+        if e.hash not in self.__hash:
+            self.__hash[e.hash] = e
+        return e
+
+    def revalidate(self, *sources: str):
+        """
+        Olvida las entradas cuya url devuelve ahora un ETag distinto
+        """
+        todo: list[str] = []
+        for s in sorted(set(sources)):
+            e = self.__source.get(s)
+            if e is not None and e.etag:
+                todo.append(s)
+        if len(todo) == 0:
+            return
+        etags = AsyncFetcher(
+            onread=rq_to_etag,
+            raise_for_status=False,
+            max_concurrency=20,
+            timeout=15
+        ).run(*(URLRequest(url=s, method="HEAD") for s in todo))
+        for s, etag in zip(todo, etags):
+            if etag is not None and etag != self.__source[s].etag:
+                logger.debug(f"ImgStore: {s} ha cambiado")
+                del self.__source[s]
+
+    def fetch(self, remote: str, *sources: str):
+        """
+        Descarga de remote (donde está publicado root) los ficheros de
+        las entradas de sources que están en el manifiesto pero no en local
+        """
+        remote = remote.rstrip("/") + "/"
+        files: set[str] = set()
+        for s in set(sources):
+            e = self.__source.get(s)
+            if e is not None:
+                files.update(f for f in self.__files(e) if not isfile(self.to_path(f)))
+        if len(files) == 0:
+            return
+        ok = DWN.dwn(self.__root, *(remote+f for f in files))
+        logger.info(f"ImgStore: {len(ok)}/{len(files)} ficheros reutilizados de {remote}")
+
+    def dump(self, *sources: str):
+        """
+        Guarda el manifiesto de las imágenes de sources
+        """
+        arr: list[dict] = []
+        for s in sorted(set(sources)):
+            e = self.get(s)
+            if e is not None:
+                arr.append(e._asdict())
+        FM.dump(self.__manifest, arr, compact=True, indent=None)
@@ -1,7 +1,8 @@
 from dataclasses import dataclass, asdict, fields, replace
-from core.util import get_obj, plain_text, re_or, re_and, find_cp
+from core.util import get_obj, plain_text, re_or, re_and, find_cp, RuleTable
 from core.util.strng import capitalize
 from urllib.parse import quote
+from sys import intern
 import logging
 import re
 
@@ -23,7 +24,78 @@ def safe_lt(a: str | None, b: str | None):
     return a.__lt__(b)
 
 
-@dataclass(frozen=True)
+_SHARED: dict["Place", "Place"] = {}
+# resultados de normalize y _fix_zone por (name, address, latlon),
+# que es todo lo que miran sus reglas
+_KNOWN: dict[tuple[str, str, str], "Place | None"] = {}
+_ZONE: dict[tuple[str, str, str], str | None] = {}
+# zonas que se asignan por coordenadas, por orden de prioridad
+_ZONE_INDEX = Zones.get_index(
+    Zones.CARABANCHEL,
+    Zones.VILLAVERDE_BAJO,
+    Zones.PACIFICO,
+    Zones.TRIBUNAL,
+    Zones.MONCLOA,
+    Zones.SOL,
+    Zones.PUERTA_TOLEDO,
+    Zones.LAVAPIES,
+    Zones.LEGAZPI,
+    Zones.MARQUES_DE_VADILLO,
+    Zones.USERA,
+    Zones.VALLECAS,
+    Zones.MANUEL_BECERRA,
+    Zones.NUNEZ_BOLBOA,
+    Zones.ALCALA_DE_HENARES,
+    Zones.AV_AMERICA,
+    Zones.COMPLUTENSE,
+)
+
+
+# reglas de _fix_zone que van antes de mirar las coordenadas (sobre
+# name y address pasados por plain_text) y las que van después
+_RULES_ZONE_BY_NAME = RuleTable(
+    ("name", "Alonso Martinez", (r"plaza de chamber[ií]", )),
+    ("name", "El Retiro", (
+        r"d?el retiro",
+        ("biblioteca", "eugenio trias"),
+        "casa de vacas",
+        r"jardin(es)? del?\b.*\bretiro\b",
+    )),
+    ("name", Zones.LEGAZPI.value.name, (
+        r"Parque\b.*\bEnrique Tierno Galv[aá]n",
+        "matadero",
+        "cineteca",
+        "Casa del Reloj",
+        "Nave Terneras",
+        "La Lonja",
+    )),
+    ("name", Zones.VALLECAS.value.name, ("Biblioteca.* Gerardo Diego", )),
+    ("addr", "Plaza España", (("conde duque", "28015"), ), 0),
+    ("name", "Plaza España", (
+        "clara del rey",
+        "museo abc",
+    )),
+    ("name", Zones.SOL.value.name, ("jardines del campo del moro", )),
+    ("name", Zones.PACIFICO.value.name, ("Centro cultural.*Dao[ií]z y Velarde", )),
+    flags=re.I
+)
+_RULES_ZONE_BY_ADDRESS = RuleTable(
+    ("address", Zones.COMPLUTENSE.value.name, (r"Av(\.|enida)? Complutense", )),
+    ("address", Zones.MARQUES_DE_VADILLO.value.name, ("parque de san Isidro", )),
+    ("address", "Paseo del Prado", (r"plaza jes[uí]s.*28014", )),
+    ("address", Zones.ALCALA_DE_HENARES.value.name, (r"Alcal[aá]( de)? Henares", )),
+    ("name", "Plaza España", (r"^Plaza( de)? España$", )),
+    flags=re.I
+)
+
+
+def share_place(p: "Place"):
+    if p is None:
+        return None
+    return _SHARED.setdefault(p, p)
+
+
+@dataclass(frozen=True, slots=True)
 class Place:
     name: str
     address: str
@@ -76,6 +148,8 @@ class Place:
                     v = None
             if f.name == "name":
                 v = capitalize(v)
+            if isinstance(v, str):
+                v = intern(v)
             object.__setattr__(self, f.name, v)
         self.__fix()
 
@@ -96,6 +170,8 @@ class Place:
         fix_val = fnc()
         if fix_val == old_val:
             return False
+        if isinstance(fix_val, str):
+            fix_val = intern(fix_val)
         object.__setattr__(self, name, fix_val)
         return True
 
@@ -119,111 +195,26 @@ class Place:
     def _fix_zone(self):
         if self.zone is not None:
             return self.zone
-        name = plain_text(self.name) or ''
-        addr = plain_text(self.address) or ''
-        if re_or(name, r"plaza de chamber[ií]", flags=re.I):
-            return "Alonso Martinez"
-        if re_or(
-            name,
-            r"d?el retiro",
-            ("biblioteca", "eugenio trias"),
-            "casa de vacas",
-            r"jardin(es)? del?\b.*\bretiro\b",
-            flags=re.I
-        ):
-            return "El Retiro"
-        if re_or(
-            name,
-            r"Parque\b.*\bEnrique Tierno Galv[aá]n",
-            "matadero",
-            "cineteca",
-            "Casa del Reloj",
-            "Nave Terneras",
-            "La Lonja",
-            flags=re.I
-        ):
-            return Zones.LEGAZPI.value.name
-        if re_or(
-            name,
-            "Biblioteca.* Gerardo Diego",
-            flags=re.I
-        ):
-            return Zones.VALLECAS.value.name
-        if re_and(addr, "conde duque", "28015"):
-            return "Plaza España"
-        if re_or(
-            name,
-            "clara del rey",
-            "museo abc",
-            flags=re.I
-        ):
-            return "Plaza España"
-        if re_or(
-            name,
-            "jardines del campo del moro",
-            flags=re.I
-        ):
-            return Zones.SOL.value.name
-        if re_or(
-            name,
-            "Centro cultural.*Dao[ií]z y Velarde",
-            flags=re.I
-        ):
-            return Zones.PACIFICO.value.name
+        key = (self.name, self.address, self.latlon)
+        if key not in _ZONE:
+            _ZONE[key] = self._find_zone()
+        return _ZONE[key]
+
+    def _find_zone(self):
+        zone = _RULES_ZONE_BY_NAME.first(
+            name=plain_text(self.name),
+            addr=plain_text(self.address)
+        )
+        if zone is not None:
+            return zone
         if self.latlon:
             lat, lon = map(float, self.latlon.split(","))
-            for zn in (
-                Zones.CARABANCHEL,
-                Zones.VILLAVERDE_BAJO,
-                Zones.PACIFICO,
-                Zones.TRIBUNAL,
-                Zones.MONCLOA,
-                Zones.SOL,
-                Zones.PUERTA_TOLEDO,
-                Zones.LAVAPIES,
-                Zones.LEGAZPI,
-                Zones.MARQUES_DE_VADILLO,
-                Zones.USERA,
-                Zones.VALLECAS,
-                Zones.MANUEL_BECERRA,
-                Zones.NUNEZ_BOLBOA,
-                Zones.ALCALA_DE_HENARES,
-                Zones.AV_AMERICA,
-                Zones.COMPLUTENSE,
-            ):
-                z = zn.value
-                if z.is_in(lat, lon):
-                    return z.name
-        if re_or(
-            self.address,
-            r"Av(\.|enida)? Complutense",
-            flags=re.I
-        ):
-            return Zones.COMPLUTENSE.value.name
-        if re_or(
-            self.address,
-            "parque de san Isidro",
-            flags=re.I
-        ):
-            return Zones.MARQUES_DE_VADILLO.value.name
-        if re_or(
-            self.address,
-            r"plaza jes[uí]s.*28014",
-            flags=re.I
-        ):
-            return "Paseo del Prado"
-        if re_or(
-            self.address,
-            r"Alcal[aá]( de)? Henares",
-            flags=re.I
-        ):
-            return Zones.ALCALA_DE_HENARES.value.name
-        if re_or(
-            self.name,
-            r"^Plaza( de)? España$",
-            flags=re.I
-        ):
-            return "Plaza España"
+            z = _ZONE_INDEX.find(lat, lon)
+            if z is not None:
+                return z.name
+        zone = _RULES_ZONE_BY_ADDRESS.first(address=self.address, name=self.name)
+        if zone is not None:
+            return zone
         cp = self.get_cp()
         zone = {
             28012: Zones.LAVAPIES.value.name,
@@ -247,24 +238,26 @@ class Place:
             return "40.38888553445172,-3.66665737114293"
 
     def normalize(self):
+        key = (self.name, self.address, self.latlon)
+        if key not in _KNOWN:
+            _KNOWN[key] = self._find_known()
+        p = _KNOWN[key]
+        if p is None:
+            return share_place(self)
+        return p
+
+    def _find_known(self) -> "Place | None":
         name = self.name or ''
         address = self.address or ''
         name_address = f"{name} {address}".strip()
+        known = _RULES_KNOWN_BY_NAME.first(name=name)
         if re.match(r"^Faro de (la )?Moncloa$", name, flags=re.I):
             return Places.FARO_MONCLOA.value
-        if re_or(
-            name,
-            "mk2 cine paz",
-            flags=re.I
-        ):
-            return Places.MK2_CINE_PAZ.value
-        if re_or(
-            name,
-            r"^Conde ?Duque$",
-            (r"Contempor[aá]nea", r"Conde ?Duque"),
-            flags=re.I
+        if known in (
+            Places.MK2_CINE_PAZ.value,
+            Places.CONDE_DUQUE.value,
         ):
-            return Places.CONDE_DUQUE.value
+            return known
         if re_or(
             name,
             r"Casa [aÁ]rabe",
@@ -399,39 +392,14 @@ class Place:
             flags=re.I
         ):
             return Places.LIBRERIA_PARENTHESIS.value
-        if re_or(
-            name,
-            r"instituto? franc[eé]s",
-            r"instituto? français",
-            "Galerie du 10",
-            flags=re.I
-        ):
-            return Places.INSTITUTO_FRANCES.value
-        if re_or(
-            name,
-            "c[íi]rculo de bellas artes",
-            flags=re.I
-        ):
-            return Places.CIRCULO_BELLAS_ARTES.value
-        if re_or(
-            name,
-            "^casa( de)? m[eé]xico$",
-            flags=re.I
-        ):
-            return Places.CASA_MEXICO.value
-        if re_or(
-            name,
-            "casa del lector",
-            flags=re.I
+        if known in (
+            Places.INSTITUTO_FRANCES.value,
+            Places.CIRCULO_BELLAS_ARTES.value,
+            Places.CASA_MEXICO.value,
+            Places.CASA_DEL_LECTOR.value,
+            Places.LA_MARIMALA.value,
         ):
-            return Places.CASA_DEL_LECTOR.value
-
-        if re_or(
-            name,
-            "Marimala de Lavapi[eé]s",
-            flags=re.I
-        ):
-            return Places.LA_MARIMALA.value
+            return known
         if re_or(
             name,
             "cornisa",
@@ -482,12 +450,8 @@ class Place:
             flags=re.I
         ):
             return Places.TEATRO_BARRIO.value
-        if re_or(
-            name,
-            "Plaza Puerto Rubio",
-            flags=re.I
-        ):
-            return Places.PLAZA_PUERTO_RUBIO.value
+        if known is Places.PLAZA_PUERTO_RUBIO.value:
+            return known
         if re_or(
             name,
             "Museo de Am[eé]rica",
@@ -529,12 +493,8 @@ class Place:
             flags=re.I
         )):
             return Places.OBSERVATORIO_SOSTENIBILIDAD.value
-        if re_or(
-            name,
-            "cine Dor[ée]",
-            flags=re.I
-        ):
-            return Places.DORE.value
+        if known is Places.DORE.value:
+            return known
         if re_or(
             name,
             "Daoiz y Velarde",
@@ -601,12 +561,8 @@ class Place:
             flags=re.I
         )):
             return Places.CASA_ASIA.value
-        if re_or(
-            name,
-            "Plaza Xos[ée] Tarr[íi]o",
-            flags=re.I
-        ):
-            return Places.PL_XOSE_TARRIO.value
+        if known is Places.PL_XOSE_TARRIO.value:
+            return known
         if re_or(
             name,
             "cines? embajadores",
@@ -629,7 +585,7 @@ class Place:
                 return p
             if (p.name, p.latlon) == (self.name, self.latlon):
                 return p
-        return self
+        return None
 
 
 class Places(Enum):
@@ -1215,3 +1171,43 @@ class Places(Enum):
         latlon="40.405025536050104,-3.707462528836356",
         zone="Embajadores",
     )
+
+
+# lugares conocidos que _find_known reconoce solo por el nombre; como se
+# evalúan en el mismo orden, el primero que cumple es el único que puede
+# devolver, así que se busca una vez y se comprueba en su sitio
+_RULES_KNOWN_BY_NAME = RuleTable(
+    ("name", Places.MK2_CINE_PAZ.value, ("mk2 cine paz", )),
+    ("name", Places.CONDE_DUQUE.value, (
+        r"^Conde ?Duque$",
+        (r"Contempor[aá]nea", r"Conde ?Duque"),
+    )),
+    ("name", Places.INSTITUTO_FRANCES.value, (
+        r"instituto? franc[eé]s",
+        r"instituto? français",
+        "Galerie du 10",
+    )),
+    ("name", Places.CIRCULO_BELLAS_ARTES.value, ("c[íi]rculo de bellas artes", )),
+    ("name", Places.CASA_MEXICO.value, ("^casa( de)? m[eé]xico$", )),
+    ("name", Places.CASA_DEL_LECTOR.value, ("casa del lector", )),
+    ("name", Places.LA_MARIMALA.value, ("Marimala de Lavapi[eé]s", )),
+    ("name", Places.PLAZA_PUERTO_RUBIO.value, ("Plaza Puerto Rubio", )),
+    ("name", Places.DORE.value, ("cine Dor[ée]", )),
+    ("name", Places.PL_XOSE_TARRIO.value, ("Plaza Xos[ée] Tarr[íi]o", )),
+    flags=re.I
+)
+
+
+if __name__ == "__main__":
+    import sys
+    from time import perf_counter
+    from core.filemanager import FM
+    file = sys.argv[1] if len(sys.argv) > 1 else "rec/events.json"
+    plcs = tuple(e['place'] for e in FM.load(file) if isinstance(e.get('place'), dict))
+    print(f"{len(plcs)} lugares ({len(set(map(str, plcs)))} distintos) de {file}")
+    for label in ("en frío", "en caliente"):
+        ini = perf_counter()
+        for p in plcs:
+            Place.build(p).normalize()
+        end = perf_counter()
+        print(f"build+normalize {label}: {(end-ini)*1000:.1f} ms ({(end-ini)*1e6/max(1, len(plcs)):.0f} µs/lugar)")
@@ -11,6 +11,7 @@ from os import environ
 from url_normalize import url_normalize
 from urllib.parse import urlparse, parse_qs, parse_qsl, urlsplit, urlencode, urlunparse, ParseResult, unquote
 from functools import cache
+from sys import intern
 import requests
 from datetime import date
 import holidays
@@ -94,7 +95,7 @@ def get_domain(url: str):
     domain = re.sub(r"^(w+\d*)\.", "", domain)
     domain = re.sub(r"^(es|en)\.", "", domain)
     domain = re.sub(r":\d+$", "", domain)
-    return domain
+    return intern(domain)
 
 
 def get_img_src(n: Tag):
@@ -202,9 +203,39 @@ def _mk_re(s: str, flags: int = 0):
     return re.compile(reg, flags=flags)
 
 
+def _can_combine(reg: str):
+    # referencias a grupos, grupos con nombre o flags en línea no
+    # sobreviven a meter el patrón dentro de una alternancia
+    return re.search(r"\\[1-9]|\(\?P[=<]|\(\?[aiLmsux]+\)", reg) is None
+
+
+@cache
+def _mk_re_or(args: Tuple[Union[str, Tuple[str]], ...], flags: int = 0):
+    """
+    Compila los patrones simples de una llamada a re_or en una única
+    alternancia, para descartar en una sola pasada los textos que no
+    cumplen ninguno (el caso habitual). Devuelve None si no hay patrones
+    simples o si no se pueden combinar (referencias a grupos, flags en
+    línea...), en cuyo caso re_or los evalúa uno a uno.
+    """
+    regs = [r for r in args if not isinstance(r, tuple)]
+    if len(regs) == 0:
+        return None
+    if not all(map(_can_combine, regs)):
+        return None
+    try:
+        return re.compile("|".join(f"(?:{_mk_re(r, flags=flags).pattern})" for r in regs), flags=flags)
+    except re.error:
+        return None
+
+
 def re_or(s: str, *args: Union[str, Tuple[str]], to_log: str = None, flags=0):
     if s is None or len(s) == 0 or len(args) == 0:
         return None
+    re_any = _mk_re_or(args, flags=flags)
+    if re_any is not None and not re_any.search(s):
+        # ningún patrón simple cumple, solo queda mirar los re_and
+        args = tuple(r for r in args if isinstance(r, tuple))
     for r in args:
         if isinstance(r, tuple):
             b = re_and(s, *r, flags=flags)
@@ -241,6 +272,84 @@ def re_and(s: str, *args: Union[str, Tuple[str]], to_log: str = None, flags=0):
     return txt
 
 
+class RuleTable:
+    """
+    Reglas (campo, valor, patrones de re_or[, flags]) que se evalúan en
+    orden, como una cadena de `if re_or(campo, *patrones): return valor`,
+    pero con los patrones simples de cada campo compilados en una única
+    alternancia con grupos con nombre. Una pasada por campo dice qué
+    reglas cumplen seguro; si no cumple nada no hay más que mirar, y si
+    cumple alguna solo se comprueban una a una las reglas anteriores a ella.
+    """
+
+    def __init__(self, *rules: Tuple, flags: int = 0):
+        self.__rules: Tuple[Tuple[str, Any, Tuple[Union[str, Tuple[str]], ...], int], ...] = tuple(
+            (r[0], r[1], tuple(r[2]), r[3] if len(r) > 3 else flags) for r in rules
+        )
+        self.__compiled: Dict[str, Tuple[Optional[re.Pattern], Dict[str, int]]] = {}
+        # reglas que solo tienen patrones de la alternancia
+        self.__exact: Set[int] = set()
+        for i, (_, _, patterns, fl) in enumerate(self.__rules):
+            if all(self.__to_alternative(p, fl) is not None for p in patterns):
+                self.__exact.add(i)
+
+    @staticmethod
+    def __to_alternative(p: Union[str, Tuple[str]], flags: int):
+        if not isinstance(p, str) or not _can_combine(p):
+            return None
+        if flags & ~(re.I | re.M | re.S):
+            return None
+        scoped = "".join(c for f, c in ((re.I, "i"), (re.M, "m"), (re.S, "s")) if flags & f)
+        reg = _mk_re(p, flags=flags).pattern
+        if scoped:
+            return f"(?{scoped}:{reg})"
+        return reg
+
+    def __compile(self, field: str):
+        if field in self.__compiled:
+            return self.__compiled[field]
+        group: Dict[str, int] = {}
+        regs: List[str] = []
+        for i, (f, _, patterns, fl) in enumerate(self.__rules):
+            if f != field:
+                continue
+            for j, p in enumerate(patterns):
+                reg = self.__to_alternative(p, fl)
+                if reg is not None:
+                    name = f"r{i}_{j}"
+                    group[name] = i
+                    regs.append(f"(?P<{name}>{reg})")
+        regex = re.compile("|".join(regs)) if regs else None
+        self.__compiled[field] = (regex, group)
+        return self.__compiled[field]
+
+    def __scan(self, field: str, s: str):
+        regex, group = self.__compile(field)
+        if regex is None:
+            return set()
+        return set(group[m.lastgroup] for m in regex.finditer(s))
+
+    def first(self, to_log: str = None, **fields: Optional[str]):
+        hits: Dict[str, Set[int]] = {}
+        for i, (f, value, patterns, fl) in enumerate(self.__rules):
+            s = fields.get(f)
+            if s is None or len(s) == 0:
+                continue
+            if f not in hits:
+                hits[f] = self.__scan(f, s)
+            if i in hits[f]:
+                if to_log:
+                    # solo para que la traza diga qué patrón ha cumplido
+                    re_or(s, *patterns, to_log=to_log, flags=fl)
+                return value
+            if len(hits[f]) == 0 and i in self.__exact:
+                continue
+            if re_or(s, *patterns, to_log=to_log, flags=fl):
+                return value
+        return None
+
+
+@cache
 def to_datetime(s: str):
     if s is None:
         return None
@@ -32,6 +32,7 @@ from selenium.webdriver.remote.webdriver import WebDriver
 from selenium.webdriver.remote.webelement import WebElement
 import logging
 from typing import Union, Optional
+from threading import Lock
 from core.util import get_domain
 
 logger = logging.getLogger(__name__)
@@ -136,6 +137,63 @@ class WebException(Exception):
     pass
 
 
+class RateLimit:
+    """
+    Espaciado mínimo entre peticiones al mismo host, compartido por todos
+    los hilos, y espera exponencial cuando el servidor se queja. Con budget
+    se deja de insistir cuando llevamos esos segundos de fallos seguidos
+    """
+
+    def __init__(self, interval: float, backoff: float, max_backoff: float, max_fails: int, budget: Optional[float] = None):
+        self.__interval = interval
+        self.__max_fails = max_fails
+        self.__backoff = backoff
+        self.__max_backoff = max_backoff
+        self.__budget = budget
+        self.__start: Optional[float] = None
+        self.__fails = 0
+        self.__next = 0.0
+        self.__lock = Lock()
+
+    def __remaining(self):
+        if self.__budget is None or self.__start is None:
+            return None
+        return self.__budget - (time.monotonic() - self.__start)
+
+    @property
+    def exhausted(self):
+        # tras muchos fallos seguidos o sin tiempo se deja de insistir
+        if self.__fails >= self.__max_fails:
+            return True
+        remaining = self.__remaining()
+        return remaining is not None and remaining <= 0
+
+    def wait(self):
+        with self.__lock:
+            now = time.monotonic()
+            wait = self.__next - now
+            self.__next = max(now, self.__next) + self.__interval
+        if wait > 0:
+            time.sleep(wait)
+
+    def ok(self):
+        with self.__lock:
+            self.__fails = 0
+            self.__start = None
+
+    def ko(self):
+        with self.__lock:
+            if self.__start is None:
+                self.__start = time.monotonic()
+            delay = min(self.__backoff * (2 ** self.__fails), self.__max_backoff)
+            remaining = self.__remaining()
+            if remaining is not None:
+                delay = max(0, min(delay, remaining))
+            self.__fails = self.__fails + 1
+            self.__next = max(self.__next, time.monotonic() + delay)
+            return delay
+
+
 class Web:
     def __init__(self, refer=None, verify=True):
         self.s = buildSession() if verify is False else buildScraper()
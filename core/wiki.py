@@ -2,15 +2,23 @@ import logging
 import re
 from core.git import G
 from core.filemanager import FM
+from core.cache import DictCache
 from sparql_tsv import SparqlTsv
 from typing import Optional
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
 
 logger = logging.getLogger(__name__)
 
 
 class WikiApi:
+    CHUNK_SIZE = 200
+    # https://www.mediawiki.org/wiki/Wikidata_Query_Service/User_Manual#Query_limits
+    # permite 5 consultas simultáneas por ip, nos quedamos por debajo
+    MAX_WORKERS = 3
+
     def __init__(self):
         # https://foundation.wikimedia.org/wiki/Policy:Wikimedia_Foundation_User-Agent_Policy
         self.__st = SparqlTsv(
@@ -18,6 +26,16 @@ class WikiApi:
             user_agent=f'ImdbBoot/0.0 ({G.remote}; {G.mail})',
             max_retries=3
         )
+        self.__cache: dict[str, DictCache] = {}
+
+    def __get_cache(self, template: str):
+        if template not in self.__cache:
+            self.__cache[template] = DictCache(
+                f"rec/wiki/{Path(template).stem}.json",
+                ttl=30,
+                ttl_none=7
+            )
+        return self.__cache[template]
 
     def get_filmaffinity(self, *args) -> dict[str, int]:
         logger.debug(f"get_filmaffinity{args}")
@@ -31,10 +49,9 @@ class WikiApi:
 
     def __get_filmaffinity(self, *args):
         r: dict[str, int] = dict()
-        template = FM.load("sparql/imdb_film.sparql")
         for k, v in self.__get_dict(
             *args,
-            template=template,
+            template="sparql/imdb_film.sparql",
             re_k=r"^tt\d{3,}$",
             re_v=r"^\d{3,}$",
         ).items():
@@ -50,34 +67,83 @@ class WikiApi:
     ):
         if len(args) == 0:
             return {}
-        r_k = re.compile(re_k) if re_k else None
-        r_v = re.compile(re_v) if re_v else None
+        cache = self.__get_cache(template)
         k_v: dict[str, set[str]] = defaultdict(set)
+        todo: list[str] = []
+        for k in sorted(set(args)):
+            vals = cache.get(k)
+            if vals is None:
+                todo.append(k)
+            elif vals:
+                k_v[k].update(vals)
+        if todo:
+            new_k_v = self.__query_values(
+                *todo,
+                template=FM.load(template),
+                re_k=re_k,
+                re_v=re_v
+            )
+            if new_k_v:
+                cache.update({k: sorted(vals) for k, vals in new_k_v.items()})
+                cache.dump()
+            for k, vals in new_k_v.items():
+                if vals:
+                    k_v[k].update(vals)
         v_k: dict[str, set[str]] = defaultdict(set)
-        ids = " ".join(map(lambda x: f'"{x}"', sorted(set(args))))
-        query = re.sub(
-            r"(\bVALUES\s+\?\w+\s*\{)\s*\}",
-            r"\1 " + ids + r" }",
-            template
-        )
-        for k, v in self.__st.query(query):
-            if not k or not v:
-                continue
-            if r_k and not r_k.match(k):
-                continue
-            if r_v and not r_v.match(v):
-                continue
-            k_v[k].add(v)
-            v_k[v].add(k)
+        for k, vals in k_v.items():
+            for v in vals:
+                v_k[v].add(k)
         r: dict[str, str] = {}
         for k, vals in k_v.items():
             if len(vals) != 1:
                 continue
-            v = vals.pop()
+            v = next(iter(vals))
             if len(v_k[v]) == 1:
                 r[k] = v
         return r
 
+    def __query_values(
+        self,
+        *args: str,
+        template: str,
+        re_k: Optional[str] = None,
+        re_v: Optional[str] = None
+    ):
+        r_k = re.compile(re_k) if re_k else None
+        r_v = re.compile(re_v) if re_v else None
+        chunks = [args[i:i+WikiApi.CHUNK_SIZE] for i in range(0, len(args), WikiApi.CHUNK_SIZE)]
+
+        def _query(chunk: tuple[str, ...]):
+            ids = " ".join(map(lambda x: f'"{x}"', chunk))
+            query = re.sub(
+                r"(\bVALUES\s+\?\w+\s*\{)\s*\}",
+                r"\1 " + ids + r" }",
+                template
+            )
+            k_v: dict[str, set[str]] = {k: set() for k in chunk}
+            try:
+                rows = tuple(self.__st.query(query))
+            except Exception as e:
+                # el resto de bloques siguen valiendo
+                logger.warning(f"WikiApi: {len(chunk)} ids sin respuesta: {e}")
+                return {}
+            for k, v in rows:
+                if not k or not v:
+                    continue
+                if r_k and not r_k.match(k):
+                    continue
+                if r_v and not r_v.match(v):
+                    continue
+                k_v.setdefault(k, set()).add(v)
+            return k_v
+
+        r: dict[str, set[str]] = {}
+        with ThreadPoolExecutor(max_workers=WikiApi.MAX_WORKERS) as executor:
+            for k_v in executor.map(_query, chunks):
+                r.update(k_v)
+        logger.debug(f"WikiApi: {len(args)} ids en {len(chunks)} consultas, {len(r)} respondidos")
+        return r
+
 
 WIKI = WikiApi()
 
@@ -86,4 +152,4 @@ if __name__ == "__main__":
     from core.log import config_log
     config_log("log/wiki.log", log_level=logging.DEBUG)
     import sys
-    print(WIKI.get_filmaffinity(*sys.argv[1:]))
\ No newline at end of file
+    print(WIKI.get_filmaffinity(*sys.argv[1:]))
@@ -1,6 +1,14 @@
-from typing import NamedTuple, Union
+from typing import NamedTuple, Union, Iterable, Optional, TypeVar, Generic
 from enum import Enum
 from core.util import getKm
+from functools import cache
+from collections import defaultdict
+from math import radians, cos, asin, sin, floor, degrees
+
+T = TypeVar("T")
+
+# mismo radio que getKm
+R_EARTH = 6371.0
 
 
 class Circle(NamedTuple):
@@ -8,13 +16,77 @@ class Circle(NamedTuple):
     lon: float
     kms: float
 
+    @property
+    def bbox(self) -> tuple[float, float, float, float]:
+        return _get_bbox(self)
+
     def get_km(self, lat: float, lon: float):
         return getKm(self.lat, self.lon, lat, lon)
 
+    def in_bbox(self, lat: float, lon: float):
+        lat_min, lat_max, lon_min, lon_max = self.bbox
+        return lat_min <= lat <= lat_max and lon_min <= lon <= lon_max
+
     def is_in(self, lat: float, lon: float):
+        if not self.in_bbox(lat, lon):
+            return False
         return self.get_km(lat, lon) <= self.kms
 
 
+@cache
+def _get_bbox(c: Circle):
+    # caja que contiene al círculo, con un 1% de margen para
+    # no descartar nunca un punto que haversine daría por dentro
+    d = (c.kms / R_EARTH) * 1.01
+    dlat = degrees(d)
+    dlon = degrees(asin(min(1, sin(d) / cos(radians(c.lat)))))
+    return (c.lat - dlat, c.lat + dlat, c.lon - dlon, c.lon + dlon)
+
+
+class SpatialIndex(Generic[T]):
+    """
+    Rejilla de celdas de `cell` grados con los círculos cuya caja la
+    toca, para que cada consulta solo calcule haversine contra los
+    pocos círculos cercanos. `find` devuelve el valor de la primera
+    entrada (en orden de declaración) que contiene el punto.
+    """
+
+    def __init__(self, entries: Iterable[tuple[T, Circle]], cell: float = 0.02):
+        self.__entries = tuple(entries)
+        self.__cell = cell
+        grid: dict[tuple[int, int], list[int]] = defaultdict(list)
+        for i, (_, c) in enumerate(self.__entries):
+            lat_min, lat_max, lon_min, lon_max = c.bbox
+            for x in range(self.__to_cell(lat_min), self.__to_cell(lat_max)+1):
+                for y in range(self.__to_cell(lon_min), self.__to_cell(lon_max)+1):
+                    grid[(x, y)].append(i)
+        self.__grid = {k: tuple(v) for k, v in grid.items()}
+
+    def __to_cell(self, x: float):
+        return floor(x / self.__cell)
+
+    def __candidates(self, lat: float, lon: float):
+        return self.__grid.get((self.__to_cell(lat), self.__to_cell(lon)), ())
+
+    def find(self, lat: float, lon: float) -> Optional[T]:
+        for i in self.__candidates(lat, lon):
+            val, c = self.__entries[i]
+            if c.is_in(lat, lon):
+                return val
+        return None
+
+    def find_all(self, points: Iterable[tuple[float, float]]) -> tuple[Optional[T], ...]:
+        return tuple(self.find(lat, lon) for lat, lon in points)
+
+    def get_km(self, lat: float, lon: float) -> Optional[float]:
+        km = None
+        for _, c in self.__entries:
+            aux = c.get_km(lat, lon)
+            if km is None or km > aux:
+                km = aux
+        return km
+
+
 class Zone(NamedTuple):
     name: str
     area: tuple[Circle, ...]
@@ -49,6 +121,11 @@ class Zone(NamedTuple):
         )
 
 
+@cache
+def _get_index(zones: tuple[Zone, ...]):
+    return SpatialIndex((z, c) for z in zones for c in z.area)
+
+
 class Circles(Enum):
     SOL = Circle(lat=40.416776435516745, lon=-3.7033224277568415, kms=0.7)
     CENTRO_SOL = Circle(lat=40.416776435516745, lon=-3.7033224277568415, kms=2)
@@ -75,6 +152,9 @@ class Circles(Enum):
     ALCALA_DE_HENARES = Circle(lat=40.48420151410674, lon=-3.3680555921752076, kms=6)
 
 
+CIRCLES = SpatialIndex((c, c.value) for c in Circles)
+
+
 class Zones(Enum):
     SOL = Zone.build(
         "Sol",
@@ -163,6 +243,10 @@ class Zones(Enum):
         Circle(lat=40.443655222892964, lon=-3.7268363944992062, kms=1)
     )
 
+    @staticmethod
+    def get_index(*zones: "Zones") -> SpatialIndex[Zone]:
+        return _get_index(tuple(z.value for z in zones))
+
 
 if __name__ == "__main__":
     import json
@@ -1,11 +1,13 @@
 #!/bin/bash
 URL="https://s-nt-s.github.io/imdb-sql/imdb.sqlite.zst"
-rm -rf imdb.sqlite
+rm -rf imdb.sqlite imdb.idx imdb.idx.tmp
 echo "[..] $URL"
 curl -sqL "$URL" | zstd -dq -o imdb.sqlite
 if [ $? -eq 0 ]; then
     echo "[OK] $URL"
+    python3 -m core.imdbindex imdb.sqlite imdb.idx.tmp && mv imdb.idx.tmp imdb.idx || rm -f imdb.idx.tmp
 else
     echo "[KO] $URL"
 fi
-ls -lah imdb.sqlite
\ No newline at end of file
+ls -lah imdb.sqlite
+ls -lah imdb.idx
@@ -26,18 +26,21 @@ from portal.goethe import Goethe
 from portal.ifrances import InstitutoFrances
 from portal.eventim import Eventim
 from datetime import datetime, date
-from core.util import find_cp, round_to_even, get_domain, find_duplicates, get_main_value, re_or, isWorkingHours, get_festivos, re_and
+from core.util import find_cp, round_to_even, get_domain, get_main_value, re_or, isWorkingHours, get_festivos, re_and, plain_text, RuleTable
 from core.publish import PublishDB
 import logging
-from typing import Tuple
+from typing import Tuple, Optional, Callable
+from dataclasses import fields
 from core.cache import TupleCache
+from core.expandurl import EXPANDER
+from core.dedup import Dedup, DedupRule, MinHashLSH, shingles, jaccard
 import re
 import pytz
 from collections import defaultdict
 from core.wiki import WIKI
 from core.filmaffinity import FilmAffinityApi
 from functools import cache
-from core.zone import Circles
+from core.zone import CIRCLES
 from core.place import Place, Places
 from portal.fundacionmarch import FundacionMarch
 from concurrent.futures import ThreadPoolExecutor
@@ -155,6 +158,7 @@ def isAlcalaOkDate(dt: datetime):
     )
 
 
+@cache
 def isOkDate(dt: datetime, delta: int = 0.5):
     if not(dt.year == 2026 and dt.month == 8 and dt.day <= 9):
         if ICS_BUSY and ICS_BUSY.is_in(dt):
@@ -167,6 +171,7 @@ def isOkDate(dt: datetime, delta: int = 0.5):
     return not isWorkingHours(dt, min_hour=min_hour)
 
 
+@cache
 def isOkDateVillaverde(dt: datetime):
     if ICS_BUSY_VILLAVERDE and ICS_BUSY_VILLAVERDE.is_in(dt):
         return False
@@ -180,6 +185,84 @@ def isOkDateVillaverde(dt: datetime):
     return not isWorkingHours(dt, min_hour=min_hour)
 
 
+# lugares fuera de Madrid o que no interesan, por dirección o por nombre
+RULES_KO_PLACE = RuleTable(
+    ("address", "address", (
+        r"Milano$",
+        r"Italy$",
+        r"Hortaleza$",
+        r"avenida de Betanzos",
+        r"Aranjuez,? Madrid",
+        r"San Lorenzo (de El|del) Escorial",
+        r"Legan[eé]s",
+        # Vicálvaro
+        r"Vic[aá]lvaro",
+        r", Barcelona(, \d+)$",
+        r"M[oó]stoles$",
+        r"Rivas-Vaciamadrid",
+    )),
+    ("name", "name", (
+        r"Collado Villalba",
+        "campus somosaguas",
+        "San Lorenzo de Escorial",
+        "Fuenlabrada",
+        "Museo L[aá]zaro Galdiano",
+        # Aranjuez
+        "Campus( de)? Aranjuez",
+        # Mostoles
+        "Campus( de)? M[oó]stoles",
+        "COAJ",
+        "Centro cultural Maestro Alonso",
+        "centro juvenil",
+        "Centro cultural Lope de Vega",
+        "Espacio Abierto Quinta de los Molinos",
+        "Parroquia Nuestra Señora de Guadalupe",
+        ("La Pedriza", "Manzanares"),
+        "AV La Vecinal del Barrio Bilbao y Pueblo Nuevo",
+        'Quinta de la Fuente del Berro',
+        'Espacio de igualdad María Telo',
+        # Collado Villaba
+        'CSO La Tejedora',
+        # Colón
+        'Centro cultural Emilia Pardo Bazán',
+        # Carabanchel
+        'Espacio de igualdad María de Maeztu',
+        'Espacio de igualdad Lourdes Hernández',
+        # Vallecas
+        'Mercado Numancia',
+        '^El espacio$',
+        'Centro cultural Las Californias',
+        'Centro cultural Alberto Sánchez',
+        'Biblioteca Miguel Delibes',
+        'Biblioteca Pública Miguel Hernández',
+        # Villaverde
+        'Espacio de igualdad Clara Campoamor',
+        # Usera
+        ("centro", 'Maris Stella'),
+        # Manuel Becerra
+        ('Centro', 'Rafael Altamira'),
+        ('Centro', 'Buenavista'),
+        # Urgel
+        ('Centro', 'Fernando Lázaro Carreter'),
+        # Getafe
+        ('Edificio Concepción Arenal', 'Getafe'),
+        # El pozo
+        ("palomeras bajas", "felipe( de)? diego"),
+        # Pacifico
+        ("Espacio de igualdad", "Elena Arnedo Soriano"),
+        # Colmenar Viejo
+        'Colmenar Viejo',
+        # Lucero
+        'CCM Lucero',
+        # Laguna
+        ("Asociacion Vecinal", "Fraternidad de los Carmenes"),
+        # Ciudad Lineal
+        "Parque (de )?Arriaga",
+    )),
+    flags=re.I
+)
+
+
 @cache
 def isOkPlace(p: Place | tuple[float, float] | str, address: str = None):
     latlon = None
@@ -198,113 +281,24 @@ def isOkPlace(p: Place | tuple[float, float] | str, address: str = None):
     if find_cp(address) in KO_CP:
         return False
 
-    if re_or(
-        address,
-        r"Milano$",
-        r"Italy$",
-        r"Hortaleza$",
-        r"avenida de Betanzos",
-        r"Aranjuez,? Madrid",
-        r"San Lorenzo (de El|del) Escorial",
-        r"Legan[eé]s",
-        # Vicálvaro
-        r"Vic[aá]lvaro",
-        r", Barcelona(, \d+)$",
-        r"M[oó]stoles$",
-        r"Rivas-Vaciamadrid",
-        flags=re.I
-    ):
+    ko = RULES_KO_PLACE.first(address=address, name=name)
+    if ko == "name":
+        logger.debug(f"Lugar descartado por name={name}")
+    if ko is not None:
         return False
-    if all(x is None for x in (latlon, name)):
-        return True
-    if name:
-        if re_or(
-            name,
-            r"Collado Villalba",
-            "campus somosaguas",
-            "San Lorenzo de Escorial",
-            "Fuenlabrada",
-            "Museo L[aá]zaro Galdiano",
-            # Aranjuez
-            "Campus( de)? Aranjuez",
-            # Mostoles
-            "Campus( de)? M[oó]stoles",
-            "COAJ",
-            "Centro cultural Maestro Alonso",
-            "centro juvenil",
-            "Centro cultural Lope de Vega",
-            "Espacio Abierto Quinta de los Molinos",
-            "Parroquia Nuestra Señora de Guadalupe",
-            ("La Pedriza", "Manzanares"),
-            "AV La Vecinal del Barrio Bilbao y Pueblo Nuevo",
-            'Quinta de la Fuente del Berro',
-            'Espacio de igualdad María Telo',
-            # Collado Villaba
-            'CSO La Tejedora',
-            # Colón
-            'Centro cultural Emilia Pardo Bazán',
-            # Carabanchel
-            'Espacio de igualdad María de Maeztu',
-            'Espacio de igualdad Lourdes Hernández',
-            # Vallecas
-            'Mercado Numancia',
-            '^El espacio$',
-            'Centro cultural Las Californias',
-            'Centro cultural Alberto Sánchez',
-            'Biblioteca Miguel Delibes',
-            'Biblioteca Pública Miguel Hernández',
-            # Villaverde
-            'Espacio de igualdad Clara Campoamor',
-            # Usera
-            ("centro", 'Maris Stella'),
-            # Manuel Becerra
-            ('Centro', 'Rafael Altamira'),
-            ('Centro', 'Buenavista'),
-            # Urgel
-            ('Centro', 'Fernando Lázaro Carreter'),
-            # Getafe
-            ('Edificio Concepción Arenal', 'Getafe'),
-            # El pozo
-            ("palomeras bajas", "felipe( de)? diego"),
-            # Pacifico
-            ("Espacio de igualdad", "Elena Arnedo Soriano"),
-            # Colmenar Viejo
-            'Colmenar Viejo',
-            # Lucero
-            'CCM Lucero',
-            # Laguna
-            ("Asociacion Vecinal", "Fraternidad de los Carmenes"),
-            # Ciudad Lineal
-            "Parque (de )?Arriaga",
-            flags=re.I
-        ):
-            logger.debug(f"Lugar descartado por name={name}")
-            return False
     if latlon is None:
         return True
     lat, lon = latlon
-    kms: list[float] = []
-    for c in Circles:
-        kms.append(c.value.get_km(lat, lon))
-        if kms[-1] <= c.value.kms:
-            return True
-    k = round(min(kms))
+    if CIRCLES.find(lat, lon) is not None:
+        return True
+    k = round(CIRCLES.get_km(lat, lon))
     logger.debug(f"Lugar descartado {k}km {p.name} {p.url}")
     return False
 
 
-def isKoEvent(e: Event):
-    if e.place == Places.TEATRO_PRICE.value:
-        if re_or(e.name, r'hop!?', flags=re.I):
-            return True
-    if e.place == Places.CAIXA_FORUM.value:
-        if re_or(e.name, "Conoce CaixaForum", "Descubre el jardín vertical", flags=re.I):
-            return True
-    if re_or(e.place.zone, "alcal[aá]( de)? henares", flags=re.I):
-        if re_and(e.name, r"cu[ée]ntame", r"experiencia", flags=re.I):
-            return True
-    if re_or(
-        e.place.name,
+# sitios donde no interesan las actividades gratuitas de algunas categorías
+RULES_KO_FREE_EVENT_PLACE = RuleTable(
+    ("place", True, (
         "Centro cultural Oporto",
         "Centro cultural Galileo",
         "Centro cultural Clara del Rey",
@@ -315,24 +309,40 @@ def isKoEvent(e: Event):
         'Biblioteca Eugenio Trías',
         'Biblioteca Benito Pérez Galdós',
         'Biblioteca Ana María Matute',
-        flags=re.I
-    ):
-        if e.price == 0 and e.category in (
-            Category.THEATER,
-            Category.VISIT,
-            Category.LITERATURE
-        ):
-            return True
-    if re_or(
-        e.name,
+    )),
+    flags=re.I
+)
+RULES_KO_EVENT_NAME = RuleTable(
+    ("name", True, (
         "Aprende Chotis",
         "tributo a Carmen Sevilla",
         r"Lectura en español y en ingl[eé]s",
         r"aniversario de (los )?(EE\.?UU|USA|estados unidos)",
         r"Visita dialogada Matadero",
         r"ven a bailar\b.*TabacaleraSwing",
-        flags=re.I
-    ):
+    )),
+    flags=re.I
+)
+
+
+def isKoEvent(e: Event):
+    if e.place == Places.TEATRO_PRICE.value:
+        if re_or(e.name, r'hop!?', flags=re.I):
+            return True
+    if e.place == Places.CAIXA_FORUM.value:
+        if re_or(e.name, "Conoce CaixaForum", "Descubre el jardín vertical", flags=re.I):
+            return True
+    if re_or(e.place.zone, "alcal[aá]( de)? henares", flags=re.I):
+        if re_and(e.name, r"cu[ée]ntame", r"experiencia", flags=re.I):
+            return True
+    if RULES_KO_FREE_EVENT_PLACE.first(place=e.place.name) is not None:
+        if e.price == 0 and e.category in (
+            Category.THEATER,
+            Category.VISIT,
+            Category.LITERATURE
+        ):
+            return True
+    if RULES_KO_EVENT_NAME.first(name=e.name) is not None:
         return True
     if e.place.zone == Zones.ALCALA_DE_HENARES.value.name:
         if e.category == Category.WORKSHOP and len(e.sessions)>1:
@@ -389,6 +399,175 @@ def find_filmaffinity_if_needed(imdb_film: dict[str, int], e: Cinema):
             return _id_
 
 
+def prefetch_filmaffinity(imdb_film: dict[str, int], *events: Event | Cinema):
+    # misma secuencia de búsquedas que find_filmaffinity_if_needed pero
+    # lanzando a la vez la siguiente búsqueda de cada película pendiente
+    pending: list[list[tuple[int, tuple[str, ...]]]] = []
+    for e in events:
+        if not isinstance(e, Cinema) or isinstance(e.filmaffinity, int):
+            continue
+        if isinstance(imdb_film.get(e.imdb), int) or isinstance(e.cycle, str):
+            continue
+        qs = list(e.iter_year_title())
+        if qs:
+            pending.append(qs)
+    while pending:
+        found = FilmAffinityApi.search_all(*(qs[0] for qs in pending))
+        pending = [qs[1:] for qs in pending if len(qs) > 1 and not isinstance(found.get(qs[0]), int)]
+
+
+RE_PIANO_CITY = re.compile(r"\bPiano[\-\s]*city", flags=re.I)
+RE_DEDUP_URL = (
+    re.compile(r"^https://www\.condeduquemadrid\.es/actividades/\S+$"),
+    re.compile(r"^https://www\.teatroespanol.es/\S+$"),
+    re.compile(r"^https://21distritos\.es/evento/\S+$"),
+    re.compile(r"^https://tienda\.madrid-destino\.com/es/\S+$"),
+    re.compile(r"^https://www\.teatrocircoprice\.es/programacion/\S+$"),
+    re.compile(r"^https://www\.centrocentro\.org/\S+$"),
+    re.compile(r"^https://ateneodemadrid\.com/evento/\S+$"),
+    re.compile(r"^https://www\.eventim-light\.com/es/a/[a-z0-9]+/e/[a-z0-9]+$"),
+    re.compile(r"^https://www\.reservaentradas\.com/entrada/madrid/[^/]+/[^/]+/\d+/$")
+)
+
+
+def _mk_key_piano_city(e: Event):
+    if not any((
+        RE_PIANO_CITY.search(e.cycle or ''),
+        RE_PIANO_CITY.search(e.name or ''),
+        RE_PIANO_CITY.search(" ".join(e.iter_urls())),
+    )):
+        return None
+    return ((e.category, e.place, e.price), )
+
+
+def _fusion_piano_city(evs: tuple[Event, ...]):
+    return Event.fusion(
+        *evs,
+        more="https://pianocitymadrid.es/",
+        name="Piano City"
+    )
+
+
+def _mk_key_cycle(e: Event | Cinema):
+    if not e.cycle:
+        return None
+    urls: set[str] = set()
+    for s in e.sessions:
+        if s.url and get_domain(s.url) != "madrid.es":
+            urls.add(s.url)
+    if len(e.sessions) == 1 or len(urls) == 0:
+        return ((e.cycle, e.category, e.place, round_to_even(e.price)), )
+
+
+def _fusion_cycle(evs: tuple[Event, ...]):
+    cycle = next(x.cycle for x in evs if x.cycle)
+    e = Event.fusion(
+        *evs,
+        name=cycle,
+    )
+    st_more = set(x.more for x in evs if x.more)
+    st_url = set(x.url for x in evs if x.url)
+    if all(s.url for s in e.sessions):
+        e = e.merge(url=None, more=None)
+    if len(st_url) == 1 and e.url is None:
+        e = e.merge(url=st_url.pop())
+    if len(st_more) == 1 and e.url is None:
+        e = e.merge(url=st_more.pop())
+    if len(st_more) == 1 and e.more is None:
+        e = e.merge(more=st_more.pop())
+    return e
+
+
+def _mk_key_place_name(e: Event | Cinema):
+    name = re.sub(r"[:'',\.«»]", "", e.name).lower()
+    return ((e.place, e.category, name, e.price), )
+
+
+def _mk_key_url(e: Event | Cinema):
+    urls = tuple(e.iter_urls())
+    for i, re_url in enumerate(RE_DEDUP_URL):
+        for u in urls:
+            if re_url.match(u):
+                yield (i, u, e.place, e.price)
+                break
+
+
+def _mk_key_filmaffinity(e: Event | Cinema):
+    if e.category != Category.CINEMA:
+        return None
+    if not isinstance(e, Cinema) or e.filmaffinity is None:
+        e = e.fix_type().fix()
+    if isinstance(e, Cinema) and e.filmaffinity is not None:
+        return ((e.place, e.category, e.name, e.filmaffinity), )
+
+
+def _mk_key_film(e: Event | Cinema):
+    if e.category != Category.CINEMA:
+        return None
+    return ((e.place, e.category, e.name), )
+
+
+DEDUP_RULES = (
+    DedupRule("piano_city", _mk_key_piano_city, _fusion_piano_city),
+    DedupRule("cycle", _mk_key_cycle, _fusion_cycle),
+    DedupRule("place_name", _mk_key_place_name),
+    DedupRule("url", _mk_key_url),
+    DedupRule("filmaffinity", _mk_key_filmaffinity),
+    DedupRule("film", _mk_key_film),
+)
+
+
+class FuzzyTitle:
+    """
+    Detecta duplicados publicados por portales distintos cuyo título no
+    coincide exactamente (tildes, prefijos «Ciclo X:», años...).
+    Los candidatos salen de MinHash/LSH sobre los trigramas del título,
+    agrupados por lugar y día, y se confirman con jaccard >= threshold.
+    Con dry_run solo se informa de las parejas, sin fusionarlas.
+    """
+    RE_PREFIX = re.compile(r"^\s*(ciclo|festival|programa)\b[^:]{0,80}:\s*", re.IGNORECASE)
+    RE_YEAR = re.compile(r"\s*[\(\[]?\b(19|20)\d{2}\b[\)\]]?\s*$")
+
+    def __init__(self, threshold: float = 0.8, dry_run: bool = False):
+        self.__lsh = MinHashLSH(threshold)
+        self.__dry_run = dry_run
+        self.candidates: dict[tuple[str, str], tuple[float, Event, Event]] = {}
+
+    @property
+    def rule(self):
+        return DedupRule("fuzzy_title", self.mk_keys, is_match=self.is_match)
+
+    @staticmethod
+    @cache
+    def get_shingles(name: str):
+        name = FuzzyTitle.RE_PREFIX.sub("", name or "")
+        name = FuzzyTitle.RE_YEAR.sub("", name)
+        return shingles(plain_text(name))
+
+    def mk_keys(self, e: Event | Cinema):
+        if e.place is None:
+            return None
+        days = set(s.date[:10] for s in e.sessions)
+        if len(days) == 0:
+            return None
+        bands = tuple(self.__lsh.iter_bands(self.get_shingles(e.name)))
+        return ((e.place, e.category, d, b) for d in days for b in bands)
+
+    def is_match(self, a: Event | Cinema, b: Event | Cinema):
+        if not set(a.sites).isdisjoint(b.sites):
+            return False
+        sim = jaccard(self.get_shingles(a.name), self.get_shingles(b.name))
+        if sim < self.__lsh.threshold:
+            return False
+        self.candidates[(a.id, b.id)] = (sim, a, b)
+        return not self.__dry_run
+
+    def log_report(self):
+        label = "candidato" if self.__dry_run else "fusión"
+        for sim, a, b in sorted(self.candidates.values(), key=lambda x: x[0]):
+            logger.info(f"FuzzyTitle {label} {sim:.2f}: {a.id} {a.name!r} ~ {b.id} {b.name!r}")
+
+
 class EventCollector:
     def __init__(
         self,
@@ -396,14 +575,19 @@ class EventCollector:
         max_sessions: int,
         publish: PublishDB,
         categories: Tuple[Category, ...],
+        fuzzy_threshold: float | None = 0.8,
+        fuzzy_dry_run: bool = False,
     ):
         self.__eventbrite = EventBriteApi()
+        self.__fuzzy_threshold = fuzzy_threshold
+        self.__fuzzy_dry_run = fuzzy_dry_run
         self.__max_price = max_price
         self.__max_max_price = max(self.__max_price.values())
         self.__max_sessions = max_sessions
         self.__categories = categories
         self.__publish = publish
         self.__madrid_destino = MadridDestino()
+        self.__verdicts: dict[tuple, tuple[bool, tuple[Session, ...], Optional[tuple[Callable, str]]]] = {}
         self.__avoid_categories = tuple(set({
             Category.CHILDISH,
             Category.SENIORS,
@@ -515,6 +699,7 @@ class EventCollector:
                 CasaMexico,
             )
         logger.info(f"{len(eventos)} recuperados")
+        eventos = self.__expand_urls(eventos)
         eventos = tuple(filter(self.__filter, eventos))
         eventos = self.__madrid_destino.fix_sessions(eventos)
         eventos = self.__eventbrite.fix_events(eventos)
@@ -532,28 +717,49 @@ class EventCollector:
         logger.info(f"{len(arr)} pasan 2º filtrados")
         return tuple(arr)
 
+    def __expand_urls(self, events: Tuple[Event | Cinema, ...]):
+        # solo pide las que no estén ya resueltas, así que se puede repetir
+        # con los eventos que van apareciendo después (madrid destino,
+        # eventbrite, fusiones...)
+        EXPANDER.expand(*(u for e in events for u in e.iter_urls()))
+        return tuple(e.expand_urls() for e in events)
+
     @cache
     def get_max_price(self, category: Category) -> float:
         if category in self.__max_price:
             return self.__max_price[category]
         return max(self.__max_price.values())
 
+    @staticmethod
+    def __content_key(e: Event):
+        return (type(e), ) + tuple(getattr(e, f.name) for f in fields(e) if f.compare)
+
     def __filter(self, e: Event, to_log=True):
+        key = self.__content_key(e)
+        verdict = self.__verdicts.get(key)
+        if verdict is None:
+            verdict = self.__get_verdict(e, to_log=to_log)
+            self.__verdicts[key] = verdict
+        ok, sessions, reason = verdict
+        object.__setattr__(e, 'sessions', sessions)
+        # el recorte de sesiones es idempotente: el evento ya
+        # recortado tiene el mismo veredicto
+        self.__verdicts.setdefault(self.__content_key(e), verdict)
+        if reason and to_log:
+            log, msg = reason
+            log(msg)
+        return ok
+
+    def __get_verdict(self, e: Event, to_log=True):
         if isKoEvent(e):
-            return False
+            return False, e.sessions, None
         if not isOkPlace(e.place.name, e.place.address):
-            if to_log:
-                logger.debug(f"Descartada por place={e.place.name} {e.url}")
-            return False
+            return False, e.sessions, (logger.debug, f"Descartada por place={e.place.name} {e.url}")
         max_price = self.get_max_price(e.category)
         if e.price > max_price:
-            if to_log:
-                logger.debug(f"Descartada por price={e.price} {e.url or e.id}")
-            return False
+            return False, e.sessions, (logger.debug, f"Descartada por price={e.price} {e.url or e.id}")
         if e.category not in self.__categories:
-            if to_log:
-                logger.debug(f"Descartada por category={e.category.name} {e.url or e.id}")
-            return False
+            return False, e.sessions, (logger.debug, f"Descartada por category={e.category.name} {e.url or e.id}")
 
         #if "madrid.es" in map(get_domain, e.iter_urls()):
         #    if e.place.name in (
@@ -567,14 +773,10 @@ class EventCollector:
 
         count_session = len(e.sessions)
         if count_session == 0:
-            if to_log:
-                logger.debug(f"Descartada por 0 sesiones {e.url or e.id}")
-            return False
+            return False, e.sessions, (logger.debug, f"Descartada por 0 sesiones {e.url or e.id}")
         if count_session > self.__max_sessions:
-            if to_log:
-                logger.warning(f"Tiene {count_session} sesiones {e.url or e.id}")
-            return False
-        return True
+            return False, e.sessions, (logger.warning, f"Tiene {count_session} sesiones {e.url or e.id}")
+        return True, e.sessions, None
 
     def get_events(self):
         aux = self.__get_events()
@@ -582,6 +784,7 @@ class EventCollector:
         aux = self.__check_sessions(aux)
         aux = self.__complete_filmaffinity(aux)
         aux = self.__complete_url(aux)
+        aux = self.__expand_urls(aux)
 
         events: list[Event | Cinema] = []
         for e in filter(self.__filter, aux):
@@ -628,139 +831,26 @@ class EventCollector:
                     if self.__filter(e, to_log=False):
                         ok_events.add(e)
 
+        ok_events = set(self.__expand_urls(tuple(ok_events)))
         ok_events = self.__dedup_fusion(ok_events)
 
-        return tuple(e.fix_type().fix() for e in ok_events)
+        events = tuple(e.fix_type() for e in ok_events)
+        Cinema.prefetch_imdb(*events)
+        Event.prefetch_books(*events)
+        return tuple(e.fix() for e in events)
 
     def __dedup_fusion(self, ok_events: set[Event]):
-        def _mk_key_piano_city(e: Event):
-            re_pianio = re.compile(r"\bPiano[\-\s]*city", flags=re.I)
-            if not any((
-                re_pianio.search(e.cycle or ''),
-                re_pianio.search(e.name or ''),
-                re_pianio.search(" ".join(e.iter_urls())),
-            )):
-                return None
-            return (e.category, e.place, e.price)
-
-        for evs in find_duplicates(
-            ok_events,
-            _mk_key_piano_city
-        ):
-            for e in evs:
-                ok_events.remove(e)
-
-            e = Event.fusion(
-                *evs,
-                more="https://pianocitymadrid.es/",
-                name="Piano City"
-            )
-            ok_events.add(e)
-
-        def _mk_key_cycle(e: Event | Cinema):
-            if not e.cycle:
-                return None
-            urls: set[str] = set()
-            for s in e.sessions:
-                if s.url and get_domain(s.url) != "madrid.es":
-                    urls.add(s.url)
-            if len(e.sessions) == 1 or len(urls) == 0:
-                return (e.cycle, e.category, e.place, round_to_even(e.price))
-
-        for evs in find_duplicates(
-            ok_events,
-            _mk_key_cycle
-        ):
-            for e in evs:
-                ok_events.remove(e)
-            e = Event.fusion(
-                *evs,
-                name=evs[0].cycle,
-            )
-            st_more = set(x.more for x in evs if x.more)
-            st_url = set(x.url for x in evs if x.url)
-            if all(s.url for s in e.sessions):
-                e = e.merge(url=None, more=None)
-            if len(st_url) == 1 and e.url is None:
-                e = e.merge(url=st_url.pop())
-            if len(st_more) == 1 and e.url is None:
-                e = e.merge(url=st_more.pop())
-            if len(st_more) == 1 and e.more is None:
-                e = e.merge(more=st_more.pop())
-            ok_events.add(e)
-
-        def _mk_place_name(e: Event | Cinema):
-            name = re.sub(r"[:'',\.«»]", "", e.name).lower()
-            k = (e.place, e.category, name, e.price) #, tuple((s.date for s in e.sessions)))
-            return k
-
-        for evs in find_duplicates(
-            ok_events,
-            _mk_place_name
-        ):
-            for e in evs:
-                ok_events.remove(e)
-            e = Event.fusion(*evs)
-            ok_events.add(e)
-
-        for re_url in (
-            re.compile(r"^https://www\.condeduquemadrid\.es/actividades/\S+$"),
-            re.compile(r"^https://www\.teatroespanol.es/\S+$"),
-            re.compile(r"^https://21distritos\.es/evento/\S+$"),
-            re.compile(r"^https://tienda\.madrid-destino\.com/es/\S+$"),
-            re.compile(r"^https://www\.teatrocircoprice\.es/programacion/\S+$"),
-            re.compile(r"^https://www\.centrocentro\.org/\S+$"),
-            re.compile(r"^https://ateneodemadrid\.com/evento/\S+$"),
-            re.compile(r"^https://www\.eventim-light\.com/es/a/[a-z0-9]+/e/[a-z0-9]+$"),
-            re.compile(r"^https://www\.reservaentradas\.com/entrada/madrid/[^/]+/[^/]+/\d+/$")
-        ):
-            def _mk_url(e: Event | Cinema):
-                for u in e.iter_urls():
-                    if re_url.match(u):
-                        return (u, e.place, e.price)
-
-            for evs in find_duplicates(
-                ok_events,
-                _mk_url
-            ):
-                for e in evs:
-                    ok_events.remove(e)
-                e = Event.fusion(*evs)
-                ok_events.add(e)
-
-        def _mk_filmaffinity(e: Event | Cinema):
-            if e.category != Category.CINEMA:
-                return None
-            e = e.fix_type().fix()
-            if isinstance(e, Cinema) and e.filmaffinity is not None:
-                k = (e.place, e.category, e.name, e.filmaffinity)
-                return k
-
-        for evs in find_duplicates(
-            ok_events,
-            _mk_filmaffinity
-        ):
-            for e in evs:
-                ok_events.remove(e)
-            e = Event.fusion(*evs)
-            ok_events.add(e)
-
-        def _mk_film(e: Event | Cinema):
-            if e.category != Category.CINEMA:
-                return None
-            k = (e.place, e.category, e.name)
-            return k
-
-        for evs in find_duplicates(
-            ok_events,
-            _mk_film
-        ):
-            for e in evs:
-                ok_events.remove(e)
-            e = Event.fusion(*evs)
-            ok_events.add(e)
-
-        return ok_events
+        rules = DEDUP_RULES
+        fuzzy = None
+        if self.__fuzzy_threshold is not None:
+            fuzzy = FuzzyTitle(self.__fuzzy_threshold, dry_run=self.__fuzzy_dry_run)
+            rules = rules + (fuzzy.rule, )
+        dd = Dedup(*rules, fusion=Event.fusion)
+        events = dd.run(sorted(ok_events, key=lambda e: e.id))
+        dd.log_report(to_str=lambda e: e.id)
+        if fuzzy is not None:
+            fuzzy.log_report()
+        return set(events)
 
     def __complete_filmaffinity(self, events: Tuple[Event | Cinema, ...]):
         arr1 = list(events)
@@ -769,6 +859,7 @@ class EventCollector:
             if isinstance(e, Cinema) and e.imdb and e.filmaffinity is None:
                 imdb.add(e.imdb)
         imdb_film = WIKI.get_filmaffinity(*imdb)
+        prefetch_filmaffinity(imdb_film, *arr1)
         for i, e in enumerate(arr1):
             filmaffinity = find_filmaffinity_if_needed(imdb_film, e)
             if filmaffinity:
@@ -1,7 +1,7 @@
 from core.gancio import GancioPortal, Event as GancioEvent
 from core.ics import IcsReader, IcsEventWrapper
 from core.event import Event, Place, Category, Session, CategoryUnknown
-from core.util import plain_text, find_duplicates, re_or, re_and, get_domain, find_euros
+from core.util import plain_text, find_duplicates, re_or, re_and, get_domain, find_euros, RuleTable
 import re
 import logging
 from typing import Callable
@@ -24,6 +24,132 @@ def clean_name(name: str):
     return name
 
 
+RULES_ICS_SUMMARY = RuleTable(
+    ("summary", Category.NO_EVENT, (
+        r"Asesorías? legal(es)?",
+        r"Asesorías? laboral(es)?",
+        ("Redes Libertarias", r"n[úu]mero", "revista"),
+        r"Acto anual de gratitud a las socias y los socios",
+    )),
+    ("summary", Category.ACTIVISM, (
+        r"Mesa ciudadana del [aá]rbol",
+    )),
+    ("summary", Category.LITERATURE, (
+        ("presentaci[oó]n del?", ("libro", "novela")),
+    )),
+    ("summary", Category.EXPO, (
+        "exposici[oó]n(es)?",
+    )),
+    ("summary", Category.WORKSHOP, (
+        "taller",
+        "formaci[óo]n",
+    )),
+    ("summary", Category.CONFERENCE, (
+        "Ciclo de conferencias",
+        "Charla Informativa",
+    )),
+    ("summary", Category.READING_CLUB, (
+        "Club de lectura",
+    )),
+    ("summary", Category.CINEMA, (
+        r"proyecci[oó]n de cortos",
+    )),
+    flags=re.I
+)
+
+RULES_ICS_DESCRIPTION = RuleTable(
+    ("description", Category.MUSIC, (
+        ("M[úu]sica", ("compositor", "voz", "viol[íi]n")),
+    )),
+    ("description", Category.CONFERENCE, (
+        (("Abre el acto", "Presenta", "modera"), ("Intervienen?", "con: ")),
+    )),
+    ("description", Category.CONFERENCE, (
+        "conversa(re)?mos con",
+        r"^Charla",
+    )),
+    flags=re.I
+)
+
+RULES_GANCIO_TEXT = RuleTable(
+    ("name", Category.SPORT, (
+        "Ruta",
+        ("naturalista", "jar[áa]ma"),
+    )),
+    ("name", Category.READING_CLUB, (
+        "Filosof[ií]a PEC",
+    )),
+    ("name", Category.CINEMA, (
+        "Pelis y Pili",
+    )),
+    ("txt_desc", Category.CONFERENCE, (
+        r"Damos la charlita",
+        "Charla cr[ií]tica",
+        "charla sobre",
+        "vendr[aá]n a conversar sobre",
+        "conferencia",
+        "conversaremos con",
+        ("jornada", "auditorio"),
+        "A lo largo de la charla",
+        "conservatorio",
+        ("Encuentros?", "conversaci[óo]n(es)?"),
+        r"en este coloquio",
+        r"Habr[aá] charla",
+    )),
+    ("txt_desc", Category.MUSIC, (
+        "m[uú]sica electr[óo]nica",
+    )),
+    ("txt_desc", Category.WORKSHOP, (
+        "hacer arte cutre",
+    ), 0),
+    ("txt_desc", Category.PARTY, (
+        ("performance", "micr[óo]fono abierto", "DJ Set(lists?)?"),
+        ("Karaoke", r"DJ Set(s|lists?)?"),
+        ("pintxadas?", "elektronikas?"),
+    )),
+    ("txt_desc", Category.THEATER, (
+        "comedia perform[aá]tica",
+    )),
+    ("txt_desc", Category.WORKSHOP, (
+        "taller",
+        "Curso presencial",
+    )),
+    ("txt_desc", Category.READING_CLUB, (
+        "razonar en com[uú]n",
+        "club de lectura",
+        r"Lectura y discusi[oó]n p[uú]blica",
+        r"grupo abierto de lectura",
+        r"leer un texto y razonar",
+    )),
+    flags=re.I
+)
+
+RULES_GANCIO_FALLBACK = RuleTable(
+    ("place", Category.ACTIVISM, (
+        ("^desde", "hasta"),
+    )),
+    ("title", Category.ACTIVISM, (
+        "Plenario",
+    )),
+    ("txt_desc", Category.LITERATURE, (
+        "Hablaremos con .*? sobre su libro",
+        "presentamos el nuevo libro",
+    )),
+    ("txt_desc", Category.CINEMA, (
+        "proyectamos el documental",
+        "Duraci[oó]n del documental",
+    )),
+    ("txt_desc", Category.WORKSHOP, (
+        ("hablaremos sobre", "trae tu libreta"),
+    )),
+    ("txt_desc", Category.CONFERENCE, (
+        "Tu nube seca mi río",
+        ("jornadas?", "charlas?"),
+    )),
+    flags=re.I
+)
+
+
 class MadConvoca(Base):
     def __init__(
         self,
@@ -208,65 +334,9 @@ class MadConvoca(Base):
                     return True
             return False
 
-        if re_or(
-            e.SUMMARY,
-            r"Asesorías? legal(es)?",
-            r"Asesorías? laboral(es)?",
-            ("Redes Libertarias", r"n[úu]mero", "revista"),
-            r"Acto anual de gratitud a las socias y los socios",
-            flags=re.I,
-            to_log=e.UID
-        ):
-            return Category.NO_EVENT
-        if re_or(
-            e.SUMMARY,
-            r"Mesa ciudadana del [aá]rbol",
-            flags=re.I,
-            to_log=e.UID
-        ):
-            return Category.ACTIVISM
-        if re_and(
-            e.SUMMARY,
-            "presentaci[oó]n del?",
-            ("libro", "novela"),
-            flags=re.I,
-            to_log=e.UID
-        ):
-            return Category.LITERATURE
-        if re_or(
-            e.SUMMARY,
-            "exposici[oó]n(es)?",
-            flags=re.I,
-            to_log=e.UID
-        ):
-            return Category.EXPO
-        if re_or(
-            e.SUMMARY,
-            "taller",
-            "formaci[óo]n",
-            flags=re.I,
-            to_log=e.UID
-        ):
-            return Category.WORKSHOP
-        if re_or(
-            e.SUMMARY,
-            "Ciclo de conferencias",
-            "Charla Informativa",
-            flags=re.I
-        ):
-            return Category.CONFERENCE
-        if re_or(
-            e.SUMMARY,
-            "Club de lectura",
-            flags=re.I
-        ):
-            return Category.READING_CLUB
-        if re_or(
-            e.SUMMARY,
-            r"proyecci[oó]n de cortos",
-            flags=re.I
-        ):
-            return Category.CINEMA
+        cat = RULES_ICS_SUMMARY.first(summary=e.SUMMARY, to_log=e.UID)
+        if cat is not None:
+            return cat
 
         if _has_cat(r"Proyecci[óo]n", "cinef[óo]rum"):
             return Category.CINEMA
@@ -279,27 +349,9 @@ class MadConvoca(Base):
         if _has_cat(r"Mesa redonda", "Conferencias", "Charlas?", 'Homenaje'):
             return Category.CONFERENCE
 
-        if re_and(
-            e.DESCRIPTION,
-            "M[úu]sica",
-            ("compositor", "voz", "viol[íi]n"),
-            flags=re.I
-        ):
-            return Category.MUSIC
-        if re_and(
-            e.DESCRIPTION,
-            ("Abre el acto", "Presenta", "modera"),
-            ("Intervienen?", "con: "),
-            flags=re.I
-        ):
-            return Category.CONFERENCE
-        if re_or(
-            e.DESCRIPTION,
-            "conversa(re)?mos con",
-            r"^Charla",
-            flags=re.I
-        ):
-            return Category.CONFERENCE
+        cat = RULES_ICS_DESCRIPTION.first(description=e.DESCRIPTION)
+        if cat is not None:
+            return cat
         if _has_cat(r"exposiciones"):
             return Category.EXPO
         if re_or(
@@ -510,71 +562,9 @@ class MadConvoca(Base):
             return Category.WORKSHOP
         if has_tag_or_title("paseo") and has_tag_or_title("historia"):
             return Category.VISIT
-        if re_or(
-            name,
-            "Ruta",
-            ("naturalista", "jar[áa]ma"),
-            flags=re.I
-        ):
-            return Category.SPORT
-        if re_or(
-            name,
-            "Filosof[ií]a PEC",
-            flags=re.I
-        ):
-            return Category.READING_CLUB
-        if re_or(
-            name,
-            "Pelis y Pili",
-            flags=re.I
-        ):
-            return Category.CINEMA
-
-        if re_or(
-            txt_desc,
-            r"Damos la charlita",
-            "Charla cr[ií]tica",
-            "charla sobre",
-            "vendr[aá]n a conversar sobre",
-            "conferencia",
-            "conversaremos con",
-            ("jornada", "auditorio"),
-            "A lo largo de la charla",
-            "conservatorio",
-            ("Encuentros?", "conversaci[óo]n(es)?"),
-            r"en este coloquio",
-            r"Habr[aá] charla",
-            flags=re.I,
-            to_log=e.id
-        ):
-            return Category.CONFERENCE
-        if re_or(txt_desc, "m[uú]sica electr[óo]nica", flags=re.I, to_log=e.id):
-            return Category.MUSIC
-        if re_or(txt_desc, "hacer arte cutre"):
-            return Category.WORKSHOP
-        if re_or(
-            txt_desc,
-            ("performance", "micr[óo]fono abierto", "DJ Set(lists?)?"),
-            ("Karaoke", r"DJ Set(s|lists?)?"),
-            ("pintxadas?", "elektronikas?"),
-            to_log=e.id,
-            flags=re.I
-        ):
-            return Category.PARTY
-        if re_or(txt_desc, "comedia perform[aá]tica", flags=re.I, to_log=e.id):
-            return Category.THEATER
-        if re_or(txt_desc, "taller", "Curso presencial", flags=re.I, to_log=e.id):
-            return Category.WORKSHOP
-        if re_or(
-            txt_desc,
-            "razonar en com[uú]n",
-            "club de lectura",
-            r"Lectura y discusi[oó]n p[uú]blica",
-            r"grupo abierto de lectura",
-            r"leer un texto y razonar",
-            flags=re.I
-        ):
-            return Category.READING_CLUB
+        cat = RULES_GANCIO_TEXT.first(name=name, txt_desc=txt_desc, to_log=e.id)
+        if cat is not None:
+            return cat
 
         if isLibreria and re_or(
             name,
@@ -597,43 +587,9 @@ class MadConvoca(Base):
             return Category.SPORT
         if has_tag_or_title("dramaturgia"):
             return Category.THEATER
-        if re_and(e.place.name, "^desde", "hasta", flags=re.I):
-            return Category.ACTIVISM
-        if re_or(e.title, "Plenario", flags=re.I):
-            return Category.ACTIVISM
-
-        if re_or(
-            txt_desc,
-            "Hablaremos con .*? sobre su libro",
-            "presentamos el nuevo libro",
-            flags=re.I,
-            to_log=e.id
-        ):
-            return Category.LITERATURE
-        if re_or(
-            txt_desc,
-            "proyectamos el documental",
-            "Duraci[oó]n del documental",
-            flags=re.I,
-            to_log=e.id
-        ):
-            return Category.CINEMA
-        if re_and(
-            txt_desc,
-            "hablaremos sobre",
-            "trae tu libreta",
-            flags=re.I,
-            to_log=e.id
-        ):
-            return Category.WORKSHOP
-        if re_or(
-            txt_desc,
-            "Tu nube seca mi río",
-            ("jornadas?", "charlas?"),
-            flags=re.I,
-            to_log=e.id
-        ):
-            return Category.CONFERENCE
+        cat = RULES_GANCIO_FALLBACK.first(place=e.place.name, title=e.title, txt_desc=txt_desc, to_log=e.id)
+        if cat is not None:
+            return cat
         if has_tag("ecoaldea") and has_tag("encuentro"):
             return Category.NO_EVENT
         if re_or(
@@ -3,7 +3,7 @@ from bs4 import Tag
 import re
 from typing import Set, Tuple, Optional, NamedTuple
 from core.event import Event, Cinema, Session, Place, Category, CategoryUnknown, FIX_EVENT, find_book_category
-from core.util import plain_text, re_or, re_and, get_domain, find_euros, KO_MORE, KO_IMG, find_duplicates
+from core.util import plain_text, re_or, re_and, get_domain, find_euros, KO_MORE, KO_IMG, find_duplicates, RuleTable
 from core.util import tp_join
 from arrow import Arrow
 import logging
@@ -172,6 +172,391 @@ class ApiInfo(NamedTuple):
     ics: tuple[IcsEventWrapper, ...] = tuple()
 
 
+RULES_AUDIENCE = RuleTable(
+    ("title", Category.CHILDISH, (
+        r"concierto infantil",
+        r"en familia",
+        r"elaboraci[óo]n de comederos de aves",
+        r"los [\d\. ]+ primeros d[íi]as no se repiten",
+        r"photocall hinchable",
+        r"^re vuelta al patio",
+        r"Visita familiar",
+        r"taller familiar",
+        r"huerto familiar",
+        r"Taller infantil",
+        r"Pedag[óo]gico Infantil",
+        r"Actividad(es)? infantil(es)?",
+        (r"dia", r"internacional", r"familias?"),
+        (r"taller", r"pequeños"),
+        r"Exploraci[oó]n Infantil",
+        r"cuento infantil",
+        r"Concierto matinal familiar",
+    )),
+    ("description", Category.CHILDISH, (
+        r"Espect[aá]culo infantil",
+        r"musical? infantil",
+        r"teatro infantil",
+        r"relatos en familia",
+        r"concierto familiar",
+        r"bienestar de niñ[ao]s y niñ[oa]s",
+        r"donde los niñ[ao]s y niñ[oa]s pueden",
+        r"orientad[oa] al p[uú]blico infantil",
+        r"Recomendado para niñ[aox@e]s",
+        r"familias con menores",
+        r"familias con niñ[aox@e]s",
+        r"De \d a (\d|1\d) años",
+        r"entre \d y (\d|1\d) años",
+        (r"cuentacuentos", r"en familia"),
+        r"Para familias e infancias",
+        r"cuento infantil",
+        r"compartir en familia",
+    )),
+    ("title", Category.YOUTH, (
+        "taller juvenil",
+        "Teenage Party",
+    )),
+    ("title", Category.SENIORS, (
+        "para mayores$",
+    )),
+    ("title", Category.MATERNITY, (
+        r"Grupo de crianza",
+        r"La Liga de la Leche",
+        r"Aula Digital.*Ada Lovelace",
+    )),
+    flags=re.I
+)
+
+RULES_TITLE_OVER_TYPE = RuleTable(
+    ("title", Category.NO_EVENT, (
+        "Voluntarios? por Madrid",
+        r"Esquej[oó]dromo",
+        r"Intercambio( y recomendaciones)? de libros",
+        r"Encuentro de nuevas promociones fhcn",
+        r"Preg[oó]n (a cargo|de las fiestas)",
+        r"Federaci[oó]n de Grupos Tradicionales Madrileños",
+    )),
+    ("title", Category.POETRY, (
+        r"d[íi]a mundial de la poes[íi]a",
+        r"encuentro po[ée]tico",
+        r"Recital de poes[íi]a",
+        r"Versos entrevistados",
+        r"Presentaci[óo]n del poemario",
+        r"^T[eé] y poes[ií]a",
+        r"encuentro de poetas",
+        r"UNCAREMA",
+    )),
+    ("title", Category.EXPO, (
+        r"Muestra de proyectos \d+",
+    )),
+    ("title", Category.ACTIVISM, (
+        "Grupo de hombres por la Igualdad",
+        "^C[ií]rculo de Mujeres$",
+    )),
+    ("title", Category.SPAM, (
+        r"Primeros pasos con Gmail",
+        r"Quiero usar mi m[oó]vil",
+        r"Tertulia de toros",
+        r"Misa mayor",
+        r"Procesi[oó]n de (Ntra|Nuestra)",
+        r"Bert[ií]n Osborne",
+    )),
+    flags=re.I
+)
+
+RULES_UNTYPED = RuleTable(
+    ("description", Category.SPAM, (
+        r"Encuentro Experiencias del Alma",
+    )),
+    ("title", Category.CIRCUS, (
+        "Circo y Malabares",
+    )),
+    ("description", Category.PUPPETRY, (
+        r"espect[aá]culo de t[íi]teres",
+    )),
+    ("description", Category.CINEMA, (
+        r"Una proyecci[oó]n de la pel[ií]cula",
+        r"Documental y Coloquio",
+    )),
+    ("title", Category.WORKSHOP, (
+        r"Mejora tu ingl[eé]s con charlas",
+        r"Reconocimiento de [aá]rboles",
+        "taller de escritura",
+        "Aprende Chotis",
+        r"Iniciaci[oó]n al cultivo",
+        "Editatona",
+        r"Armon[ií]a Coral Participativa",
+        r"taller (hagamos|desayunos|de onigiri)",
+        r"Decora tu propia torta gallega",
+        r"degustaci[oó]n de",
+    )),
+    ("title", Category.HIKING, (
+        "Salida medioambiental",
+    )),
+    ("title", Category.EXPO, (
+        r"^exposici[oó]n(es)$",
+    )),
+    ("title", Category.MUSIC, (
+        r"^conciertos?$",
+        r"Composici[oó]n musical para",
+        r"Festival Centro al comp[áa]s",
+        r"Cuarteto de Cuerda",
+        r"tertulia musical",
+        r"Folksongs",
+        r"Madrid a Tempo",
+        r"Madrid en canciones",
+        r"M[uú]sica de cine",
+        r"Actuaci[oó]n (orquesta|DJ|grupo|banda|agrupaci[óo]n)",
+        r"Vem[uú] musical",
+        r"The Decrolers",
+        r"^DJ",
+        r"Grupo Grupo",
+        r"Tam Tam Go",
+        ("Actuaci[oó]n", "tributo"),
+    )),
+    ("title", Category.THEATER, (
+        r"^teatros?$",
+        r"^Microteatros?",
+        "Audio-?drama",
+        r"Paloma Calle que se calle",
+    )),
+    ("title", Category.DANCE, (
+        r"^danzas?$",
+        r"Baile sin cuartel",
+        r"D[íi]a (Internacional )?de la Danza",
+        r"Festival 4 estaciones",
+        r"Bailes folcl[oó]ricos",
+    )),
+    ("title", Category.VISIT, (
+        r"^visitas? guiadas?",
+        r"^visita el",
+        r"^descubre el vivero",
+        r"En este itinerario se",
+        r"^Visitas? al",
+        r"Ruta guiada",
+        r"^Visita taller encuadernaci[oó]n",
+        r"Jardines del Campo del Moro",
+        r"Parque Enrique Tierno Galv[aá]n",
+        r"^RUTA\s*/",
+        (r"parque", r"itinerario",),
+    )),
+    flags=re.I
+)
+
+RULES_TITLE_CATEGORY = RuleTable(
+    ("title", Category.MUSIC, (
+        "recital de piano",
+        r"Cuartero de C[áa]mara",
+        r"Arias de [Óo]pera",
+        "No cesar[áa]n mis cantos",
+    )),
+    ("title", Category.DANCE, (
+        ("ballet", ("repertorio", "clasico")),
+    ), 0),
+    ("title", Category.EXPO, (
+        r"certamen( de)? (pintura|decoraci[oó]n|ilustraci[oó]n)",
+        "festival by olavide",
+        r"Apertura extraordinaria\b.*\bNoche en blanco",
+    ), 0),
+    ("title", Category.THEATER, (
+        "belen viviente",
+        r"Representaci[óo]n(es)? teatral(es)?",
+        r"Mon[oó]logos? de humor",
+        r"desfile de moda castiza",
+    )),
+    ("title", Category.EXPO, (
+        r"belen (popular )?(angelicum|tradicional|monumental|napolitano)",
+        r"belen (de )?navidad en",
+        "belenes del mundo",
+        r"apertura al publico (de el|del) belen",
+        r"dioramas? de navidad",
+    )),
+    ("title", Category.CONFERENCE, (
+        r"^conferencias?$",
+        r"^pregon$",
+        r'[Mm]ocrofestival, tableros y pantallas',
+        r"^Tardes romanas",
+        "^[Ii]ntroduci[oó]n (a la|a|al)",
+    ), 0),
+    ("title", Category.SPORT, (
+        "cañon del rio",
+        "ruta a caballo",
+        "cerro de",
+        r"actividad(es)? acuaticas? pantano",
+        r"Deportes en Las Fiestas de",
+    )),
+    ("title", Category.DANCE, (
+        "Voguing",
+    )),
+    ("title", Category.EXPO, (
+        r"^exposicion y (charla|coloquio)",
+        r"europa ilustra",
+    )),
+    ("title", Category.CONFERENCE, (
+        r"^conferencia y (charla|coloquio)",
+    )),
+    ("title", Category.WORKSHOP, (
+        r"^taller",
+        "tertulias en latin",
+        r"taller(es)? de calidad del aire",
+        "compostagram",
+        "esquejodromo",
+        r"^Iniciaci[oó]n a",
+    )),
+    ("title", Category.VISIT, (
+        "visitas guiadas",
+        "Recorrido por la Iluminaci[óo]n",
+    )),
+    ("title", Category.MUSIC, (
+        "^concierto de",
+        r"M[uú]sica de Cine",
+    )),
+    ("title", Category.MAGIC, (
+        ("espectaculo", "magia"),
+        ("magia", "ilusionismo"),
+        r"la magia de",
+        r"^Magia:",
+        r"Magia o plomo",
+        r"Piccola Magia",
+        r"Magia con acento",
+        r"Magia para todos",
+    )),
+    ("title", Category.MUSIC, (
+        "m[úu]sica",
+        "musicales",
+        "conciertos?",
+        "hip-hob",
+        "jazz",
+        "reagge",
+        "flamenco",
+        "batucada",
+        "rock",
+    )),
+    ("title", Category.THEATER, (
+        "teatro",
+        "zarzuela",
+        "lectura dramatizada",
+    )),
+    ("title", Category.EXPO, (
+        "exposicion(es)?",
+        "noche de los museos",
+    )),
+    ("title", Category.CONFERENCE, (
+        "conferencias?",
+        "coloquios?",
+        "presentacion(es)?",
+    )),
+    ("title", Category.CONFERENCE, (
+        "charlemos sobre",
+    )),
+    flags=re.I
+)
+
+RULES_TEXT_CATEGORY = RuleTable(
+    ("title", Category.DANCE, (
+        "^(danza|chotis)",
+    )),
+    ("title", Category.CONFERENCE, (
+        "^(charlas?|ensayos?)",
+    )),
+    ("title", Category.WORKSHOP, (
+        "^(acompañamiento digital)",
+    )),
+    ("title", Category.ONLINE, (
+        "^(webinario)",
+    )),
+    ("title", Category.VISIT, (
+        "^(paseo|esculturas)",
+        "de el retiro$",
+    )),
+    ("title", Category.CONFERENCE, (
+        "^mercadea en el mercado",
+        "^mercadea en los mercadillos",
+    )),
+    ("title", Category.POETRY, (
+        "poemario",
+        "^poesia rapidita",
+        r"^\d+ poemas",
+        "poesia o barbarie",
+    )),
+    ("title", Category.WORKSHOP, (
+        "^hacer actuar",
+    )),
+    ("title", Category.VISIT, (
+        r"visita a",
+    )),
+    ("title", Category.MUSIC, (
+        "actuacion coral",
+        "recital coral",
+        "taller de sevillanas",
+    )),
+    ("title", Category.EXPO, (
+        "encuentro artistico",
+    )),
+    ("title", Category.MUSIC, (
+        "^(cantando|banda municipal)",
+    )),
+    ("title", Category.CONFERENCE, (
+        ("dialogos?", "mac"),
+    )),
+    ("title", Category.WORKSHOP, (
+        "lengua de signos",
+        r"^talleres",
+    )),
+    ("title", Category.MAGIC, (
+        "^El mago",
+    )),
+    ("title", Category.PARTY, (
+        r"Paella popular",
+        r"Fuegos artificiales",
+        r"Reparto de chocolate con churros",
+        ("fiesta", "aniversario"),
+        r"Partida( [uÚ]nica)? de Rol",
+        r"Fiesta de verano en",
+        ("Micro Abierto", "Karaoke"),
+    )),
+    ("description", Category.THEATER, (
+        "zarzuela",
+        "teatro",
+        "radionovela",
+        "espect[áa]culo (circense y )?teatral",
+        r"Lectura dramatizada",
+    )),
+    ("description", Category.SPORT, (
+        r"itinerario .* kil[ó]metros",
+        r"Entrega de premios\b.*\bjuegos deportivos",
+        r"Deportes en Las Fiestas",
+    )),
+    flags=re.I
+)
+
+RULES_FALLBACK_CATEGORY = RuleTable(
+    ("description", Category.MAGIC, (
+        ("ilusionista", "mentalismo"),
+    ), 0),
+    ("description", Category.VISIT, (
+        r"itinerario guiado",
+        r"visitas? guiadas?",
+    )),
+    ("place", Category.VISIT, (
+        ("ambiental", ("casa de campo", "retiro")),
+    )),
+    ("description", Category.CONTEST, (
+        r"Concurso de disfraces",
+    )),
+    ("description", Category.NO_EVENT, (
+        r"Mercado al aire libre",
+        r"intercambio de esquejes",
+    )),
+    ("title", Category.CONFERENCE, (
+        "con Maribel Moreno",
+    ), 0),
+    ("location", Category.MUSIC, (
+        r"templete\b.*m[úu]sica",
+    )),
+    flags=re.I
+)
+
+
 class MadridEs(Base):
     def __init__(
         self,
@@ -562,71 +947,9 @@ class MadridEs(Base):
         cat = FIX_EVENT.get(MadridEs.get_id(i.url), {}).get('category')
         if isinstance(cat, str):
             return Category[cat]
-        if re_or(
-            i.title,
-            r"concierto infantil",
-            r"en familia",
-            r"elaboraci[óo]n de comederos de aves",
-            r"los [\d\. ]+ primeros d[íi]as no se repiten",
-            r"photocall hinchable",
-            r"^re vuelta al patio",
-            r"Visita familiar",
-            r"taller familiar",
-            r"huerto familiar",
-            r"Taller infantil",
-            r"Pedag[óo]gico Infantil",
-            r"Actividad(es)? infantil(es)?",
-            (r"dia", r"internacional", r"familias?"),
-            (r"taller", r"pequeños"),
-            r"Exploraci[oó]n Infantil",
-            r"cuento infantil",
-            r"Concierto matinal familiar",
-            flags=re.I
-        ):
-            return Category.CHILDISH
-        if re_or(
-            i.description,
-            r"Espect[aá]culo infantil",
-            r"musical? infantil",
-            r"teatro infantil",
-            r"relatos en familia",
-            r"concierto familiar",
-            r"bienestar de niñ[ao]s y niñ[oa]s",
-            r"donde los niñ[ao]s y niñ[oa]s pueden",
-            r"orientad[oa] al p[uú]blico infantil",
-            r"Recomendado para niñ[aox@e]s",
-            r"familias con menores",
-            r"familias con niñ[aox@e]s",
-            r"De \d a (\d|1\d) años",
-            r"entre \d y (\d|1\d) años",
-            (r"cuentacuentos", r"en familia"),
-            r"Para familias e infancias",
-            r"cuento infantil",
-            r"compartir en familia",
-            flags=re.I
-        ):
-            return Category.CHILDISH
-        if re_or(
-            i.title,
-            "taller juvenil",
-            "Teenage Party",
-            flags=re.I
-        ):
-            return Category.YOUTH
-        if re_or(
-            i.title,
-            "para mayores$",
-            flags=re.I
-        ):
-            return Category.SENIORS
-        if re_or(
-            i.title,
-            r"Grupo de crianza",
-            r"La Liga de la Leche",
-            r"Aula Digital.*Ada Lovelace",
-            flags=re.I
-        ):
-            return Category.MATERNITY
+        cat = RULES_AUDIENCE.first(title=i.title, description=i.description)
+        if cat is not None:
+            return cat
 
         if i.has_audience(
             'colectivos necesitados',
@@ -667,54 +990,9 @@ class MadridEs(Base):
         ):
             return Category.ONLINE
 
-        if re_or(
-            i.title,
-            "Voluntarios? por Madrid",
-            r"Esquej[oó]dromo",
-            r"Intercambio( y recomendaciones)? de libros",
-            r"Encuentro de nuevas promociones fhcn",
-            r"Preg[oó]n (a cargo|de las fiestas)",
-            r"Federaci[oó]n de Grupos Tradicionales Madrileños",
-            flags=re.I
-        ):
-            return Category.NO_EVENT
-        if re_or(
-            i.title,
-            r"d[íi]a mundial de la poes[íi]a",
-            r"encuentro po[ée]tico",
-            r"Recital de poes[íi]a",
-            r"Versos entrevistados",
-            r"Presentaci[óo]n del poemario",
-            r"^T[eé] y poes[ií]a",
-            r"encuentro de poetas",
-            r"UNCAREMA",
-            flags=re.I
-        ):
-            return Category.POETRY
-        if re_or(
-            i.title,
-            r"Muestra de proyectos \d+",
-            flags=re.I
-        ):
-            return Category.EXPO
-        if re_or(
-            i.title,
-            "Grupo de hombres por la Igualdad",
-            "^C[ií]rculo de Mujeres$",
-            flags=re.I
-        ):
-            return Category.ACTIVISM
-        if re_or(
-            i.title,
-            r"Primeros pasos con Gmail",
-            r"Quiero usar mi m[oó]vil",
-            r"Tertulia de toros",
-            r"Misa mayor",
-            r"Procesi[oó]n de (Ntra|Nuestra)",
-            r"Bert[ií]n Osborne",
-            flags=re.I
-        ):
-            return Category.SPAM
+        cat = RULES_TITLE_OVER_TYPE.first(title=i.title)
+        if cat is not None:
+            return cat
 
         if i.has_audience(
             'mayores'
@@ -747,118 +1025,9 @@ class MadridEs(Base):
         ):
             return Category.CINEMA
 
-        if re_or(
-            i.description,
-            r"Encuentro Experiencias del Alma",
-            flags=re.I
-        ):
-            return Category.SPAM
-
-        if re_or(
-            i.title,
-            "Circo y Malabares",
-            flags=re.I
-        ):
-            return Category.CIRCUS
-
-        if re_or(
-            i.description,
-            r"espect[aá]culo de t[íi]teres",
-            flags=re.I
-        ):
-            return Category.PUPPETRY
-
-        if re_or(
-            i.description,
-            r"Una proyecci[oó]n de la pel[ií]cula",
-            r"Documental y Coloquio",
-            flags=re.I
-        ):
-            return Category.CINEMA
-
-        if re_or(
-            i.title,
-            r"Mejora tu ingl[eé]s con charlas",
-            r"Reconocimiento de [aá]rboles",
-            "taller de escritura",
-            "Aprende Chotis",
-            r"Iniciaci[oó]n al cultivo",
-            "Editatona",
-            r"Armon[ií]a Coral Participativa",
-            r"taller (hagamos|desayunos|de onigiri)",
-            r"Decora tu propia torta gallega",
-            r"degustaci[oó]n de",
-            flags=re.I
-        ):
-            return Category.WORKSHOP
-        if re_or(
-            i.title,
-            "Salida medioambiental",
-            flags=re.I
-        ):
-            return Category.HIKING
-        if re_or(
-            i.title,
-            r"^exposici[oó]n(es)$",
-            flags=re.I
-        ):
-            return Category.EXPO
-        if re_or(
-            i.title,
-            r"^conciertos?$",
-            r"Composici[oó]n musical para",
-            r"Festival Centro al comp[áa]s",
-            r"Cuarteto de Cuerda",
-            r"tertulia musical",
-            r"Folksongs",
-            r"Madrid a Tempo",
-            r"Madrid en canciones",
-            r"M[uú]sica de cine",
-            r"Actuaci[oó]n (orquesta|DJ|grupo|banda|agrupaci[óo]n)",
-            r"Vem[uú] musical",
-            r"The Decrolers",
-            r"^DJ",
-            r"Grupo Grupo",
-            r"Tam Tam Go",
-            ("Actuaci[oó]n", "tributo"),
-            flags=re.I
-        ):
-            return Category.MUSIC
-        if re_or(
-            i.title,
-            r"^teatros?$",
-            r"^Microteatros?",
-            "Audio-?drama",
-            r"Paloma Calle que se calle",
-            flags=re.I
-        ):
-            return Category.THEATER
-        if re_or(
-            i.title,
-            r"^danzas?$",
-            r"Baile sin cuartel",
-            r"D[íi]a (Internacional )?de la Danza",
-            r"Festival 4 estaciones",
-            r"Bailes folcl[oó]ricos",
-            flags=re.I
-        ):
-            return Category.DANCE
-        if re_or(
-            i.title,
-            r"^visitas? guiadas?",
-            r"^visita el",
-            r"^descubre el vivero",
-            r"En este itinerario se",
-            r"^Visitas? al",
-            r"Ruta guiada",
-            r"^Visita taller encuadernaci[oó]n",
-            r"Jardines del Campo del Moro",
-            r"Parque Enrique Tierno Galv[aá]n",
-            r"^RUTA\s*/",
-            (r"parque", r"itinerario",),
-            flags=re.I
-        ):
-            return Category.VISIT
+        cat = RULES_UNTYPED.first(description=i.description, title=i.title)
+        if cat is not None:
+            return cat
 
         if re_or(
             i.title,
@@ -1022,166 +1191,9 @@ class MadridEs(Base):
         if maybeSPAM:
             return Category.SPAM
 
-        if re_or(
-            i.event.title,
-            "recital de piano",
-            r"Cuartero de C[áa]mara",
-            r"Arias de [Óo]pera",
-            "No cesar[áa]n mis cantos",
-            flags=re.I
-        ):
-            return Category.MUSIC
-        if re_and(
-            i.event.title,
-            "ballet",
-            ("repertorio", "clasico"),
-        ):
-            return Category.DANCE
-        if re_or(
-            i.event.title,
-            r"certamen( de)? (pintura|decoraci[oó]n|ilustraci[oó]n)",
-            "festival by olavide",
-            r"Apertura extraordinaria\b.*\bNoche en blanco",
-        ):
-            return Category.EXPO
-        if re_or(
-            i.event.title,
-            "belen viviente",
-            r"Representaci[óo]n(es)? teatral(es)?",
-            r"Mon[oó]logos? de humor",
-            r"desfile de moda castiza",
-            flags=re.I
-        ):
-            return Category.THEATER
-        if re_or(
-            i.event.title,
-            r"belen (popular )?(angelicum|tradicional|monumental|napolitano)",
-            r"belen (de )?navidad en",
-            "belenes del mundo",
-            r"apertura al publico (de el|del) belen",
-            r"dioramas? de navidad",
-            flags=re.I
-        ):
-            return Category.EXPO
-        if re_or(
-            i.event.title,
-            r"^conferencias?$",
-            r"^pregon$",
-            r'[Mm]ocrofestival, tableros y pantallas',
-            r"^Tardes romanas",
-            "^[Ii]ntroduci[oó]n (a la|a|al)",
-        ):
-            return Category.CONFERENCE
-        if re_or(
-            i.event.title,
-            "cañon del rio",
-            "ruta a caballo",
-            "cerro de",
-            r"actividad(es)? acuaticas? pantano",
-            r"Deportes en Las Fiestas de",
-            flags=re.I
-        ):
-            return Category.SPORT
-        if re_or(
-            i.event.title,
-            "Voguing",
-            flags=re.I
-        ):
-            return Category.DANCE
-        if re_or(
-            i.event.title,
-            r"^exposicion y (charla|coloquio)",
-            r"europa ilustra",
-            flags=re.I
-        ):
-            return Category.EXPO
-        if re_or(
-            i.event.title,
-            r"^conferencia y (charla|coloquio)",
-            flags=re.I
-        ):
-            return Category.CONFERENCE
-        if re_or(
-            i.event.title,
-            r"^taller",
-            "tertulias en latin",
-            r"taller(es)? de calidad del aire",
-            "compostagram",
-            "esquejodromo",
-            r"^Iniciaci[oó]n a",
-            flags=re.I
-        ):
-            return Category.WORKSHOP
-        if re_or(
-            i.event.title,
-            "visitas guiadas",
-            "Recorrido por la Iluminaci[óo]n",
-            flags=re.I
-        ):
-            return Category.VISIT
-        if re_or(
-            i.event.title,
-            "^concierto de",
-            r"M[uú]sica de Cine",
-            flags=re.I
-        ):
-            return Category.MUSIC
-        if re_or(
-            i.event.title,
-            ("espectaculo", "magia"),
-            ("magia", "ilusionismo"),
-            r"la magia de",
-            r"^Magia:",
-            r"Magia o plomo",
-            r"Piccola Magia",
-            r"Magia con acento",
-            r"Magia para todos",
-            flags=re.I
-        ):
-            return Category.MAGIC
-        if re_or(
-            i.event.title,
-            "m[úu]sica",
-            "musicales",
-            "conciertos?",
-            "hip-hob",
-            "jazz",
-            "reagge",
-            "flamenco",
-            "batucada",
-            "rock",
-            flags=re.I
-        ):
-            return Category.MUSIC
-        if re_or(
-            i.event.title,
-            "teatro",
-            "zarzuela",
-            "lectura dramatizada",
-            flags=re.I
-        ):
-            return Category.THEATER
-        if re_or(
-            i.event.title,
-            "exposicion(es)?",
-            "noche de los museos",
-            flags=re.I
-        ):
-            return Category.EXPO
-        if re_or(
-            i.event.title,
-            "conferencias?",
-            "coloquios?",
-            "presentacion(es)?",
-            flags=re.I
-        ):
-            return Category.CONFERENCE
-        if re_or(
-            i.event.title,
-            "charlemos sobre",
-            flags=re.I
-        ):
-            return Category.CONFERENCE
+        cat = RULES_TITLE_CATEGORY.first(title=i.event.title)
+        if cat is not None:
+            return cat
         if re_or(
             i.event.title,
             "club(es)? de lectura",
@@ -1239,136 +1251,9 @@ class MadridEs(Base):
             flags=re.I
         ):
             return Category.EXPO
-        if re_or(
-            i.event.title,
-            "^(danza|chotis)",
-            flags=re.I
-        ):
-            return Category.DANCE
-        if re_or(
-            i.event.title,
-            "^(charlas?|ensayos?)",
-            flags=re.I
-        ):
-            return Category.CONFERENCE
-        if re_or(
-            i.event.title,
-            "^(acompañamiento digital)",
-            flags=re.I
-        ):
-            return Category.WORKSHOP
-        if re_or(
-            i.event.title,
-            "^(webinario)",
-            flags=re.I
-        ):
-            return Category.ONLINE
-        if re_or(
-            i.event.title,
-            "^(paseo|esculturas)",
-            "de el retiro$",
-            flags=re.I
-        ):
-            return Category.VISIT
-        if re_or(
-            i.event.title,
-            "^mercadea en el mercado",
-            "^mercadea en los mercadillos",
-            flags=re.I
-        ):
-            return Category.CONFERENCE
-        if re_or(
-            i.event.title,
-            "poemario",
-            "^poesia rapidita",
-            r"^\d+ poemas",
-            "poesia o barbarie",
-            flags=re.I
-        ):
-            return Category.POETRY
-        if re_or(
-            i.event.title,
-            "^hacer actuar",
-            flags=re.I
-        ):
-            return Category.WORKSHOP
-        if re_or(
-            i.event.title,
-            r"visita a",
-            flags=re.I
-        ):
-            return Category.VISIT
-        if re_or(
-            i.event.title,
-            "actuacion coral",
-            "recital coral",
-            "taller de sevillanas",
-            flags=re.I
-        ):
-            return Category.MUSIC
-        if re_or(
-            i.event.title,
-            "encuentro artistico",
-            flags=re.I
-        ):
-            return Category.EXPO
-        if re_or(
-            i.event.title,
-            "^(cantando|banda municipal)",
-            flags=re.I
-        ):
-            return Category.MUSIC
-        if re_and(
-            i.event.title,
-            "dialogos?",
-            "mac",
-            flags=re.I
-        ):
-            return Category.CONFERENCE
-        if re_or(
-            i.event.title,
-            "lengua de signos",
-            r"^talleres",
-            flags=re.I
-        ):
-            return Category.WORKSHOP
-        if re_or(
-            i.event.title,
-            "^El mago",
-            flags=re.I
-        ):
-            return Category.MAGIC
-        if re_or(
-            i.event.title,
-            r"Paella popular",
-            r"Fuegos artificiales",
-            r"Reparto de chocolate con churros",
-            ("fiesta", "aniversario"),
-            r"Partida( [uÚ]nica)? de Rol",
-            r"Fiesta de verano en",
-            ("Micro Abierto", "Karaoke"),
-            flags=re.I
-        ):
-            return Category.PARTY
-
-        if re_or(
-            i.event.description,
-            "zarzuela",
-            "teatro",
-            "radionovela",
-            "espect[áa]culo (circense y )?teatral",
-            r"Lectura dramatizada",
-            flags=re.I
-        ):
-            return Category.THEATER
-        if re_or(
-            i.event.description,
-            r"itinerario .* kil[ó]metros",
-            r"Entrega de premios\b.*\bjuegos deportivos",
-            r"Deportes en Las Fiestas",
-            flags=re.I
-        ):
-            return Category.SPORT
+        cat = RULES_TEXT_CATEGORY.first(title=i.event.title, description=i.event.description)
+        if cat is not None:
+            return cat
         if re_or(
             i.event.title,
             "actuacion",
@@ -1438,53 +1323,9 @@ class MadridEs(Base):
             flags=re.I
         ):
             return find_book_category(i.event.title, i.event.description, Category.LITERATURE)
-        if re_and(
-            i.event.description,
-            "ilusionista",
-            "mentalismo"
-        ):
-            return Category.MAGIC
-        if re_or(
-            i.event.description,
-            r"itinerario guiado",
-            r"visitas? guiadas?",
-            flags=re.I
-        ):
-            return Category.VISIT
-        if re_and(
-            place,
-            "ambiental",
-            ("casa de campo", "retiro"),
-            flags=re.I
-        ):
-            return Category.VISIT
-
-        if re_or(
-            i.event.description,
-            r"Concurso de disfraces",
-            flags=re.I
-        ):
-            return Category.CONTEST
-        if re_or(
-            i.event.description,
-            r"Mercado al aire libre",
-            r"intercambio de esquejes",
-            flags=re.I
-        ):
-            return Category.NO_EVENT
-
-        if re_or(
-            i.event.title,
-            "con Maribel Moreno",
-        ):
-            return Category.CONFERENCE
-
-        if re_or(
-            i.event.place.location,
-            r"templete\b.*m[úu]sica",
-            flags=re.I
-        ):
-            return Category.MUSIC
+        cat = RULES_FALLBACK_CATEGORY.first(description=i.event.description, place=place, title=i.event.title, location=i.event.place.location)
+        if cat is not None:
+            return cat
         logger.critical(str(CategoryUnknown(
             i.event.url,
             f"name={i.event.title} category={i.event.category}"
@@ -1,5 +1,5 @@
 from core.web import Driver, WEB, get_text, buildSoup
-from core.util import re_or, plain_text, get_obj, get_domain
+from core.util import re_or, plain_text, get_obj, get_domain, RuleTable
 from typing import Set, Dict
 from functools import cached_property, cache
 import logging
@@ -179,6 +179,23 @@ HEADERS = {
 }
 
 
+RULES_TEXT_CATEGORY = RuleTable(
+    ("psub", Category.THEATER, (
+        "Baychimo Teatro",
+    )),
+    ("psub", Category.CONFERENCE, (
+        r"di[aá]logo con creadores foto-libros",
+    )),
+    ("pt", Category.EXPO, (
+        "belen del ayuntamiento",
+    )),
+    ("desc", Category.WORKSHOP, (
+        "Un taller de creatividad",
+    )),
+    flags=re.I
+)
+
+
 class MadridDestino(Base):
     URL = "https://tienda.madrid-destino.com/es"
 
@@ -708,18 +725,9 @@ class MadridDestino(Base):
             return Category.CONFERENCE
         if re_or(psub, r"^Taller de", to_log=id, flags=re.I) or re_or(audience, "Taller", to_log=id, flags=re.I):
             return Category.WORKSHOP
-        if re_or(psub, "Baychimo Teatro", flags=re.I):
-            return Category.THEATER
-        if re_or(psub, r"di[aá]logo con creadores foto-libros", flags=re.I):
-            return Category.CONFERENCE
-        if re_or(pt, "belen del ayuntamiento", flags=re.I):
-            return Category.EXPO
-        if re_or(
-            desc,
-            "Un taller de creatividad",
-            flags=re.I
-        ):
-            return Category.WORKSHOP
+        cat = RULES_TEXT_CATEGORY.first(psub=psub, pt=pt, desc=desc)
+        if cat is not None:
+            return cat
         if re_or(
             pt,
             r"^concierto de",
@@ -2,7 +2,7 @@ from core.ics import IcsReader, IcsEventWrapper
 from functools import cached_property
 from core.event import Event, Place, Session, Category, CategoryUnknown
 from core.place import Places
-from core.util import re_or, re_and, get_domain, clean_url
+from core.util import re_or, re_and, get_domain, clean_url, RuleTable
 import requests
 import re
 from bs4 import BeautifulSoup, Tag
@@ -251,6 +251,80 @@ def _get_pog(soup: Tag):
     return pog
 
 
+RULES_OVER_SITE_CATEGORY = RuleTable(
+    ("enrolment_button", Category.NO_EVENT, (
+        r"La inscripci[oó]n ha finalizado",
+    )),
+    ("description", Category.CHILDISH, (
+        r"Actividad para alumnos[^\.]*? (ESO|Primaria)",
+    )),
+    ("summary", Category.CINEMA, (
+        r"UN REGRESO DE CINE",
+        r"Cine foro",
+        r"cinef[oó]rum",
+        r"Muestra( Internacional)? de Cine",
+    )),
+    ("summary", Category.CONFERENCE, (
+        "Presentaci[óo]n de la asociaci[óo]n",
+        "coloquio",
+        "Simposio",
+        "seminario",
+        "mesa redonda",
+        "^Conferencia",
+    )),
+    ("summary", Category.LITERATURE, (
+        "Presentaci[óo]n del libro",
+        r"Ediciones Complutense",
+    )),
+    ("summary", Category.WORKSHOP, (
+        "^taller",
+        "Hackathon",
+    )),
+    ("description", Category.THEATER, (
+        "obra esc[eé]nica",
+        "conferencia teatralizada",
+        "Grupo de Teatro",
+    )),
+    ("description", Category.CONFERENCE, (
+        r"Encuentro con",
+        r"ponentes",
+        r"coloquio posterior",
+        r"seminario",
+        r"conferencias?",
+    )),
+    flags=re.I
+)
+
+RULES_FALLBACK_CATEGORY = RuleTable(
+    ("summary", Category.CONFERENCE, (
+        "charla historiogr[aá]fica",
+        "conservatorio",
+        "Encuentro con",
+        "Jornadas?( Universitaria)? (sobre|de)",
+        "congreso",
+        r"Conferencia",
+    )),
+    ("summary", Category.VISIT, (
+        "tour",
+    )),
+    ("description", Category.CONFERENCE, (
+        r"congreso",
+        r"Ponentes",
+    )),
+    ("description", Category.VISIT, (
+        r"(visita|Ruta) guiada",
+    )),
+    ("description", Category.NO_EVENT, (
+        ("marketing", "empresarial"),
+        r"Seminar ONSITE",
+    )),
+    ("location", Category.CONFERENCE, (
+        "y online",
+    )),
+    flags=re.I
+)
+
+
 class Universidad(Base):
     def __init__(
         self,
@@ -481,70 +555,9 @@ class Universidad(Base):
             return Category.NO_EVENT
         info = self.__get_info(link)
         enrolment_button = MD.convert(info.sym.get("enrolment_button") if info and info.sym else None)
-        if re_or(
-            enrolment_button,
-            r"La inscripci[oó]n ha finalizado",
-            flags=re.I
-        ):
-            return Category.NO_EVENT
-        if re_or(
-            description,
-            r"Actividad para alumnos[^\.]*? (ESO|Primaria)",
-            flags=re.I
-        ):
-            return Category.CHILDISH
-        if re_or(
-            e.SUMMARY,
-            r"UN REGRESO DE CINE",
-            r"Cine foro",
-            r"cinef[oó]rum",
-            r"Muestra( Internacional)? de Cine",
-            flags=re.I
-        ):
-            return Category.CINEMA
-        if re_or(
-            e.SUMMARY,
-            "Presentaci[óo]n de la asociaci[óo]n",
-            "coloquio",
-            "Simposio",
-            "seminario",
-            "mesa redonda",
-            "^Conferencia",
-            flags=re.I
-        ):
-            return Category.CONFERENCE
-        if re_or(
-            e.SUMMARY,
-            "Presentaci[óo]n del libro",
-            r"Ediciones Complutense",
-            flags=re.I
-        ):
-            return Category.LITERATURE
-        if re_or(
-            e.SUMMARY,
-            "^taller",
-            "Hackathon",
-            flags=re.I
-        ):
-            return Category.WORKSHOP
-        if re_or(
-            description,
-            "obra esc[eé]nica",
-            "conferencia teatralizada",
-            "Grupo de Teatro",
-            flags=re.I
-        ):
-            return Category.THEATER
-        if re_or(
-            description,
-            r"Encuentro con",
-            r"ponentes",
-            r"coloquio posterior",
-            r"seminario",
-            r"conferencias?",
-            flags=re.I
-        ):
-            return Category.CONFERENCE
+        cat = RULES_OVER_SITE_CATEGORY.first(enrolment_button=enrolment_button, description=description, summary=e.SUMMARY)
+        if cat is not None:
+            return cat
         categories = (info.get_categories() if info else None) or tuple()
         menu = (info.get_menu() if info else None) or tuple()
         for c in categories:
@@ -579,49 +592,9 @@ class Universidad(Base):
             if re_or(m, "ponentes?", flags=re.I):
                 return Category.CONFERENCE
 
-        if re_or(
-            e.SUMMARY,
-            "charla historiogr[aá]fica",
-            "conservatorio",
-            "Encuentro con",
-            "Jornadas?( Universitaria)? (sobre|de)",
-            "congreso",
-            r"Conferencia",
-            flags=re.I
-        ):
-            return Category.CONFERENCE
-        if re_or(
-            e.SUMMARY,
-            "tour",
-            flags=re.I
-        ):
-            return Category.VISIT
-        if re_or(
-            description,
-            r"congreso",
-            r"Ponentes",
-            flags=re.I
-        ):
-            return Category.CONFERENCE
-        if re_or(
-            description,
-            r"(visita|Ruta) guiada",
-            flags=re.I
-        ):
-            return Category.VISIT
-        if re_or(
-            description,
-            ("marketing", "empresarial"),
-            r"Seminar ONSITE",
-            flags=re.I
-        ):
-            return Category.NO_EVENT
-        if re_or(
-            e.LOCATION,
-            "y online",
-            flags=re.I
-        ):
-            return Category.CONFERENCE
+        cat = RULES_FALLBACK_CATEGORY.first(summary=e.SUMMARY, description=description, location=e.LOCATION)
+        if cat is not None:
+            return cat
         logger.critical(str(CategoryUnknown(link, f"categories={categories} {e}")))
         return Category.UNKNOWN
 
@@ -0,0 +1,48 @@
+from core.event import Event, Session, Category, Place
+from portal.event_collector import DEDUP_RULES
+from core.dedup import Dedup
+
+PLACE = Place(name="Sala Prueba", address="Calle Falsa 123, Madrid")
+
+
+def _event(id: str, name: str, date: str, cycle: str = None):
+    return Event(
+        id=id,
+        url=f"https://example.com/{id}",
+        name=name,
+        price=5,
+        category=Category.CONFERENCE,
+        place=PLACE,
+        duration=60,
+        sessions=(Session(date=date), ),
+        cycle=cycle
+    )
+
+
+def _run(*evs: Event):
+    dd = Dedup(*DEDUP_RULES, fusion=Event.fusion)
+    return {e.name: e for e in dd.run(evs)}
+
+
+def test_cycle_does_not_swallow_same_place_event():
+    result = _run(
+        _event("a1", "Primera charla", "2025-01-10 19:00", cycle="Ciclo de prueba"),
+        _event("a2", "Segunda charla", "2025-01-17 19:00", cycle="Ciclo de prueba"),
+        _event("b1", "Otra cosa", "2025-01-10 19:00"),
+    )
+    assert set(result) == {"Ciclo de prueba", "Otra cosa"}
+    assert len(result["Ciclo de prueba"].sessions) == 2
+    assert result["Otra cosa"].id == "b1"
+
+
+def test_cycle_does_not_swallow_event_with_same_name():
+    # b1 comparte lugar y nombre con a1, pero no es del ciclo: baseline
+    # fusionaba primero el ciclo y luego ya no coincidían los nombres
+    result = _run(
+        _event("a1", "Primera charla", "2025-01-10 19:00", cycle="Ciclo de prueba"),
+        _event("a2", "Segunda charla", "2025-01-17 19:00", cycle="Ciclo de prueba"),
+        _event("b1", "Primera charla", "2025-02-10 19:00"),
+    )
+    assert set(result) == {"Ciclo de prueba", "Primera charla"}
+    assert len(result["Ciclo de prueba"].sessions) == 2
+    assert result["Primera charla"].id == "b1"
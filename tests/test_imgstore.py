@@ -0,0 +1,36 @@
+from core.event import Event, Session, Category, Place
+from core.imgstore import get_origin, get_placeholders
+
+
+def _event(id: str, place: str, cycle: str = None):
+    return Event(
+        id=id,
+        url=f"https://example.com/{id}",
+        name=f"Película {id}",
+        price=5,
+        category=Category.CINEMA,
+        place=Place(name=place, address=f"Calle {place}, Madrid"),
+        duration=90,
+        sessions=(Session(date="2025-01-10 19:00"), ),
+        cycle=cycle
+    )
+
+
+def _placeholders(*img_events: tuple[str, Event]):
+    return get_placeholders((img, get_origin(e)) for img, e in img_events)
+
+
+def test_shared_cycle_poster_is_not_placeholder():
+    # el cartel del festival en todas sus películas, aunque sean en sitios distintos
+    evs = [_event(f"c{i}", f"Sala {i % 3}", cycle="Festival de prueba") for i in range(8)]
+    assert _placeholders(*(("festival.jpg", e) for e in evs)) == {}
+
+
+def test_season_poster_of_one_place_is_not_placeholder():
+    evs = [_event(f"t{i}", "Teatro Uno") for i in range(6)]
+    assert _placeholders(*(("temporada.jpg", e) for e in evs)) == {}
+
+
+def test_image_shared_by_unrelated_events_is_placeholder():
+    evs = [_event(f"u{i}", f"Sala {i}") for i in range(3)]
+    assert _placeholders(*(("sin-imagen.jpg", e) for e in evs)) == {"sin-imagen.jpg": 3}